@@ -0,0 +1,145 @@
+"""
+Admission control for the endpoints that start crew runs.
+
+Each run needs a slot. At most ``concurrency`` runs execute at once, and up to
+``max_queue`` more wait for a slot. Waiting is limited to ``queue_timeout``
+seconds. A request that finds the queue full, or that times out while
+waiting, is rejected immediately. Every client also has a token bucket
+(``rate`` per second, ``burst`` tokens) that is checked before it may queue.
+Rejections carry a Retry-After estimate based on recent run times. Latency
+for admitted requests is therefore bounded by roughly ``queue_timeout`` plus
+one run, however large the burst.
+"""
+
+from typing import Dict, Any, AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """A request was not admitted; retry after ``retry_after`` seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Server is over capacity ({reason})")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """``rate`` tokens per second, up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, otherwise seconds until one is available"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, time-limited wait queue and per-client rate limits"""
+
+    # Idle (full) buckets are dropped once this many clients are tracked
+    MAX_BUCKETS = 10000
+
+    def __init__(self, concurrency: int = None, max_queue: int = None, queue_timeout: float = None,
+                 rate: float = None, burst: float = None):
+        self.concurrency = concurrency or int(os.getenv("ADMISSION_CONCURRENCY", "4"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_QUEUE_DEPTH", "16"))
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+        self.rate = rate or float(os.getenv("CLIENT_RATE_PER_MINUTE", "30")) / 60
+        self.burst = burst or float(os.getenv("CLIENT_BURST", "10"))
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "rate_limited": 0, "queue_full": 0, "queue_timeout": 0,
+                      "max_queue_depth": 0}
+        # Exponentially weighted averages, in seconds
+        self.avg_wait = 0.0
+        self.avg_run = 1.0
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, client_id: str) -> TokenBucket:
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.full()}
+            bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def retry_after(self) -> float:
+        """Seconds until a slot is likely to be free for a new request"""
+        return self.avg_run * (self.waiting + 1) / self.concurrency
+
+    def _reject(self, reason: str, retry_after: float, client_id: str) -> Overloaded:
+        self.stats[reason] += 1
+        logger.warning(f"Rejected request from {client_id}: {reason} "
+                       f"(active {self.active}, waiting {self.waiting})")
+        return Overloaded(reason, retry_after)
+
+    @staticmethod
+    def _average(average: float, sample: float) -> float:
+        return 0.8 * average + 0.2 * sample
+
+    @asynccontextmanager
+    async def admit(self, client_id: str) -> AsyncIterator[None]:
+        """Hold a run slot for the duration of the block, or raise Overloaded"""
+        wait = self._bucket(client_id).take()
+        if wait:
+            raise self._reject("rate_limited", wait, client_id)
+        if self.active + self.waiting >= self.concurrency + self.max_queue:
+            raise self._reject("queue_full", self.retry_after(), client_id)
+
+        queued = time.monotonic()
+        self.waiting += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout", self.retry_after(), client_id)
+        finally:
+            self.waiting -= 1
+
+        started = time.monotonic()
+        self.avg_wait = self._average(self.avg_wait, started - queued)
+        self.active += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.avg_run = self._average(self.avg_run, time.monotonic() - started)
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "avg_wait_seconds": round(self.avg_wait, 3),
+            "avg_run_seconds": round(self.avg_run, 3),
+            "clients": len(self._buckets)
+        }
@@ -4,48 +4,91 @@ Agents package initialization for the Lease Exit Workflow Management System.
 
 import os
 from dotenv import load_dotenv
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Type
 from crewai import Agent, Crew, Task
-from anthropic import Anthropic
+from crewai.agents.crew_agent_executor import CrewAgentExecutor
 from datetime import datetime
-import json
 import logging
+import time
+
+from .schemas import (
+    TaskOutput, WorkflowCreationOutput, FormProcessingOutput,
+    NotificationOutput, ApprovalOutput, output_instructions
+)
+from .output_parser import parse_crew_output, parse_stats
+from .model_router import ModelRouter
+try:
+    from ..extraction import describe_document
+    from ..singleflight import SingleFlight, fingerprint
+    from ..llm_resilience import ResilientCaller
+    from ..llm_client import async_client
+    from ..logging_setup import settings as log_settings
+except ImportError:
+    from extraction import describe_document
+    from singleflight import SingleFlight, fingerprint
+    from llm_resilience import ResilientCaller
+    from llm_client import async_client
+    from logging_setup import settings as log_settings
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Output repair calls use the shared async client pool; retries and deadlines are handled by repair_caller
+repair_caller = ResilientCaller("output_repair")
 
 logger = logging.getLogger(__name__)
 
+# Ask the model to fix output that local repair could not salvage, instead of
+# failing the whole crew run. Set CREW_OUTPUT_LLM_REPAIR=0 to disable.
+LLM_REPAIR_ENABLED = os.getenv("CREW_OUTPUT_LLM_REPAIR", "1") != "0"
+LLM_REPAIR_MODEL = os.getenv("CREW_OUTPUT_LLM_REPAIR_MODEL", "claude-3-haiku-20240307")
+LLM_REPAIR_MAX_INPUT = 8000
+
 class LeaseExitCrew:
     """Lease Exit Workflow Management Crew"""
 
     def __init__(self):
         """Initialize the crew with all necessary agents"""
-        self.workflow_agent = self._create_workflow_agent()
-        self.form_agent = self._create_form_agent()
-        self.notification_agent = self._create_notification_agent()
-        self.approval_agent = self._create_approval_agent()
+        self.router = ModelRouter()
+        self.workflow_agent = self._agent("workflow")
+        self.form_agent = self._agent("form")
+        self.notification_agent = self._agent("notification")
+        self.approval_agent = self._agent("approval")
+        self._agent_names = {
+            self.workflow_agent.role: "workflow",
+            self.form_agent.role: "form",
+            self.notification_agent.role: "notification",
+            self.approval_agent.role: "approval"
+        }
+        # Identical task runs in flight at the same time (e.g. from batch imports) share one kickoff
+        self.task_flight = SingleFlight("crew_tasks", copy_results=False)
+
+    def _agent(self, name: str, tier: str = None) -> Agent:
+        """A new instance of the named agent on a model tier (its configured tier by default).
 
-    def _create_workflow_agent(self) -> Agent:
+        crewai agents cannot run two tasks at once, so every crew run gets its
+        own; the LLM clients behind them are shared. They use the classic
+        executor, whose async path awaits the LLM directly; the default
+        flow-based one runs each LLM call on a worker thread.
+        """
+        return AGENT_FACTORIES[name](self.router.llm(tier or self.router.agent_tier(name)))
+
+    @staticmethod
+    def _create_workflow_agent(llm: Any) -> Agent:
         """Creates the workflow management agent"""
         return Agent(
             role="Lease Exit Workflow Manager",
             goal="Manage and orchestrate lease exit workflows efficiently",
             backstory="""You are an AI agent responsible for managing lease exit workflows. 
             You ensure all steps are followed correctly and stakeholders are properly involved.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
-            llm_config={
-                "client": client,
-                "model": "claude-3-sonnet-20240229",
-                "temperature": 0.7
-            }
+            llm=llm,
+            executor_class=CrewAgentExecutor
         )
 
-    def _create_form_agent(self) -> Agent:
+    @staticmethod
+    def _create_form_agent(llm: Any) -> Agent:
         """Creates the form processing agent"""
         return Agent(
             role="Form Processing Specialist",
@@ -53,16 +96,14 @@ class LeaseExitCrew:
             backstory="""You are an AI agent specialized in processing and validating 
             various forms related to lease exit workflows. You ensure all required 
             information is provided and properly formatted.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
-            llm_config={
-                "client": client,
-                "model": "claude-3-sonnet-20240229",
-                "temperature": 0.7
-            }
+            llm=llm,
+            executor_class=CrewAgentExecutor
         )
 
-    def _create_notification_agent(self) -> Agent:
+    @staticmethod
+    def _create_notification_agent(llm: Any) -> Agent:
         """Creates the notification management agent"""
         return Agent(
             role="Notification Manager",
@@ -70,16 +111,14 @@ class LeaseExitCrew:
             backstory="""You are an AI agent responsible for managing communications 
             in the lease exit workflow. You ensure all stakeholders are properly 
             notified of relevant events and actions required.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
-            llm_config={
-                "client": client,
-                "model": "claude-3-sonnet-20240229",
-                "temperature": 0.7
-            }
+            llm=llm,
+            executor_class=CrewAgentExecutor
         )
 
-    def _create_approval_agent(self) -> Agent:
+    @staticmethod
+    def _create_approval_agent(llm: Any) -> Agent:
         """Creates the approval chain management agent"""
         return Agent(
             role="Approval Chain Manager",
@@ -87,13 +126,10 @@ class LeaseExitCrew:
             backstory="""You are an AI agent responsible for managing the approval 
             chain in lease exit workflows. You track approvals, ensure proper 
             sequencing, and validate completion.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
-            llm_config={
-                "client": client,
-                "model": "claude-3-sonnet-20240229",
-                "temperature": 0.7
-            }
+            llm=llm,
+            executor_class=CrewAgentExecutor
         )
 
     def create_workflow_task(self, inputs: Dict[str, Any]) -> Task:
@@ -108,7 +144,8 @@ class LeaseExitCrew:
         return Task(
             description=description,
             agent=self.workflow_agent,
-            expected_output="A dictionary containing the workflow creation status and next steps"
+            expected_output=output_instructions(
+                WorkflowCreationOutput, "The workflow creation status and next steps")
         )
 
     def process_form_task(self, inputs: Dict[str, Any]) -> Task:
@@ -118,11 +155,15 @@ class LeaseExitCrew:
         Submitted By: {inputs['submitted_by']}
         
         Ensure all required fields are present and properly formatted."""
+        if inputs.get("documents"):
+            description += "\n\nAttached documents (extracted summaries):\n" + "\n".join(
+                describe_document(document) for document in inputs["documents"])
         
         return Task(
             description=description,
             agent=self.form_agent,
-            expected_output="A dictionary containing the form processing results and validation status"
+            expected_output=output_instructions(
+                FormProcessingOutput, "The form processing results and validation status")
         )
 
     def send_notifications_task(self, inputs: Dict[str, Any]) -> Task:
@@ -136,7 +177,8 @@ class LeaseExitCrew:
         return Task(
             description=description,
             agent=self.notification_agent,
-            expected_output="A dictionary containing notification delivery status and recipient information"
+            expected_output=output_instructions(
+                NotificationOutput, "The notification delivery status and recipient information")
         )
 
     def manage_approvals_task(self, inputs: Dict[str, Any]) -> Task:
@@ -150,22 +192,57 @@ class LeaseExitCrew:
         return Task(
             description=description,
             agent=self.approval_agent,
-            expected_output="A dictionary containing approval chain status and decisions"
+            expected_output=output_instructions(
+                ApprovalOutput, "The approval chain status and decisions")
         )
 
-    def crew(self) -> Crew:
-        """Creates and returns a crew for executing tasks"""
+    def crew(self, tier: str = None) -> Crew:
+        """Creates and returns a crew for executing tasks, with every agent on ``tier`` if given"""
         return Crew(
-            agents=[
-                self.workflow_agent,
-                self.form_agent,
-                self.notification_agent,
-                self.approval_agent
-            ],
+            agents=[self._agent(name, tier) for name in AGENT_FACTORIES],
             tasks=[],  # Tasks will be added based on the specific workflow needs
-            verbose=True
+            verbose=log_settings.crew_verbose
         )
 
+    async def kickoff(self, tasks: List[Task], operation: str, inputs: Dict[str, Any],
+                      output_schema: Type[TaskOutput] = None) -> Any:
+        """Run ``tasks`` on a new crew; a concurrent run of the same operation and inputs is joined instead.
+
+        Crews run natively async on the caller's event loop, so concurrent
+        runs share the LLM connection pool rather than each holding a thread.
+        """
+        return await self.task_flight.do_async((operation, fingerprint(inputs)),
+                                               lambda: self._run_routed(tasks, operation, output_schema))
+
+    async def _run_routed(self, tasks: List[Task], operation: str, output_schema: Type[TaskOutput]) -> Any:
+        """Run on the operation's first model tier, escalating to the next on error or a weak result"""
+        tiers = self.router.route(operation)
+        for attempt, tier in enumerate(tiers):
+            last = attempt == len(tiers) - 1
+            crew = self.crew(tier)
+            agents = {self._agent_names[agent.role]: agent for agent in crew.agents}
+            for task in tasks:
+                task.agent = agents[self._agent_names[task.agent.role]]
+            crew.tasks = tasks
+            started = time.perf_counter()
+            try:
+                result = await crew.akickoff()
+            except Exception as e:
+                if tier is not None:
+                    self.router.record(tier, time.perf_counter() - started, ok=False, escalated=not last)
+                if last:
+                    raise
+                logger.warning(f"{operation} failed on model tier '{tier}', escalating: {str(e)}")
+                continue
+            if tier is None:
+                return result
+            reason = self.router.escalation_reason(operation, getattr(result, "raw", str(result)), output_schema)
+            self.router.record(tier, time.perf_counter() - started, ok=reason is None,
+                               escalated=reason is not None and not last)
+            if reason is None or last:
+                return result
+            logger.info(f"Escalating {operation} from model tier '{tier}': {reason}")
+
     def validate_inputs(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """Validate inputs before crew execution"""
         required_fields = ["property_name", "property_type", "lease_end_date", "exit_reason"]
@@ -174,49 +251,83 @@ class LeaseExitCrew:
                 raise ValueError(f"Missing required field: {field}")
         return inputs
 
-    def process_results(self, result: Any) -> Dict[str, Any]:
-        """Process results after crew execution"""
-        try:
-            # Extract the raw output if it's a CrewOutput object
-            if hasattr(result, 'raw'):
-                raw_text = result.raw
-            elif isinstance(result, str):
-                raw_text = result
-            else:
-                raw_text = str(result)
-
-            # Clean up the output by removing markdown code blocks and extra whitespace
-            cleaned_text = raw_text.strip()
-            if cleaned_text.startswith('```'):
-                # Remove opening code block
-                cleaned_text = cleaned_text[cleaned_text.find('\n')+1:]
-            if cleaned_text.endswith('```'):
-                # Remove closing code block
-                cleaned_text = cleaned_text[:cleaned_text.rfind('```')]
-            
-            # Remove any language identifier (like ```json)
-            if cleaned_text.startswith('json\n'):
-                cleaned_text = cleaned_text[5:]
-            
-            cleaned_text = cleaned_text.strip()
-            
-            # Parse the cleaned JSON
-            result_data = json.loads(cleaned_text)
+    async def process_results(self, result: Any, output_schema: Type[TaskOutput] = None) -> Dict[str, Any]:
+        """Process results after crew execution.
 
-            return {
-                "success": True,
-                "result": result_data,
-                "timestamp": datetime.now().isoformat()
-            }
-        except Exception as e:
-            logger.error(f"Error processing crew results: {str(e)}")
+        The output is parsed and repaired locally against ``output_schema``;
+        only if that fails is the model asked to repair it.
+        """
+        # Extract the raw output if it's a CrewOutput object
+        if hasattr(result, 'raw'):
+            raw_text = result.raw
+        elif isinstance(result, str):
+            raw_text = result
+        else:
+            raw_text = str(result)
+
+        schema_name = output_schema.__name__ if output_schema else "untyped"
+        parsed = parse_crew_output(raw_text, output_schema)
+        outcome = "repaired" if parsed["repairs"] else "clean"
+        if not parsed["ok"] and LLM_REPAIR_ENABLED:
+            parsed = await self._repair_with_llm(raw_text, output_schema, parsed["error"])
+            outcome = "llm_repaired"
+        if not parsed["ok"]:
+            outcome = "failed"
+        parse_stats.record(outcome, schema_name)
+
+        if not parsed["ok"]:
+            logger.error(f"Error processing crew results: {parsed['error']}")
             return {
                 "success": False,
-                "error": str(e),
+                "error": parsed["error"],
                 "result": raw_text,
                 "timestamp": datetime.now().isoformat()
             }
 
+        processed = {
+            "success": True,
+            "result": parsed["data"],
+            "timestamp": datetime.now().isoformat()
+        }
+        if parsed["repairs"]:
+            logger.info(f"Repaired crew output ({schema_name}): {parsed['repairs']}")
+            processed["repairs"] = parsed["repairs"]
+        return processed
+
+    async def _repair_with_llm(self, raw_text: str, output_schema: Type[TaskOutput],
+                         error: str) -> Dict[str, Any]:
+        """Ask a small model to rewrite unparseable output as JSON"""
+        instructions = output_instructions(output_schema, "The same content") if output_schema \
+            else "Respond with a single JSON object and nothing else"
+        prompt = (f"The following text should have been a JSON object but could not be parsed "
+                  f"({error}). Rewrite it as valid JSON without changing its meaning. "
+                  f"{instructions}.\n\n{raw_text[:LLM_REPAIR_MAX_INPUT]}")
+        try:
+            message = await repair_caller.acall(
+                async_client(repair_caller.policy.timeout).messages.create,
+                model=LLM_REPAIR_MODEL,
+                max_tokens=1024,
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            text = "".join(block.text for block in message.content if getattr(block, "type", "") == "text")
+        except Exception as e:
+            logger.error(f"LLM repair of crew output failed: {str(e)}")
+            return {"ok": False, "data": None, "repairs": [], "error": error}
+        parsed = parse_crew_output(text, output_schema)
+        if parsed["ok"]:
+            parsed["repairs"] = parsed["repairs"] + ["llm"]
+        else:
+            parsed["error"] = error
+        return parsed
+
+AGENT_FACTORIES = {
+    "workflow": LeaseExitCrew._create_workflow_agent,
+    "form": LeaseExitCrew._create_form_agent,
+    "notification": LeaseExitCrew._create_notification_agent,
+    "approval": LeaseExitCrew._create_approval_agent
+}
+
 __all__ = [
     'LeaseExitCrew'
 ]
\ No newline at end of file
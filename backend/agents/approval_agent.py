@@ -1,6 +1,7 @@
 from crewai import Agent
 from typing import Dict, Any, List
 from backend.tools.approval_tools import ApprovalTools
+from backend.logging_setup import settings as log_settings
 from pydantic import Field, ConfigDict
 
 class ApprovalAgent(Agent):
@@ -15,7 +16,7 @@ class ApprovalAgent(Agent):
             backstory="""You are an AI agent responsible for managing the approval 
             chain in lease exit workflows. You track approvals, ensure proper 
             sequencing, and validate completion.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
             tools=tools.get_tools()
         )
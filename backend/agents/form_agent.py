@@ -1,6 +1,8 @@
 from crewai import Agent
 from typing import Dict, Any
 from backend.tools.form_tools import FormTools
+from backend.workflow_engine import get_state_machine
+from backend.logging_setup import settings as log_settings
 from pydantic import Field, ConfigDict
 
 class FormAgent(Agent):
@@ -15,7 +17,7 @@ class FormAgent(Agent):
             backstory="""You are an AI agent specialized in processing and validating 
             various forms related to lease exit workflows. You ensure all required 
             information is provided and properly formatted.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
             tools=tools.get_tools()
         )
@@ -30,7 +32,11 @@ class FormAgent(Agent):
         })
 
     def process_lease_requirements(self, workflow_id: str, form_data: Dict[str, Any], documents: list) -> str:
-        """Process lease requirements and cost information form"""
+        """Process lease requirements and cost information form.
+
+        ``documents`` are references to files uploaded through /api/documents
+        (``{"sha256": ..., "filename": ...}``), not their content.
+        """
         return self.form_tool._run("create", form_data={
             "workflow_id": workflow_id,
             "form_type": "lease_requirements",
@@ -50,44 +56,7 @@ class FormAgent(Agent):
 
     def validate_form_data(self, form_type: str, form_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate form data based on form type"""
-        validation_rules = {
-            "initial_form": {
-                "required_fields": ["lease_id", "exit_date", "reason"],
-                "field_types": {
-                    "lease_id": str,
-                    "exit_date": str,
-                    "reason": str
-                }
-            },
-            "lease_requirements": {
-                "required_fields": ["cost_estimate", "requirements_list"],
-                "field_types": {
-                    "cost_estimate": float,
-                    "requirements_list": list
-                }
-            },
-            "exit_requirements_ifm": {
-                "required_fields": ["scope_details", "timeline"],
-                "field_types": {
-                    "scope_details": dict,
-                    "timeline": str
-                }
-            },
-            "exit_requirements_mac": {
-                "required_fields": ["maintenance_details", "equipment_list"],
-                "field_types": {
-                    "maintenance_details": str,
-                    "equipment_list": list
-                }
-            },
-            "exit_requirements_pjm": {
-                "required_fields": ["project_plan", "resource_allocation"],
-                "field_types": {
-                    "project_plan": dict,
-                    "resource_allocation": dict
-                }
-            }
-        }
+        validation_rules = get_state_machine().forms
 
         return self.form_tool._run("validate", 
                                  form_type=form_type,
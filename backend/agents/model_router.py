@@ -0,0 +1,191 @@
+"""
+Per-agent and per-task model selection with escalation.
+
+Models are configured in a JSON file: ``CREW_MODEL_CONFIG``, or
+``agents/models.json`` by default. It defines:
+
+- named tiers (model, temperature, max_tokens and price per million tokens)
+- a default tier for each agent
+- for each task operation, an ordered list of tiers to try.
+
+A task runs on its first tier. It is escalated to the next tier when the
+crew raises, when the output does not parse against the task's schema, or
+when the output reports a ``confidence`` below the task's
+``min_confidence``. A tier whose recent success rate has dropped below
+``routing.min_success_rate`` is skipped while that lasts, unless it is the
+last one; every ``routing.probe_every``-th request still tries it, so it can
+recover. Latency and success are recorded for every model, and token use
+and cost are read from the shared per-tier LLM clients, so the tiers can be
+tuned from ``/api/metrics``.
+
+Every tier's LLM calls go through a ``ResilientCaller``. Its deadline,
+attempts and hedging come from the optional ``timeout_seconds``,
+``max_attempts``, ``hedge`` and ``hedge_budget`` keys of the tier, falling
+back to the ``LLM_*`` environment settings.
+"""
+
+from typing import Dict, Any, List, Optional, Type
+from collections import deque
+import json
+import logging
+import os
+import threading
+
+from .output_parser import parse_crew_output
+
+try:
+    from ..llm_resilience import CallPolicy, ResilientCaller, resilient_llm
+except ImportError:
+    from llm_resilience import CallPolicy, ResilientCaller, resilient_llm
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "models.json")
+
+
+def load_model_config(path: str = None) -> Dict[str, Any]:
+    path = path or os.getenv("CREW_MODEL_CONFIG", DEFAULT_CONFIG_PATH)
+    with open(path) as f:
+        config = json.load(f)
+    models = config.get("models", {})
+    for agent, tier in config.get("agents", {}).items():
+        if tier not in models:
+            raise ValueError(f"Agent '{agent}' uses unknown model tier '{tier}'")
+    for operation, task in config.get("tasks", {}).items():
+        unknown = [tier for tier in task.get("tiers", []) if tier not in models]
+        if unknown:
+            raise ValueError(f"Task '{operation}' uses unknown model tiers: {', '.join(unknown)}")
+    return config
+
+
+class ModelStats:
+    """Thread-safe latency and success counters per model"""
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, model: str) -> Dict[str, Any]:
+        if model not in self._models:
+            self._models[model] = {
+                "calls": 0, "successes": 0, "failures": 0, "escalations": 0, "total_latency": 0.0,
+                "recent": deque(maxlen=self.window)
+            }
+        return self._models[model]
+
+    def record(self, model: str, latency: float, ok: bool, escalated: bool = False) -> None:
+        with self._lock:
+            entry = self._entry(model)
+            entry["calls"] += 1
+            entry["successes" if ok else "failures"] += 1
+            entry["escalations"] += escalated
+            entry["total_latency"] += latency
+            entry["recent"].append((latency, ok))
+
+    def recent_success_rate(self, model: str, min_samples: int) -> Optional[float]:
+        """Success rate over the recent window, or None with fewer than ``min_samples`` calls"""
+        with self._lock:
+            recent = list(self._models[model]["recent"]) if model in self._models else []
+        if len(recent) < min_samples:
+            return None
+        return sum(ok for _, ok in recent) / len(recent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {}
+            for model, entry in self._models.items():
+                latencies = sorted(latency for latency, _ in entry["recent"])
+                snapshot[model] = {
+                    **{key: value for key, value in entry.items() if key not in ("recent", "total_latency")},
+                    "success_rate": round(entry["successes"] / entry["calls"], 3) if entry["calls"] else None,
+                    "avg_latency_seconds": round(entry["total_latency"] / entry["calls"], 3) if entry["calls"] else None,
+                    "p95_latency_seconds": round(latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else None
+                }
+            return snapshot
+
+
+class ModelRouter:
+    """Chooses model tiers for agents and tasks, and decides when to escalate"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = config or load_model_config()
+        routing = self.config.get("routing", {})
+        self.min_samples = routing.get("min_samples", 10)
+        self.min_success_rate = routing.get("min_success_rate", 0.6)
+        self.probe_every = routing.get("probe_every", 10)
+        self._skipped: Dict[str, int] = {}
+        self.stats = ModelStats(routing.get("window", 50))
+        self._llms: Dict[str, Any] = {}
+        self.callers: Dict[str, ResilientCaller] = {}
+        self._lock = threading.Lock()
+
+    def model(self, tier: str) -> Dict[str, Any]:
+        return self.config["models"][tier]
+
+    def agent_tier(self, agent: str) -> str:
+        tiers = self.config.get("agents", {})
+        return tiers.get(agent) or next(iter(self.config["models"]))
+
+    def llm(self, tier: str) -> Any:
+        """Shared LLM client for a tier"""
+        with self._lock:
+            if tier not in self._llms:
+                settings = self.model(tier)
+                self.callers[tier] = ResilientCaller(tier, CallPolicy.from_settings(settings))
+                self._llms[tier] = resilient_llm(
+                    self.callers[tier],
+                    model=settings["model"],
+                    temperature=settings.get("temperature"),
+                    max_tokens=settings.get("max_tokens")
+                )
+            return self._llms[tier]
+
+    def route(self, operation: str) -> List[Optional[str]]:
+        """Tiers to try for an operation, in order; [None] means each agent's own tier"""
+        tiers = self.config.get("tasks", {}).get(operation, {}).get("tiers") or [None]
+        healthy = []
+        for tier in tiers[:-1]:
+            rate = self.stats.recent_success_rate(self.model(tier)["model"], self.min_samples)
+            if rate is not None and rate < self.min_success_rate:
+                with self._lock:
+                    self._skipped[tier] = self._skipped.get(tier, 0) + 1
+                    probe = self._skipped[tier] % self.probe_every == 0
+                if not probe:
+                    logger.warning(f"Skipping model tier '{tier}' for {operation}: recent success rate {rate:.0%}")
+                    continue
+            healthy.append(tier)
+        return healthy + tiers[-1:]
+
+    def escalation_reason(self, operation: str, raw_text: str,
+                          output_schema: Type[Any] = None) -> Optional[str]:
+        """Why an output should be retried on a larger model, or None if it is acceptable"""
+        parsed = parse_crew_output(raw_text, output_schema)
+        if not parsed["ok"]:
+            return f"parse failure ({parsed['error']})"
+        confidence = parsed["data"].get("confidence")
+        threshold = self.config.get("tasks", {}).get(operation, {}).get("min_confidence")
+        if threshold is not None and isinstance(confidence, (int, float)) and confidence < threshold:
+            return f"low confidence ({confidence} < {threshold})"
+        return None
+
+    def record(self, tier: str, latency: float, ok: bool, escalated: bool = False) -> None:
+        self.stats.record(self.model(tier)["model"], latency, ok, escalated)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-model stats, with token use and cost since startup"""
+        snapshot = self.stats.snapshot()
+        with self._lock:
+            llms = dict(self._llms)
+        for tier, llm in llms.items():
+            settings = self.model(tier)
+            usage = llm.get_token_usage_summary()
+            cost = (usage.prompt_tokens * settings.get("input_cost_per_mtok", 0)
+                    + usage.completion_tokens * settings.get("output_cost_per_mtok", 0)) / 1_000_000
+            snapshot.setdefault(settings["model"], {}).update({
+                "input_tokens": usage.prompt_tokens,
+                "output_tokens": usage.completion_tokens,
+                "cost_usd": round(cost, 6),
+                "llm_calls": self.callers[tier].snapshot()
+            })
+        return snapshot
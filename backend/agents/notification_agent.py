@@ -1,21 +1,23 @@
 from crewai import Agent
 from typing import Dict, Any, List
 from backend.tools.notification_tools import NotificationTools
+from backend.workflow_engine import get_state_machine
+from backend.logging_setup import settings as log_settings
 from pydantic import Field, ConfigDict
 
 class NotificationAgent(Agent):
     notification_tool: Any = Field(default=None)
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    def __init__(self):
-        tools = NotificationTools()
+    def __init__(self, coalescer: Any = None):
+        tools = NotificationTools(coalescer)
         super().__init__(
             role='Notification Manager',
             goal='Manage and send notifications for lease exit workflow events',
             backstory="""You are an AI agent responsible for managing communications 
             in the lease exit workflow. You ensure all stakeholders are properly 
             notified of relevant events and actions required.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
             tools=tools.get_tools()
         )
@@ -24,15 +26,7 @@ class NotificationAgent(Agent):
     def notify_form_submission(self, workflow_id: str, form_type: str, 
                              submitted_by: str) -> str:
         """Notify relevant stakeholders about form submission"""
-        notification_map = {
-            "initial_form": ["advisory", "ifm", "legal"],
-            "lease_requirements": ["legal", "ifm", "accounting"],
-            "exit_requirements_ifm": ["mac"],
-            "exit_requirements_mac": ["pjm"],
-            "exit_requirements_pjm": ["lease_exit_team"]
-        }
-
-        recipients = notification_map.get(form_type, [])
+        recipients = get_state_machine().form_recipients(form_type)
         if not recipients:
             return None
 
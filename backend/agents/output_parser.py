@@ -0,0 +1,309 @@
+"""
+Tolerant parsing of crew task output into structured results.
+
+Models often wrap JSON in prose or markdown fences, leave trailing commas,
+emit Python literals or get cut off mid-object. Rather than re-running the
+whole crew for those, the parser extracts every JSON candidate from the text,
+repairs it locally and, when a schema is given, uses the schema to pick the
+right candidate and fix up misnamed or mistyped fields.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Type
+from collections import defaultdict
+from threading import Lock
+import ast
+import json
+import re
+
+from pydantic import BaseModel, ValidationError
+
+_CLOSERS = {"{": "}", "[": "]"}
+_OPENERS = re.compile(r"[{\[]")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = [(re.compile(r"\bTrue\b"), "true"), (re.compile(r"\bFalse\b"), "false"),
+                (re.compile(r"\bNone\b"), "null")]
+_MAX_TRUNCATION_CUTS = 16
+
+
+def _segments(text: str) -> List[Tuple[bool, str]]:
+    """Split text into (is_string_literal, chunk) segments"""
+    segments, buf = [], []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            buf.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                segments.append((True, "".join(buf)))
+                buf, in_string = [], False
+        elif char == '"':
+            if buf:
+                segments.append((False, "".join(buf)))
+            buf, in_string = [char], True
+        else:
+            buf.append(char)
+    if buf:
+        segments.append((in_string, "".join(buf)))
+    return segments
+
+
+def _clean(text: str) -> str:
+    """Drop trailing commas and map Python literals to JSON, outside string literals"""
+    parts = []
+    for is_string, chunk in _segments(text):
+        if not is_string:
+            chunk = _TRAILING_COMMA.sub(r"\1", chunk)
+            for pattern, replacement in _PY_LITERALS:
+                chunk = pattern.sub(replacement, chunk)
+        parts.append(chunk)
+    return "".join(parts)
+
+
+def _scan(text: str, start: int = 0) -> Tuple[int, List[str], bool]:
+    """Scan a JSON value starting at ``start``.
+
+    Returns (end, open_brackets, in_string): ``end`` is the index just past the
+    value when it is balanced, -1 when the text ends first (truncated) and -2
+    when a closing bracket does not match.
+    """
+    stack: List[str] = []
+    in_string = escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if not stack or _CLOSERS[stack[-1]] != char:
+                return -2, stack, in_string
+            stack.pop()
+            if not stack:
+                return index + 1, stack, in_string
+    return -1, stack, in_string
+
+
+def extract_json_candidates(text: str) -> List[Tuple[str, bool]]:
+    """Every top-level JSON object or array in ``text`` as (fragment, truncated)"""
+    candidates = []
+    position = 0
+    while True:
+        match = _OPENERS.search(text, position)
+        if not match:
+            break
+        start = match.start()
+        end, _, _ = _scan(text, start)
+        if end == -1:
+            candidates.append((text[start:], True))
+            break
+        if end == -2:
+            position = start + 1
+            continue
+        candidates.append((text[start:end], False))
+        position = end
+    return candidates
+
+
+def _close_truncated(fragment: str) -> str:
+    """Terminate an open string and append the missing closing brackets"""
+    _, stack, in_string = _scan(fragment)
+    text = fragment + ('"' if in_string else "")
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join(_CLOSERS[bracket] for bracket in reversed(stack))
+
+
+def _last_comma(text: str) -> int:
+    offset, position = 0, -1
+    for is_string, chunk in _segments(text):
+        if not is_string and "," in chunk:
+            position = offset + chunk.rindex(",")
+        offset += len(chunk)
+    return position
+
+
+def _loads(fragment: str) -> Any:
+    try:
+        return json.loads(fragment)
+    except ValueError:
+        pass
+    try:
+        return json.loads(_clean(fragment))
+    except ValueError:
+        pass
+    # Python-style dicts with single quotes
+    value = ast.literal_eval(fragment)
+    if not isinstance(value, (dict, list)):
+        raise ValueError("Not a JSON object or array")
+    return value
+
+
+def _parse_candidate(fragment: str, truncated: bool) -> Tuple[Any, List[str]]:
+    """Parse one candidate, repairing it if needed; raises ValueError on failure"""
+    try:
+        value = json.loads(fragment)
+        return value, []
+    except ValueError:
+        pass
+    if not truncated:
+        try:
+            return _loads(fragment), ["syntax"]
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            raise ValueError("Unparseable JSON fragment")
+
+    # Truncated: close it, and if the tail is a half-written member, cut it off
+    text = fragment
+    for _ in range(_MAX_TRUNCATION_CUTS):
+        try:
+            return json.loads(_clean(_close_truncated(text))), ["truncated"]
+        except ValueError:
+            cut = _last_comma(text)
+            if cut <= 0:
+                break
+            text = text[:cut]
+    raise ValueError("Unrecoverable truncated JSON")
+
+
+def _normalize_key(key: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    if value is None:
+        # A null is no more an answer than a missing field
+        return value
+    origin = getattr(annotation, "__origin__", None)
+    if annotation is list or origin is list:
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(",") if item.strip()]
+        return [value]
+    if annotation is bool and isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "y", "1", "valid", "success")
+    if annotation is str:
+        return value if isinstance(value, str) else json.dumps(value)
+    return value
+
+
+def fit_schema(value: Any, schema: Type[BaseModel]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Validate ``value`` against ``schema``, repairing field names and types where possible.
+
+    Only fields the output contains are repaired. A missing required field
+    fails the parse, so the caller escalates rather than acting on an
+    invented value.
+    """
+    try:
+        return schema.model_validate(value).model_dump(), []
+    except ValidationError as e:
+        errors = e.errors()
+    if not isinstance(value, dict):
+        if isinstance(value, list) and len(value) == 1 and isinstance(value[0], dict):
+            data, repairs = fit_schema(value[0], schema)
+            return data, (["unwrapped_list"] + repairs) if data is not None else []
+        return None, []
+
+    data = dict(value)
+    repairs = []
+    normalized = {_normalize_key(key): key for key in data}
+    for error in errors:
+        if len(error["loc"]) < 1 or error["loc"][0] not in schema.model_fields:
+            continue
+        name = error["loc"][0]
+        field = schema.model_fields[name]
+        if error["type"] == "missing":
+            alias = normalized.get(_normalize_key(name))
+            if alias is None or alias == name:
+                return None, []
+            data[name] = data.pop(alias)
+            repairs.append(f"renamed:{alias}->{name}")
+        elif name in data:
+            data[name] = _coerce(data[name], field.annotation)
+            repairs.append(f"coerced:{name}")
+    try:
+        return schema.model_validate(data).model_dump(), repairs
+    except ValidationError:
+        return None, []
+
+
+def parse_crew_output(text: str, schema: Type[BaseModel] = None) -> Dict[str, Any]:
+    """Parse crew output into a dict, repairing it locally where possible.
+
+    Returns a dict with ``ok``, ``data``, ``repairs`` (empty for clean output)
+    and ``error`` when nothing usable was found.
+    """
+    text = (text or "").strip()
+    try:
+        # Fast path: the whole output is valid JSON
+        value = json.loads(text)
+        if schema is None:
+            return {"ok": True, "data": value, "repairs": []}
+        data, repairs = fit_schema(value, schema)
+        if data is not None:
+            return {"ok": True, "data": data, "repairs": repairs}
+    except ValueError:
+        pass
+
+    parsed = []
+    for fragment, truncated in extract_json_candidates(text):
+        try:
+            parsed.append(_parse_candidate(fragment, truncated))
+        except ValueError:
+            continue
+    if not parsed:
+        return {"ok": False, "data": None, "repairs": [], "error": "No JSON object found in crew output"}
+
+    if schema is None:
+        value, repairs = parsed[0]
+        return {"ok": True, "data": value, "repairs": repairs}
+
+    fitted = []
+    for value, repairs in parsed:
+        data, schema_repairs = fit_schema(value, schema)
+        if data is not None:
+            fitted.append((len(schema_repairs), data, repairs + schema_repairs))
+    if not fitted:
+        return {"ok": False, "data": None, "repairs": [],
+                "error": f"Crew output does not match {schema.__name__}"}
+    # Prefer the candidate that needed the fewest schema repairs
+    _, data, repairs = min(fitted, key=lambda item: item[0])
+    return {"ok": True, "data": data, "repairs": repairs}
+
+
+class ParseStats:
+    """Thread-safe counters of crew output parse outcomes"""
+
+    OUTCOMES = ("clean", "repaired", "llm_repaired", "failed")
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = defaultdict(int)
+        self._by_schema = defaultdict(lambda: defaultdict(int))
+
+    def record(self, outcome: str, schema_name: str = "untyped") -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+            self._by_schema[schema_name][outcome] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = {outcome: self._counts[outcome] for outcome in self.OUTCOMES}
+            return {
+                **totals,
+                "total": sum(totals.values()),
+                "by_schema": {name: dict(counts) for name, counts in self._by_schema.items()}
+            }
+
+
+parse_stats = ParseStats()
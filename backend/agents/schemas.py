@@ -0,0 +1,73 @@
+"""
+Output schemas for the structured results each crew task must return.
+"""
+
+from typing import Dict, Any, List, Optional, Type
+import json
+from pydantic import BaseModel, Field, ConfigDict
+
+
+class TaskOutput(BaseModel):
+    """Fields shared by every task result; extra keys from the model are kept"""
+    status: str = Field(..., description="Outcome of the task, e.g. 'success' or 'failed'")
+    summary: Optional[str] = Field(default=None, description="One or two sentence summary")
+    confidence: Optional[float] = Field(default=None, ge=0, le=1,
+                                        description="How sure the agent is of the result, from 0 to 1")
+    model_config = ConfigDict(extra="allow")
+
+
+class WorkflowCreationOutput(TaskOutput):
+    workflow_id: Optional[str] = Field(default=None, description="ID of the workflow being set up")
+    next_steps: List[str] = Field(default_factory=list, description="Upcoming workflow steps")
+    notifications: List[str] = Field(default_factory=list, description="Roles that should be notified")
+
+
+class FormProcessingOutput(TaskOutput):
+    valid: bool = Field(..., description="Whether the form passed validation")
+    errors: List[str] = Field(default_factory=list, description="Validation errors, if any")
+    missing_fields: List[str] = Field(default_factory=list, description="Required fields not provided")
+
+
+class NotificationOutput(TaskOutput):
+    recipients: List[str] = Field(default_factory=list, description="Roles or users notified")
+    delivered: bool = Field(default=True, description="Whether all notifications were sent")
+
+
+class ApprovalOutput(TaskOutput):
+    approved: List[str] = Field(default_factory=list, description="Roles that approved")
+    pending: List[str] = Field(default_factory=list, description="Roles still to decide")
+    rejected: List[str] = Field(default_factory=list, description="Roles that rejected")
+
+
+TASK_OUTPUT_SCHEMAS: Dict[str, Type[TaskOutput]] = {
+    "workflow": WorkflowCreationOutput,
+    "form": FormProcessingOutput,
+    "notification": NotificationOutput,
+    "approval": ApprovalOutput
+}
+
+
+def describe_schema(schema: Type[BaseModel]) -> str:
+    """Compact field listing used in a task's expected_output"""
+    fields = {}
+    for name, field in schema.model_fields.items():
+        annotation = getattr(field.annotation, "__name__", None) or str(field.annotation).replace("typing.", "")
+        fields[name] = f"{annotation}{'' if field.is_required() else ' (optional)'}"
+    return json.dumps(fields)
+
+
+def output_instructions(schema: Type[BaseModel], description: str) -> str:
+    """Expected-output text asking for a bare JSON object matching ``schema``"""
+    return (f"{description}. Respond with a single JSON object and nothing else, "
+            f"with these fields: {describe_schema(schema)}")
+
+
+__all__ = [
+    'TaskOutput',
+    'WorkflowCreationOutput',
+    'FormProcessingOutput',
+    'NotificationOutput',
+    'ApprovalOutput',
+    'TASK_OUTPUT_SCHEMAS',
+    'output_instructions'
+]
@@ -1,6 +1,8 @@
 from crewai import Agent
 from typing import Dict, Any
 from backend.tools.workflow_tools import WorkflowTools
+from backend.workflow_engine import get_state_machine
+from backend.logging_setup import settings as log_settings
 from pydantic import Field, ConfigDict
 
 class WorkflowAgent(Agent):
@@ -14,7 +16,7 @@ class WorkflowAgent(Agent):
             goal='Manage and orchestrate lease exit workflows efficiently',
             backstory="""You are an AI agent responsible for managing lease exit workflows. 
             You ensure all steps are followed correctly and stakeholders are properly involved.""",
-            verbose=True,
+            verbose=log_settings.crew_verbose,
             allow_delegation=True,
             tools=tools.get_tools()
         )
@@ -53,16 +55,7 @@ class WorkflowAgent(Agent):
 
     def _determine_next_step(self, current_step: str, form_data: Dict[str, Any]) -> str:
         """Determine the next step in the workflow based on current state"""
-        step_sequence = {
-            "initial_form": "advisory_review",
-            "advisory_review": "ifm_review",
-            "ifm_review": "mac_review",
-            "mac_review": "pjm_review",
-            "pjm_review": "management_review",
-            "management_review": "approval_chain",
-            "approval_chain": "ready_for_exit"
-        }
-        return step_sequence.get(current_step, current_step)
+        return get_state_machine().next_step(current_step)
 
     def validate_workflow_completion(self, workflow_id: str) -> bool:
         """Validate if all required steps are completed for the workflow"""
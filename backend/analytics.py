@@ -0,0 +1,254 @@
+"""
+Portfolio-wide approval SLA and bottleneck analytics.
+
+Only the columns the statistics need are loaded, with timestamps converted
+to epoch seconds in SQL. They go into NumPy arrays, so grouping, percentiles
+and histograms run vectorized instead of iterating ORM rows. Results are
+cached and keyed on the tables' high-water marks (row count and latest
+updated_at). Any write to approvals or workflows invalidates the cache.
+
+Ages (pending approvals, time in step, queued hours) grow without any
+write, so they are not cached: the cache keeps the timestamps they are
+computed from and every request ages them against the database's clock.
+"""
+
+from typing import Dict, Any, List, Tuple
+from collections import OrderedDict
+from threading import Lock
+import logging
+import time
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+try:
+    from .storage import Approval, Workflow
+except ImportError:
+    from storage import Approval, Workflow
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600.0
+DECIDED_STATUSES = ("approved", "rejected")
+# Turnaround histogram edges in hours: under an hour up to more than a month
+HISTOGRAM_EDGES_HOURS = [0, 1, 4, 8, 24, 48, 72, 168, 336, 720, np.inf]
+PERCENTILES = (50, 90, 95)
+
+
+def _epoch_seconds(engine: Any, column: Any) -> Any:
+    """SQL expression converting a DATETIME column to epoch seconds"""
+    if engine.dialect.name == "postgresql":
+        return func.extract("epoch", column)
+    return (func.julianday(column) - 2440587.5) * 86400.0
+
+
+def _now_seconds(engine: Any) -> Any:
+    """SQL expression for the database's current time, on the same scale as ``_epoch_seconds``.
+
+    Timestamps are stored as naive local times and converted as if they were
+    UTC, so the current time must be the local time read the same way.
+    """
+    if engine.dialect.name == "postgresql":
+        return func.extract("epoch", func.localtimestamp())
+    return (func.julianday("now", "localtime") - 2440587.5) * 86400.0
+
+
+def _percentiles(values: np.ndarray) -> Dict[str, Any]:
+    if values.size == 0:
+        return {f"p{p}": None for p in PERCENTILES}
+    computed = np.percentile(values, PERCENTILES)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, computed)}
+
+
+def _grouped(codes: np.ndarray, values: np.ndarray, labels: np.ndarray) -> Dict[str, np.ndarray]:
+    """Split ``values`` by group code with a single sort"""
+    if values.size == 0:
+        return {}
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    groups = np.split(values[order], boundaries)
+    group_codes = sorted_codes[np.concatenate(([0], boundaries))]
+    return {str(labels[code]): group for code, group in zip(group_codes, groups)}
+
+
+def _histogram(hours: np.ndarray) -> List[Dict[str, Any]]:
+    counts, _ = np.histogram(hours, bins=HISTOGRAM_EDGES_HOURS)
+    return [
+        {"from_h": lo, "to_h": None if np.isinf(hi) else hi, "count": int(count)}
+        for lo, hi, count in zip(HISTOGRAM_EDGES_HOURS[:-1], HISTOGRAM_EDGES_HOURS[1:], counts)
+    ]
+
+
+class ApprovalAnalytics:
+    """Computes approval turnaround, time-in-step and bottleneck statistics"""
+
+    def __init__(self, storage: Any, cache_size: int = 8):
+        self.storage = storage
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def high_water_marks(self) -> Tuple[Tuple, float]:
+        """Row counts and latest update times of the tables the analytics read, and the database's clock"""
+        engine = self.storage.engine
+        with Session(engine) as session:
+            approvals = session.execute(
+                select(func.count(Approval.id), func.max(Approval.updated_at))).one()
+            workflows = session.execute(
+                select(func.count(Workflow.id), func.max(Workflow.updated_at))).one()
+            now = session.execute(select(_now_seconds(engine))).scalar()
+        return (tuple(approvals), tuple(workflows)), float(now)
+
+    def get_analytics(self) -> Dict[str, Any]:
+        """Analytics as of now; everything but the ages is recomputed only when the underlying tables changed"""
+        key, now = self.high_water_marks()
+        with self._lock:
+            snapshot = self._cache.get(key)
+            if snapshot is not None:
+                self._cache.move_to_end(key)
+        cached = snapshot is not None
+        if not cached:
+            snapshot = self.compute()
+            with self._lock:
+                self._cache[key] = snapshot
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return {**self.with_ages(snapshot, now), "cached": cached}
+
+    def _load_approvals(self) -> Dict[str, np.ndarray]:
+        engine = self.storage.engine
+        query = (
+            select(
+                Approval.approver_role,
+                Approval.status,
+                _epoch_seconds(engine, Approval.created_at),
+                _epoch_seconds(engine, Approval.updated_at),
+                Workflow.property_type
+            )
+            .select_from(Approval)
+            .join(Workflow, Workflow.id == Approval.workflow_id)
+        )
+        with Session(engine) as session:
+            rows = session.execute(query).all()
+        if not rows:
+            empty = np.array([], dtype=object)
+            return {"role": empty, "status": empty, "created": np.array([]),
+                    "updated": np.array([]), "property_type": empty}
+        role, status, created, updated, property_type = zip(*rows)
+        return {
+            "role": np.array([r or "unknown" for r in role], dtype=object),
+            "status": np.array(status, dtype=object),
+            "created": np.array(created, dtype=np.float64),
+            "updated": np.array(updated, dtype=np.float64),
+            "property_type": np.array([p or "unknown" for p in property_type], dtype=object)
+        }
+
+    def _load_workflow_steps(self) -> Dict[str, np.ndarray]:
+        engine = self.storage.engine
+        query = select(Workflow.current_step, _epoch_seconds(engine, Workflow.updated_at)).where(
+            Workflow.state != "completed")
+        with Session(engine) as session:
+            rows = session.execute(query).all()
+        if not rows:
+            return {"step": np.array([], dtype=object), "updated": np.array([])}
+        step, updated = zip(*rows)
+        return {
+            "step": np.array([s or "initial" for s in step], dtype=object),
+            "updated": np.array(updated, dtype=np.float64)
+        }
+
+    def compute(self) -> Dict[str, Any]:
+        """Compute the statistics from scratch; ages are added by ``with_ages``"""
+        started = time.perf_counter()
+        approvals = self._load_approvals()
+        steps = self._load_workflow_steps()
+
+        decided = np.isin(approvals["status"], DECIDED_STATUSES) & ~np.isnan(approvals["updated"])
+        pending = approvals["status"] == "pending"
+        turnaround_h = (approvals["updated"][decided] - approvals["created"][decided]) / HOUR
+
+        roles, role_codes = np.unique(approvals["role"].astype(str), return_inverse=True)
+        types, type_codes = np.unique(approvals["property_type"].astype(str), return_inverse=True)
+        months = approvals["created"].astype("datetime64[s]").astype("datetime64[M]").astype(str) \
+            if approvals["created"].size else np.array([], dtype=str)
+        month_labels, month_codes = np.unique(months, return_inverse=True)
+
+        turnaround_by_role = _grouped(role_codes[decided], turnaround_h, roles)
+        pending_by_role = _grouped(role_codes[pending], approvals["created"][pending], roles)
+        approved_by_role = _grouped(role_codes[decided],
+                                    (approvals["status"][decided] == "approved").astype(np.float64), roles)
+
+        by_role = {}
+        for role in roles:
+            role = str(role)
+            turnaround = turnaround_by_role.get(role, np.array([]))
+            waiting = pending_by_role.get(role, np.array([]))
+            approved = approved_by_role.get(role, np.array([]))
+            by_role[role] = {
+                "decided": int(turnaround.size),
+                "pending": int(waiting.size),
+                "approval_rate": round(float(approved.mean()), 3) if approved.size else None,
+                "turnaround_h": _percentiles(turnaround),
+                "histogram": _histogram(turnaround)
+            }
+
+        by_property_type = {
+            label: {"decided": int(values.size), "turnaround_h": _percentiles(values)}
+            for label, values in _grouped(type_codes[decided], turnaround_h, types).items()
+        }
+        by_month = {
+            label: {"decided": int(values.size), "turnaround_h": _percentiles(values)}
+            for label, values in sorted(_grouped(month_codes[decided], turnaround_h, month_labels).items())
+        }
+
+        step_labels, step_codes = np.unique(steps["step"].astype(str), return_inverse=True)
+
+        return {
+            "approvals": int(approvals["status"].size),
+            "overall": {
+                "decided": int(turnaround_h.size),
+                "pending": int(np.count_nonzero(pending)),
+                "turnaround_h": _percentiles(turnaround_h),
+                "histogram": _histogram(turnaround_h)
+            },
+            "by_role": by_role,
+            "by_property_type": by_property_type,
+            "by_month": by_month,
+            "computed_in_ms": round((time.perf_counter() - started) * 1000, 1),
+            "computed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            # Timestamps the ages are computed from
+            "_pending_created": pending_by_role,
+            "_step_updated": _grouped(step_codes, steps["updated"], step_labels)
+        }
+
+    @staticmethod
+    def with_ages(snapshot: Dict[str, Any], now: float) -> Dict[str, Any]:
+        """A computed snapshot with pending ages, time in step and bottlenecks as of ``now``"""
+        result = {key: value for key, value in snapshot.items() if not key.startswith("_")}
+        pending_age_h = {role: (now - created) / HOUR for role, created in snapshot["_pending_created"].items()}
+        result["by_role"] = {
+            role: {**stats, "pending_age_h": _percentiles(pending_age_h.get(role, np.array([])))}
+            for role, stats in snapshot["by_role"].items()
+        }
+        result["time_in_step"] = {
+            step: {"workflows": int(updated.size), "age_h": _percentiles((now - updated) / HOUR)}
+            for step, updated in snapshot["_step_updated"].items()
+        }
+
+        # Bottlenecks: hours of approval work currently queued behind each role
+        result["bottlenecks"] = sorted(
+            (
+                {
+                    "role": role,
+                    "pending": stats["pending"],
+                    "queued_hours": round(float(pending_age_h.get(role, np.array([])).sum()), 1),
+                    "turnaround_p90_h": stats["turnaround_h"]["p90"]
+                }
+                for role, stats in snapshot["by_role"].items()
+            ),
+            key=lambda item: (item["queued_hours"], item["turnaround_p90_h"] or 0),
+            reverse=True
+        )
+        return result
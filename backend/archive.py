@@ -0,0 +1,191 @@
+"""
+Hot/cold archival of completed workflows and old notifications.
+
+Workflows in a terminal state that have not changed for ``min_age_days`` are
+moved, with their forms, approvals and notifications, into the archive
+database configured on the Storage (``LEASE_EXIT_ARCHIVE_URL``).
+Sent and failed notifications older than ``notification_age_days`` are
+moved as well, even for live workflows. Storage falls back to the archive on reads, so archived
+workflows remain readable through ``get_workflow``/``get_workflow_progress``.
+
+Rows are copied to the archive first and deleted from the hot database only
+after that copy has committed. Copies ignore rows that already exist, so a
+run interrupted between the two steps is completed by the next one.
+
+    cd backend
+    LEASE_EXIT_ARCHIVE_URL=sqlite:///lease_exit_archive.db python -m archive --min-age-days 90
+"""
+
+from typing import Dict, Any, List
+from datetime import datetime, timedelta
+import argparse
+import logging
+import os
+
+from sqlalchemy import select, delete, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+try:
+    from .storage import (Storage, Workflow, Form, Approval, Notification, NotificationRecipient,
+                          adjust_inbox_counters)
+    from .workflow_engine import get_state_machine
+except ImportError:
+    from storage import (Storage, Workflow, Form, Approval, Notification, NotificationRecipient,
+                         adjust_inbox_counters)
+    from workflow_engine import get_state_machine
+
+logger = logging.getLogger(__name__)
+
+# Children moved together with their workflow; deleted before it
+CHILD_TABLES = [Form.__table__, Approval.__table__, Notification.__table__]
+# Notifications past delivery, which can move to the archive on their own
+FINISHED_NOTIFICATION_STATUSES = ("sent", "failed")
+
+
+def optimize_database(engine: Any, vacuum_threshold: float = 0.2, force_vacuum: bool = False) -> Dict[str, Any]:
+    """Refresh planner statistics and, on SQLite, VACUUM once enough pages are free"""
+    result = {"analyzed": False, "vacuumed": False, "free_ratio": None}
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+        result["analyzed"] = True
+        if engine.dialect.name != "sqlite":
+            return result
+        pages = connection.execute(text("PRAGMA page_count")).scalar() or 0
+        free = connection.execute(text("PRAGMA freelist_count")).scalar() or 0
+        result["free_ratio"] = round(free / pages, 3) if pages else 0.0
+        if force_vacuum or result["free_ratio"] > vacuum_threshold:
+            connection.execute(text("VACUUM"))
+            result["vacuumed"] = True
+            logger.info(f"Vacuumed database ({free} of {pages} pages were free)")
+    return result
+
+
+class Archiver:
+    """Moves cold rows from the hot database into the archive database"""
+
+    def __init__(self, storage: Storage,
+                 min_age_days: float = None,
+                 notification_age_days: float = None,
+                 batch_size: int = 500,
+                 vacuum_threshold: float = 0.2):
+        if storage.archive_engine is None:
+            raise ValueError("Storage has no archive database; set LEASE_EXIT_ARCHIVE_URL")
+        if storage.archive_engine.dialect.name != "sqlite":
+            raise ValueError("The archive database must be SQLite")
+        self.storage = storage
+        if min_age_days is None:
+            min_age_days = float(os.getenv("ARCHIVE_MIN_AGE_DAYS", "90"))
+        if notification_age_days is None:
+            notification_age_days = float(os.getenv("ARCHIVE_NOTIFICATION_AGE_DAYS", "30"))
+        self.min_age_days = min_age_days
+        self.notification_age_days = notification_age_days
+        self.batch_size = batch_size
+        # Fraction of free pages in the hot database above which it is vacuumed
+        self.vacuum_threshold = vacuum_threshold
+
+    def _copy(self, table: Any, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            with self.storage.archive_engine.begin() as connection:
+                connection.execute(sqlite_insert(table).on_conflict_do_nothing(), rows)
+
+    def _move_recipients(self, session: Session, notification_ids: Any) -> None:
+        """Move inbox rows of archived notifications and take them out of the inbox counters"""
+        table = NotificationRecipient.__table__
+        rows = [dict(row) for row in session.execute(
+            select(table).where(table.c.notification_id.in_(notification_ids))).mappings()]
+        if not rows:
+            return
+        self._copy(table, rows)
+        deltas = {}
+        for row in rows:
+            delta = deltas.setdefault(row["user_id"], [0, 0])
+            delta[0] -= row["read_at"] is None
+            delta[1] -= 1
+        adjust_inbox_counters(session, deltas)
+        session.execute(delete(table).where(table.c.notification_id.in_(notification_ids)))
+
+    def archive_workflows(self, now: datetime = None) -> int:
+        """Move terminal workflows untouched for ``min_age_days`` and their children"""
+        cutoff = (now or datetime.now()) - timedelta(days=self.min_age_days)
+        machine = get_state_machine()
+        cold = select(Workflow.id).where(
+            or_(Workflow.current_step.in_(machine.terminal_steps), Workflow.state.in_(machine.terminal_states)),
+            Workflow.updated_at < cutoff
+        ).limit(self.batch_size)
+
+        moved = 0
+        while True:
+            with Session(self.storage.engine) as session:
+                ids = list(session.scalars(cold))
+                if not ids:
+                    break
+                workflow_table = Workflow.__table__
+                self._copy(workflow_table, [dict(row) for row in session.execute(
+                    select(workflow_table).where(workflow_table.c.id.in_(ids))).mappings()])
+                for table in CHILD_TABLES:
+                    self._copy(table, [dict(row) for row in session.execute(
+                        select(table).where(table.c.workflow_id.in_(ids))).mappings()])
+                notifications = Notification.__table__
+                self._move_recipients(session, select(notifications.c.id).where(
+                    notifications.c.workflow_id.in_(ids)))
+                for table in CHILD_TABLES:
+                    session.execute(delete(table).where(table.c.workflow_id.in_(ids)))
+                session.execute(delete(workflow_table).where(workflow_table.c.id.in_(ids)))
+                session.commit()
+            moved += len(ids)
+            logger.info(f"Archived {moved} workflows so far")
+        return moved
+
+    def archive_notifications(self, now: datetime = None) -> int:
+        """Move delivered or failed notifications older than ``notification_age_days``"""
+        cutoff = (now or datetime.now()) - timedelta(days=self.notification_age_days)
+        table = Notification.__table__
+        # Pending and sending rows are still in the outbox; the dispatcher only claims from the hot database
+        old = select(table).where(table.c.created_at < cutoff,
+                                  table.c.status.in_(FINISHED_NOTIFICATION_STATUSES)).limit(self.batch_size)
+
+        moved = 0
+        while True:
+            with Session(self.storage.engine) as session:
+                rows = [dict(row) for row in session.execute(old).mappings()]
+                if not rows:
+                    break
+                self._copy(table, rows)
+                ids = [row["id"] for row in rows]
+                self._move_recipients(session, ids)
+                session.execute(delete(table).where(table.c.id.in_(ids)))
+                session.commit()
+            moved += len(rows)
+        if moved:
+            logger.info(f"Archived {moved} notifications")
+        return moved
+
+    def run(self, now: datetime = None) -> Dict[str, Any]:
+        """One maintenance pass: archive workflows and notifications, then optimize"""
+        workflows = self.archive_workflows(now)
+        notifications = self.archive_notifications(now)
+        optimized = optimize_database(self.storage.engine, self.vacuum_threshold)
+        return {"workflows": workflows, "notifications": notifications, **optimized}
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Move completed workflows and old notifications to the archive")
+    parser.add_argument("--database-url", help="SQLAlchemy URL of the hot database")
+    parser.add_argument("--archive-url", help="SQLite URL of the archive (defaults to LEASE_EXIT_ARCHIVE_URL)")
+    parser.add_argument("--min-age-days", type=float, default=90, help="Archive terminal workflows older than this")
+    parser.add_argument("--notification-age-days", type=float, default=30, help="Archive notifications older than this")
+    parser.add_argument("--vacuum", action="store_true", help="Always VACUUM the hot database afterwards")
+    args = parser.parse_args(argv)
+
+    storage = Storage(args.database_url, args.archive_url)
+    archiver = Archiver(storage, args.min_age_days, args.notification_age_days)
+    workflows = archiver.archive_workflows()
+    notifications = archiver.archive_notifications()
+    optimized = optimize_database(storage.engine, archiver.vacuum_threshold, force_vacuum=args.vacuum)
+    print(f"Archived {workflows} workflows and {notifications} notifications; "
+          f"vacuumed: {optimized['vacuumed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Benchmark suites for the Lease Exit Workflow Management System.
+
+Run the suites from the backend directory, e.g. ``python -m benchmarks.http_bench``.
+"""
+
+import os
+import sys
+
+# The application modules import each other as top-level modules (see main.py),
+# while the tools package imports them through ``backend``. Make both resolvable.
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (_BACKEND_DIR, os.path.dirname(_BACKEND_DIR)):
+    if _path not in sys.path:
+        sys.path.append(_path)
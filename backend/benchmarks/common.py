@@ -0,0 +1,90 @@
+"""
+Shared helpers for the benchmark suites: latency summaries, reports and
+baseline comparison.
+"""
+
+from typing import Dict, Any, List
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = rank - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize_latencies(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Summarize a list of latencies (seconds) into throughput and percentiles"""
+    ordered = sorted(latencies)
+    completed = len(ordered)
+    return {
+        "requests": completed + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(ordered) / completed * 1000, 3) if completed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    """Describe the machine a report was produced on"""
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def write_report(report: Dict[str, Any], path: str = None) -> None:
+    """Write a report as JSON to a file, or to stdout when no path is given"""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    """Load a baseline report, returning an empty report if it does not exist"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]],
+                        baseline: Dict[str, Dict[str, Any]],
+                        threshold: float,
+                        lower_is_better: List[str],
+                        higher_is_better: List[str]) -> List[Dict[str, Any]]:
+    """Return every metric that regressed by more than ``threshold`` (a fraction)"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in lower_is_better:
+            old, new = previous.get(metric), current.get(metric)
+            if old and new is not None and new > old * (1 + threshold):
+                regressions.append({"case": key, "metric": metric, "baseline": old, "current": new})
+        for metric in higher_is_better:
+            old, new = previous.get(metric), current.get(metric)
+            if old and new is not None and new < old * (1 - threshold):
+                regressions.append({"case": key, "metric": metric, "baseline": old, "current": new})
+    return regressions
@@ -0,0 +1,89 @@
+"""
+A local stand-in for the Anthropic Messages API with injected latency and errors.
+
+Every request sleeps for ``latency`` seconds plus up to ``jitter``. A
+``tail_rate`` fraction of requests sleeps for ``tail_latency`` instead, and an
+``error_rate`` fraction fails with 529 (overloaded). Replies carry the same
+canned crew result as the in-process stub, so the real client, retry and
+parsing code paths run without network access or an API key.
+
+    cd backend
+    python -m benchmarks.fake_llm --port 8089 --latency 0.2 --tail-rate 0.05 --tail-latency 3
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8089 ANTHROPIC_API_KEY=fake python run.py
+"""
+
+from typing import Dict, Any, List
+import argparse
+import asyncio
+import random
+import sys
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from .stubs import CANNED_RESULT
+
+
+def create_app(latency: float = 0.2, jitter: float = 0.05, tail_rate: float = 0.0,
+               tail_latency: float = 5.0, error_rate: float = 0.0, seed: int = None) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    rng = random.Random(seed)
+    app.state.stats = {"requests": 0, "tail": 0, "errors": 0}
+
+    @app.post("/v1/messages")
+    async def create_message(request: Request):
+        body = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(latency / 4)
+            return JSONResponse(status_code=529, content={
+                "type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+        if rng.random() < tail_rate:
+            stats["tail"] += 1
+            await asyncio.sleep(tail_latency)
+        else:
+            await asyncio.sleep(latency + rng.uniform(0, jitter))
+        prompt = str(body.get("messages", ""))
+        return {
+            "id": f"msg_fake_{stats['requests']}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": CANNED_RESULT}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(CANNED_RESULT) // 4}
+        }
+
+    @app.get("/stats")
+    async def get_stats() -> Dict[str, Any]:
+        return app.state.stats
+
+    return app
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API with injected latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Uniform extra delay, up to this many seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of requests that are slow")
+    parser.add_argument("--tail-latency", type=float, default=5.0, help="Response time of slow requests")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 529")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    import uvicorn
+    args = parse_args(argv)
+    app = create_app(args.latency, args.jitter, args.tail_rate, args.tail_latency, args.error_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
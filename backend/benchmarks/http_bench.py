@@ -0,0 +1,297 @@
+"""
+HTTP-level benchmark for the lease exit API.
+
+Drives the FastAPI app over real HTTP, either against an in-process uvicorn
+server (with the LLM stubbed and a freshly seeded database per dataset size)
+or against an already running server given with ``--url``.
+
+    cd backend
+    python -m benchmarks.http_bench --sizes 1000,100000 --concurrency 1,16,64
+    python -m benchmarks.http_bench --update-baseline
+    uvicorn benchmarks.http_bench:create_stub_app --factory   # stubbed server for --url runs
+"""
+
+from typing import Dict, Any, List, Callable, Awaitable
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from . import common
+from .stubs import install_llm_stub
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/workflow/lease-exit"
+SCENARIOS = ["create", "form", "list", "get", "progress", "events"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "http.json")
+
+CREATE_PAYLOAD = {
+    "propertyName": "Benchmark Tower",
+    "propertyType": "Commercial",
+    "leaseEndDate": "2026-12-31",
+    "exitReason": "Consolidation",
+    "submittedBy": "bench"
+}
+
+FORM_PAYLOAD = {
+    "formType": "lease_requirements",
+    "submittedBy": "bench",
+    "cost_estimate": 125000.0,
+    "requirements_list": ["remove signage", "restore flooring"]
+}
+
+
+def _import_app(database_url: str):
+    """Import the FastAPI module against the given database
+
+    An already imported module is reloaded, so the storage and every component
+    built on it (engine, dispatcher, caches) are created fresh for the new database.
+    """
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-stub")
+    # All benchmark traffic comes from one client; per-client rate limits would throttle it
+    os.environ.setdefault("CLIENT_RATE_PER_MINUTE", "1000000")
+    os.environ.setdefault("CLIENT_BURST", "1000000")
+    os.environ["LEASE_EXIT_DATABASE_URL"] = database_url
+    if "main" in sys.modules:
+        return importlib.reload(sys.modules["main"])
+    import main
+    return main
+
+
+def create_stub_app():
+    """App factory serving the real API with a stubbed LLM (for ``--url`` runs)"""
+    main = _import_app(os.getenv("LEASE_EXIT_DATABASE_URL", "sqlite:///bench.db"))
+    install_llm_stub(main, float(os.getenv("BENCH_LLM_LATENCY", "0")))
+    return main.app
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Runs a uvicorn server for the given app on a background thread"""
+
+    def __init__(self, app: Any, host: str = "127.0.0.1"):
+        import uvicorn
+        port = _free_port()
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Benchmark server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def run_scenario(client: httpx.AsyncClient,
+                       request: Callable[[httpx.AsyncClient, int], Awaitable[None]],
+                       total: int, concurrency: int) -> Dict[str, Any]:
+    """Issue ``total`` requests from ``concurrency`` workers and summarize them"""
+    latencies: List[float] = []
+    errors = 0
+    indices = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for index in indices:
+            start = time.perf_counter()
+            try:
+                await request(client, index)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors += 1
+                logger.debug(f"Benchmark request failed: {str(e)}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return common.summarize_latencies(latencies, errors, time.perf_counter() - started)
+
+
+def build_requests(workflow_ids: List[str], seed: int) -> Dict[str, Callable]:
+    """Build one request coroutine per scenario"""
+    rng = random.Random(seed)
+
+    def pick() -> str:
+        return rng.choice(workflow_ids)
+
+    async def create(client, index):
+        response = await client.post(f"{API_PREFIX}/create", json=CREATE_PAYLOAD)
+        response.raise_for_status()
+
+    async def form(client, index):
+        response = await client.post(f"{API_PREFIX}/{pick()}/form", json=FORM_PAYLOAD)
+        response.raise_for_status()
+
+    async def list_all(client, index):
+        response = await client.get(f"{API_PREFIX}/list")
+        response.raise_for_status()
+
+    async def get(client, index):
+        response = await client.get(f"{API_PREFIX}/{pick()}")
+        response.raise_for_status()
+
+    async def progress(client, index):
+        response = await client.get(f"{API_PREFIX}/{pick()}/progress")
+        response.raise_for_status()
+
+    async def events(client, index):
+        # Time to the initial_state event, which is what a client waits on
+        async with client.stream("GET", f"{API_PREFIX}/{pick()}/events") as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    return
+        raise RuntimeError("Event stream closed before the initial state")
+
+    return {
+        "create": create,
+        "form": form,
+        "list": list_all,
+        "get": get,
+        "progress": progress,
+        "events": events
+    }
+
+
+async def bench_server(url: str, workflow_ids: List[str], label: str,
+                       args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Run every selected scenario at every concurrency level against ``url``"""
+    results = {}
+    requests = build_requests(workflow_ids, args.seed)
+    for concurrency in args.concurrency:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+            for scenario in args.scenarios:
+                total = args.list_requests if scenario == "list" else args.requests
+                if args.warmup:
+                    await run_scenario(client, requests[scenario], min(args.warmup, total), concurrency)
+                summary = await run_scenario(client, requests[scenario], total, concurrency)
+                summary.update({"scenario": scenario, "dataset": label, "concurrency": concurrency})
+                key = f"{scenario}@{label}x{concurrency}"
+                results[key] = summary
+                logger.info(f"{key}: {summary['throughput_rps']} req/s, "
+                            f"p50 {summary['p50_ms']}ms p95 {summary['p95_ms']}ms p99 {summary['p99_ms']}ms")
+    return results
+
+
+async def _external_workflow_ids(url: str, timeout: float) -> List[str]:
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+        response = await client.get(f"{API_PREFIX}/list")
+        response.raise_for_status()
+        return [w["id"] for w in response.json()]
+
+
+def run(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Run the benchmark and return results keyed by case"""
+    if args.url:
+        workflow_ids = asyncio.run(_external_workflow_ids(args.url, args.timeout))
+        if not workflow_ids:
+            raise SystemExit("The target server has no workflows to read; seed it first")
+        return asyncio.run(bench_server(args.url, workflow_ids, "external", args))
+
+    from .seed import seed_portfolio
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="lease_exit_bench_") as workdir:
+        for size in args.sizes:
+            # A fresh app per size; its components would otherwise keep the previous database
+            main = _import_app(f"sqlite:///{os.path.join(workdir, f'bench_{size}.db')}")
+            install_llm_stub(main, args.llm_latency)
+            workflow_ids = seed_portfolio(main.storage, size, seed=args.seed)["workflows"]
+            with ServerThread(main.app) as server:
+                results.update(asyncio.run(bench_server(server.url, workflow_ids, str(size), args)))
+    return results
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="HTTP benchmark for the lease exit API")
+    parser.add_argument("--url", help="Benchmark a running server instead of an in-process one")
+    parser.add_argument("--sizes", type=_int_list, default=[1000],
+                        help="Comma-separated dataset sizes (workflows) to seed, e.g. 1000,100000")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 16],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=SCENARIOS,
+                        help=f"Comma-separated scenarios ({','.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--list-requests", type=int, default=20,
+                        help="Requests for the list scenario, which returns the whole dataset")
+    parser.add_argument("--warmup", type=int, default=10, help="Warmup requests per scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds the stubbed crew sleeps per kickoff")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed regression as a fraction of the baseline (default 0.15)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    results = run(args)
+    report = {
+        "suite": "http",
+        "environment": common.environment_info(),
+        "config": {
+            "sizes": args.sizes,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "url": args.url
+        },
+        "results": results
+    }
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        common.write_report(report, args.baseline)
+        logger.info(f"Baseline written to {args.baseline}")
+    else:
+        baseline = common.load_baseline(args.baseline).get("results", {})
+        report["regressions"] = common.compare_to_baseline(
+            results, baseline, args.threshold,
+            lower_is_better=["p50_ms", "p95_ms", "p99_ms"],
+            higher_is_better=["throughput_rps"]
+        )
+    common.write_report(report, args.output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Benchmark of the JSON codec on large crew results.
+
+Compares the standard library with the shared codec (orjson when installed)
+for encoding and decoding, and for SSE fan-out where the same event is sent
+to many subscribers: encoding per subscriber versus encoding once.
+
+    cd backend
+    python -m benchmarks.json_bench --clients 50 --output json.json
+"""
+
+from typing import Dict, Any, List, Callable
+from datetime import datetime
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from . import common
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "json.json")
+
+
+def large_crew_result(items: int) -> Dict[str, Any]:
+    """A workflow progress document with a large crew_result, as stored and streamed"""
+    return {
+        "id": "wf_1739416628.471",
+        "state": "in_progress",
+        "current_step": "ifm_review",
+        "data": {
+            "property_name": "Office Space - San Francisco",
+            "property_type": "Commercial",
+            "lease_end_date": "2026-12-31",
+            "crew_result": {
+                "success": True,
+                "timestamp": datetime.now().isoformat(),
+                "result": {
+                    "status": "success",
+                    "summary": "Exit requirements assessed. " * 20,
+                    "next_steps": [f"step_{i}" for i in range(50)],
+                    "requirements": [
+                        {
+                            "id": i,
+                            "description": f"Restore area {i} to original condition",
+                            "cost_estimate": 1250.5 + i,
+                            "owner": ["ifm", "mac", "pjm"][i % 3],
+                            "complete": i % 2 == 0,
+                            "tags": ["flooring", "signage", "hvac"]
+                        }
+                        for i in range(items)
+                    ]
+                }
+            }
+        },
+        "forms": [{"id": f"form_{i}", "form_type": "exit_requirements_ifm"} for i in range(20)],
+        "approvals": [{"id": f"appr_{i}", "status": "pending"} for i in range(5)]
+    }
+
+
+def _ops_per_sec(fn: Callable[[], Any], iterations: int) -> Dict[str, Any]:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    summary = common.summarize_latencies(latencies, 0, time.perf_counter() - started)
+    return {"ops_per_sec": summary["throughput_rps"], "mean_ms": summary["mean_ms"], "p95_ms": summary["p95_ms"]}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    import jsoncodec
+
+    document = large_crew_result(args.items)
+    encoded = json.dumps(document)
+    event = {"workflow_id": document["id"], "type": "workflow_update", "data": document}
+    logger.info(f"Document size: {len(encoded) / 1024:.1f} KiB, codec backend: {jsoncodec.BACKEND}")
+
+    cases = {
+        "encode.stdlib": lambda: json.dumps(document),
+        "encode.codec": lambda: jsoncodec.dumps(document),
+        "decode.stdlib": lambda: json.loads(encoded),
+        "decode.codec": lambda: jsoncodec.loads(encoded),
+        # One event delivered to every subscriber of a workflow
+        "sse_fanout.per_client_stdlib": lambda: [json.dumps(event) for _ in range(args.clients)],
+        "sse_fanout.encode_once_codec": lambda: [jsoncodec.dumps(event)] * args.clients,
+    }
+    results = {}
+    for name, fn in cases.items():
+        for _ in range(args.warmup):
+            fn()
+        summary = _ops_per_sec(fn, args.iterations)
+        summary.update({"case": name, "backend": jsoncodec.BACKEND, "bytes": len(encoded)})
+        results[name] = summary
+        logger.info(f"{name}: {summary['ops_per_sec']} ops/s, mean {summary['mean_ms']}ms")
+
+    for operation in ("encode", "decode"):
+        stdlib, codec = results[f"{operation}.stdlib"], results[f"{operation}.codec"]
+        codec["speedup"] = round(codec["ops_per_sec"] / stdlib["ops_per_sec"], 2) if stdlib["ops_per_sec"] else None
+    fanout = results["sse_fanout.encode_once_codec"]
+    per_client = results["sse_fanout.per_client_stdlib"]
+    fanout["speedup"] = round(fanout["ops_per_sec"] / per_client["ops_per_sec"], 2) if per_client["ops_per_sec"] else None
+    return results
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="JSON codec benchmark on large crew results")
+    parser.add_argument("--items", type=int, default=2000, help="Requirement entries in the crew result")
+    parser.add_argument("--clients", type=int, default=50, help="SSE subscribers per workflow")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed regression as a fraction of the baseline (default 0.15)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    results = run(args)
+    report = {
+        "suite": "json",
+        "environment": common.environment_info(),
+        "config": {"items": args.items, "clients": args.clients, "iterations": args.iterations},
+        "results": results
+    }
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        common.write_report(report, args.baseline)
+        logger.info(f"Baseline written to {args.baseline}")
+    else:
+        baseline = common.load_baseline(args.baseline).get("results", {})
+        report["regressions"] = common.compare_to_baseline(
+            results, baseline, args.threshold,
+            lower_is_better=["p95_ms"],
+            higher_is_better=["ops_per_sec"]
+        )
+    common.write_report(report, args.output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Benchmark of LLM call policies against the fake LLM server.
+
+Runs the same workload through the real crewai/Anthropic client three ways:
+
+- ``plain``: one attempt, no retries
+- ``retry``: deadlines and jittered retries
+- ``hedged``: retries plus hedged requests
+
+The fake server injects slow responses and 529 errors, so the report shows
+what retries do to the error rate and what hedging does to the p99.
+
+    cd backend
+    python -m benchmarks.llm_bench --calls 400 --concurrency 8 --tail-rate 0.05 --tail-latency 3
+"""
+
+from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import logging
+import os
+import sys
+import time
+
+from . import common
+from .fake_llm import create_app
+from .http_bench import ServerThread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "llm.json")
+POLICIES = ["plain", "retry", "hedged"]
+PROMPT = "Summarize the next steps for the lease exit of Benchmark Tower as JSON."
+
+
+def _policy(name: str, args: argparse.Namespace) -> Any:
+    from llm_resilience import CallPolicy
+    if name == "plain":
+        return CallPolicy(timeout=args.timeout, max_attempts=1, hedge=False)
+    return CallPolicy(timeout=args.timeout, max_attempts=args.max_attempts, backoff_base=0.05,
+                      hedge=name == "hedged", hedge_budget=args.hedge_budget,
+                      hedge_min_delay=args.hedge_min_delay)
+
+
+def bench_policy(name: str, url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    from llm_resilience import ResilientCaller, resilient_llm
+    caller = ResilientCaller(name, _policy(name, args))
+    llm = resilient_llm(caller, model="anthropic/claude-3-haiku-20240307", base_url=url,
+                        api_key="fake", max_tokens=512)
+    latencies: List[float] = []
+    errors = 0
+
+    def one(_: int) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            llm.call(PROMPT)
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors += 1
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        # Warmup calls also calibrate the hedge delay
+        list(pool.map(one, range(args.warmup)))
+        latencies.clear()
+        errors = 0
+        started = time.perf_counter()
+        list(pool.map(one, range(args.calls)))
+        elapsed = time.perf_counter() - started
+    result = common.summarize_latencies(latencies, errors, elapsed)
+    result["caller"] = caller.snapshot()
+    logger.info(f"{name}: p50 {result['p50_ms']}ms p95 {result['p95_ms']}ms p99 {result['p99_ms']}ms, "
+                f"{errors} errors, {result['caller']['hedged']} hedged, {result['caller']['retries']} retries")
+    return result
+
+
+def run(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    app = create_app(args.latency, args.jitter, args.tail_rate, args.tail_latency, args.error_rate, args.seed)
+    results = {}
+    with ServerThread(app) as server:
+        for name in args.policies:
+            results[name] = bench_policy(name, server.url, args)
+    return results
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LLM call policy benchmark against a fake LLM server")
+    parser.add_argument("--policies", type=lambda v: v.split(","), default=POLICIES,
+                        help=f"Comma-separated policies ({','.join(POLICIES)})")
+    parser.add_argument("--calls", type=int, default=400, help="Calls per policy")
+    parser.add_argument("--warmup", type=int, default=40, help="Warmup calls per policy")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tail-rate", type=float, default=0.05, help="Fraction of slow responses")
+    parser.add_argument("--tail-latency", type=float, default=3.0, help="Latency of slow responses")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of 529 responses")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-attempt deadline in seconds")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--hedge-budget", type=float, default=0.1)
+    parser.add_argument("--hedge-min-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed regression as a fraction of the baseline (default 0.15)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+    unknown = set(args.policies) - set(POLICIES)
+    if unknown:
+        parser.error(f"Unknown policies: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    results = run(args)
+    report = {
+        "suite": "llm",
+        "environment": common.environment_info(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "threshold", "update_baseline")},
+        "results": results
+    }
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        common.write_report(report, args.baseline)
+        logger.info(f"Baseline written to {args.baseline}")
+    else:
+        baseline = common.load_baseline(args.baseline).get("results", {})
+        report["regressions"] = common.compare_to_baseline(
+            results, baseline, args.threshold,
+            lower_is_better=["p50_ms", "p95_ms", "p99_ms"],
+            higher_is_better=["throughput_rps"]
+        )
+    common.write_report(report, args.output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Synthetic portfolio generator used to seed benchmark databases.
+
+Workflows are spread over every step of the lease exit process. Each one gets
+the forms of the steps it has already passed, an approval chain once it has
+reached approvals, and a few notifications per event, so per-workflow queries
+see realistic fan-out.
+
+    cd backend
+    python -m benchmarks.seed --database-url sqlite:///portfolio.db --workflows 100000
+"""
+
+from typing import Dict, Any, List
+from datetime import datetime, timedelta
+import argparse
+import random
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from storage import Storage, Workflow, Form, Approval, Notification, promoted_values
+
+PROPERTY_TYPES = ["Commercial", "Retail", "Industrial", "Office", "Warehouse"]
+EXIT_REASONS = ["Lease expiry", "Consolidation", "Relocation", "Cost reduction", "Downsizing"]
+STEPS = ["initial", "advisory_review", "ifm_review", "mac_review", "pjm_review",
+         "management_review", "approval_chain", "ready_for_exit"]
+# Relative frequency of each step in a live portfolio: most work sits in the reviews
+STEP_WEIGHTS = [5, 20, 15, 12, 12, 10, 16, 10]
+# Form submitted on leaving each step
+STEP_FORMS = {
+    "initial": "initial_form",
+    "advisory_review": "lease_requirements",
+    "ifm_review": "exit_requirements_ifm",
+    "mac_review": "exit_requirements_mac",
+    "pjm_review": "exit_requirements_pjm"
+}
+APPROVAL_ROLES = ["advisory", "ifm", "legal", "mac", "pjm"]
+NOTIFICATION_ROLES = ["advisory", "ifm", "legal", "mac", "pjm", "accounting", "lease_exit_team"]
+
+
+def _workflow_row(workflow_id: str, rng: random.Random, now: datetime) -> Dict[str, Any]:
+    created_at = now - timedelta(days=rng.randint(0, 720), seconds=rng.randint(0, 86400))
+    step = rng.choices(STEPS, weights=STEP_WEIGHTS)[0]
+    state = "draft" if step == "initial" else "in_progress"
+    if step == "ready_for_exit" and rng.random() < 0.5:
+        state = "completed"
+    data = {
+        "property_name": f"Property {workflow_id[-8:]}",
+        "property_type": rng.choice(PROPERTY_TYPES),
+        "lease_end_date": (created_at + timedelta(days=rng.randint(30, 900))).date().isoformat(),
+        "exit_reason": rng.choice(EXIT_REASONS),
+        "submitted_by": f"user_{rng.randint(1, 200)}",
+        "state": state,
+        "current_step": step,
+        "created_at": created_at.isoformat()
+    }
+    return {
+        "id": workflow_id,
+        "data": data,
+        **promoted_values(Workflow, data),
+        "state": state,
+        "current_step": step,
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(hours=rng.randint(0, 2000))
+    }
+
+
+def _notification_rows(workflow_id: str, event: str, at: datetime,
+                       rng: random.Random, counter: List[int]) -> List[Dict[str, Any]]:
+    rows = []
+    for role in rng.sample(NOTIFICATION_ROLES, rng.randint(1, 3)):
+        counter[0] += 1
+        rows.append({
+            "id": f"notif_seed_{counter[0]:09d}",
+            "workflow_id": workflow_id,
+            "data": {"workflow_id": workflow_id, "type": event, "recipients": [role],
+                     "data": {"timestamp": at.isoformat()}},
+            "status": "sent",
+            "created_at": at
+        })
+    return rows
+
+
+def _child_rows(workflow: Dict[str, Any], rng: random.Random,
+                counter: List[int]) -> Dict[str, List[Dict[str, Any]]]:
+    """Forms, approvals and notifications consistent with the workflow's step"""
+    workflow_id = workflow["id"]
+    reached = STEPS.index(workflow["current_step"])
+    at = workflow["created_at"]
+    forms, approvals, notifications = [], [], []
+
+    for step in STEPS[:reached]:
+        form_type = STEP_FORMS.get(step)
+        if not form_type:
+            continue
+        at += timedelta(hours=rng.randint(2, 240))
+        forms.append({
+            "id": f"form_{workflow_id}_{form_type}",
+            "workflow_id": workflow_id,
+            "form_type": form_type,
+            "data": {"form_type": form_type, "notes": "x" * rng.randint(50, 2000)},
+            "documents": [{"name": f"doc_{i}.pdf"} for i in range(rng.randint(0, 3))],
+            "created_at": at
+        })
+        notifications.extend(_notification_rows(workflow_id, "form_submission", at, rng, counter))
+
+    if reached >= STEPS.index("approval_chain"):
+        for order, role in enumerate(APPROVAL_ROLES, start=1):
+            requested = at + timedelta(hours=rng.randint(1, 48))
+            decided = requested + timedelta(hours=rng.expovariate(1 / 36.0))
+            if workflow["current_step"] == "ready_for_exit":
+                status = "approved"
+            else:
+                status = rng.choices(["approved", "pending", "rejected"], weights=[60, 35, 5])[0]
+            approvals.append({
+                "id": f"appr_{workflow_id}_{role}",
+                "workflow_id": workflow_id,
+                "approver_role": role,
+                "approval_order": order,
+                "data": {"workflow_id": workflow_id, "approver_role": role, "order": order,
+                         "status": status},
+                "status": status,
+                "decision": None if status == "pending" else status,
+                "created_at": requested,
+                "updated_at": requested if status == "pending" else decided
+            })
+            notifications.extend(_notification_rows(workflow_id, "approval_required", requested, rng, counter))
+
+    return {"forms": forms, "approvals": approvals, "notifications": notifications}
+
+
+def seed_portfolio(storage: Storage, count: int, seed: int = 42,
+                   batch_size: int = 2000, with_children: bool = True) -> Dict[str, List[str]]:
+    """Bulk insert ``count`` synthetic workflows (and their children) and return the IDs by table"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    counter = [0]
+    seeded = {"workflows": [], "forms": [], "approvals": [], "notifications": []}
+    models = {"workflows": Workflow, "forms": Form, "approvals": Approval, "notifications": Notification}
+
+    with Session(storage.engine) as session:
+        for start in range(0, count, batch_size):
+            batch = {name: [] for name in seeded}
+            for index in range(start, min(start + batch_size, count)):
+                workflow = _workflow_row(f"wf_seed_{index:08d}", rng, now)
+                batch["workflows"].append(workflow)
+                if with_children:
+                    for name, rows in _child_rows(workflow, rng, counter).items():
+                        batch[name].extend(rows)
+            for name, rows in batch.items():
+                if rows:
+                    session.execute(insert(models[name]), rows)
+                    seeded[name].extend(row["id"] for row in rows)
+        session.commit()
+    return seeded
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Seed a database with a synthetic lease exit portfolio")
+    parser.add_argument("--database-url", required=True, help="SQLAlchemy URL of the database to seed")
+    parser.add_argument("--workflows", type=int, default=1000, help="Number of workflows to generate")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible data")
+    parser.add_argument("--no-children", action="store_true",
+                        help="Only generate workflows, without forms, approvals or notifications")
+    args = parser.parse_args(argv)
+
+    seeded = seed_portfolio(Storage(args.database_url), args.workflows, seed=args.seed,
+                            with_children=not args.no_children)
+    print(", ".join(f"{len(ids)} {name}" for name, ids in seeded.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Microbenchmarks for every ``Storage`` method and the agent tool wrappers.
+
+Each dataset size gets a freshly seeded SQLite database (see ``seed.py``).
+Every case reports ops/sec and latency percentiles from a timed pass, and
+allocated memory per call from a separate ``tracemalloc`` pass.
+
+    cd backend
+    python -m benchmarks.storage_bench --sizes 1000,10000,100000 --output storage.json
+"""
+
+from typing import Dict, Any, List, Callable
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import common
+from .seed import seed_portfolio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "storage.json")
+# Cases whose cost grows with the whole dataset get fewer iterations
+FULL_SCAN_CASES = {"get_all_workflows", "tool.workflow.list"}
+
+
+def _sampler(ids: List[str], rng: random.Random) -> Callable[[], str]:
+    return lambda: rng.choice(ids) if ids else "missing"
+
+
+def storage_cases(storage: Any, seeded: Dict[str, List[str]],
+                  rng: random.Random) -> Dict[str, Callable[[int], Any]]:
+    """One callable per ``Storage`` method, each taking the iteration number"""
+    workflow = _sampler(seeded["workflows"], rng)
+    form = _sampler(seeded["forms"], rng)
+    approval = _sampler(seeded["approvals"], rng)
+    notification = _sampler(seeded["notifications"], rng)
+    payload = {"property_name": "Bench", "property_type": "Office", "lease_end_date": "2027-01-31",
+               "exit_reason": "Consolidation", "state": "draft", "current_step": "initial"}
+
+    return {
+        "create_workflow": lambda i: storage.create_workflow(dict(payload)),
+        "update_workflow_state": lambda i: storage.update_workflow_state(
+            workflow(), {"state": "in_progress", "current_step": "ifm_review"}),
+        "get_workflow": lambda i: storage.get_workflow(workflow()),
+        "get_workflow_progress": lambda i: storage.get_workflow_progress(workflow()),
+        "get_all_workflows": lambda i: storage.get_all_workflows(),
+        "store_form": lambda i: storage.store_form({"workflow_id": workflow(), "form_type": "initial_form"}),
+        "get_form": lambda i: storage.get_form(form()),
+        "store_notification": lambda i: storage.store_notification(
+            {"workflow_id": workflow(), "type": "status_update", "recipients": ["ifm"]}),
+        "get_notification": lambda i: storage.get_notification(notification()),
+        "create_approval": lambda i: storage.create_approval(
+            {"workflow_id": workflow(), "approver_role": "legal", "order": 3}),
+        "update_approval": lambda i: storage.update_approval(approval(), "approved"),
+        "get_approval": lambda i: storage.get_approval(approval()),
+    }
+
+
+def tool_cases(database_url: str, seeded: Dict[str, List[str]],
+               rng: random.Random) -> Dict[str, Callable[[int], Any]]:
+    """One callable per tool action, going through the tools' ``_run`` dispatch"""
+    # The tools are typed against the ``backend`` package's Storage class
+    from backend.storage import Storage as PackageStorage
+    from backend.tools.workflow_tools import WorkflowTool
+    from backend.tools.form_tools import FormTool
+    from backend.tools.notification_tools import NotificationTool
+    from backend.tools.approval_tools import ApprovalTool
+
+    storage = PackageStorage(database_url)
+    workflows = WorkflowTool(storage)
+    forms = FormTool(storage)
+    notifications = NotificationTool(storage)
+    approvals = ApprovalTool(storage)
+
+    workflow = _sampler(seeded["workflows"], rng)
+    form = _sampler(seeded["forms"], rng)
+    approval = _sampler(seeded["approvals"], rng)
+    notification = _sampler(seeded["notifications"], rng)
+    rules = {"required_fields": ["cost_estimate", "requirements_list"],
+             "field_types": {"cost_estimate": float, "requirements_list": list}}
+
+    return {
+        "tool.workflow.create": lambda i: workflows._run("create", workflow_data={"state": "draft"}),
+        "tool.workflow.get": lambda i: workflows._run("get", workflow_id=workflow()),
+        "tool.workflow.update": lambda i: workflows._run(
+            "update", workflow_id=workflow(), update_data={"state": "in_progress"}),
+        "tool.workflow.validate": lambda i: workflows._run("validate", workflow_id=workflow()),
+        "tool.workflow.list": lambda i: workflows._run("list", filters={"state": "completed"}),
+        "tool.form.create": lambda i: forms._run("create", form_data={"workflow_id": workflow()}),
+        "tool.form.get": lambda i: forms._run("get", form_id=form()),
+        "tool.form.validate": lambda i: forms._run(
+            "validate", form_type="lease_requirements",
+            form_data={"cost_estimate": 1.0, "requirements_list": []}, validation_rules=rules),
+        "tool.notification.send": lambda i: notifications._run(
+            "send", notification_data={"workflow_id": workflow(), "recipients": ["mac"]}),
+        "tool.notification.get": lambda i: notifications._run("get", notification_id=notification()),
+        "tool.notification.update": lambda i: notifications._run(
+            "update", notification_id=notification(), status="read"),
+        "tool.approval.create": lambda i: approvals._run(
+            "create", request_data={"workflow_id": workflow(), "approver_role": "mac"}),
+        "tool.approval.get": lambda i: approvals._run("get", approval_id=approval()),
+        "tool.approval.update": lambda i: approvals._run("update", approval_id=approval(), decision="approved"),
+        "tool.approval.validate": lambda i: approvals._run("validate", workflow_id=workflow()),
+    }
+
+
+def time_case(fn: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    """Time ``iterations`` calls and summarize them"""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    summary = common.summarize_latencies(latencies, 0, elapsed)
+    return {
+        "iterations": iterations,
+        "ops_per_sec": summary["throughput_rps"],
+        "mean_ms": summary["mean_ms"],
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "p99_ms": summary["p99_ms"]
+    }
+
+
+def measure_memory(fn: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    """Average peak and retained allocations per call, in KiB"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in range(iterations):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = fn(i)
+            after, peak = tracemalloc.get_traced_memory()
+            del result
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib_per_call": round(sum(peaks) / len(peaks) / 1024, 2),
+        "retained_kib_per_call": round(sum(retained) / len(retained) / 1024, 2)
+    }
+
+
+def bench_size(size: int, workdir: str, args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Seed a database of ``size`` workflows and run every case against it"""
+    from storage import Storage
+
+    database_url = f"sqlite:///{os.path.join(workdir, f'storage_{size}.db')}"
+    storage = Storage(database_url)
+    seeded = seed_portfolio(storage, size, seed=args.seed)
+    rng = random.Random(args.seed)
+
+    cases = storage_cases(storage, seeded, rng)
+    if not args.skip_tools:
+        cases.update(tool_cases(database_url, seeded, rng))
+
+    results = {}
+    for name, fn in cases.items():
+        if args.cases and name not in args.cases:
+            continue
+        iterations = args.full_scan_iterations if name in FULL_SCAN_CASES else args.iterations
+        for i in range(min(args.warmup, iterations)):
+            fn(i)
+        summary = time_case(fn, iterations)
+        summary.update(measure_memory(fn, max(1, min(args.memory_iterations, iterations))))
+        summary.update({"case": name, "dataset": size})
+        results[f"{name}@{size}"] = summary
+        logger.info(f"{name}@{size}: {summary['ops_per_sec']} ops/s, p95 {summary['p95_ms']}ms, "
+                    f"peak {summary['peak_kib_per_call']} KiB/call")
+    return results
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for Storage and the agent tools")
+    parser.add_argument("--sizes", type=_int_list, default=[1000, 10000],
+                        help="Comma-separated dataset sizes (workflows) to seed")
+    parser.add_argument("--cases", type=lambda v: v.split(","), default=None,
+                        help="Only run these comma-separated cases")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per case")
+    parser.add_argument("--full-scan-iterations", type=int, default=5,
+                        help="Timed calls for cases that read the whole dataset")
+    parser.add_argument("--memory-iterations", type=int, default=20,
+                        help="Calls per case measured under tracemalloc")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed calls per case")
+    parser.add_argument("--skip-tools", action="store_true", help="Only benchmark Storage methods")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed regression as a fraction of the baseline (default 0.15)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="lease_exit_storage_bench_") as workdir:
+        for size in args.sizes:
+            results.update(bench_size(size, workdir, args))
+
+    report = {
+        "suite": "storage",
+        "environment": common.environment_info(),
+        "config": {"sizes": args.sizes, "iterations": args.iterations},
+        "results": results
+    }
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        common.write_report(report, args.baseline)
+        logger.info(f"Baseline written to {args.baseline}")
+    else:
+        baseline = common.load_baseline(args.baseline).get("results", {})
+        report["regressions"] = common.compare_to_baseline(
+            results, baseline, args.threshold,
+            lower_is_better=["p95_ms", "peak_kib_per_call"],
+            higher_is_better=["ops_per_sec"]
+        )
+    common.write_report(report, args.output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
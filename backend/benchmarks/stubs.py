@@ -0,0 +1,46 @@
+"""
+Stand-ins for the LLM-backed parts of the application so benchmarks measure
+our own code rather than the model provider.
+"""
+
+from typing import Any, List
+import asyncio
+import json
+import time
+
+CANNED_RESULT = """```json
+%s
+```""" % json.dumps({
+    "status": "success",
+    "next_steps": ["advisory_review"],
+    "notifications": ["advisory", "ifm", "legal"],
+    "summary": "Workflow initialized",
+    "valid": True,
+    "errors": []
+}, indent=2)
+
+
+class StubCrew:
+    """Drop-in replacement for a crewai Crew that returns a canned result"""
+
+    def __init__(self, latency: float = 0.0, agents: List[Any] = None):
+        self.latency = latency
+        self.agents = agents or []
+        self.tasks = []
+
+    def kickoff(self, *args, **kwargs) -> Any:
+        if self.latency:
+            time.sleep(self.latency)
+        return CANNED_RESULT
+
+    async def akickoff(self, *args, **kwargs) -> Any:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return CANNED_RESULT
+
+
+def install_llm_stub(main_module: Any, latency: float = 0.0) -> None:
+    """Replace crew execution in the FastAPI app with a fixed-latency stub"""
+    crew = main_module.lease_exit_crew
+    agents = [crew.workflow_agent, crew.form_agent, crew.notification_agent, crew.approval_agent]
+    crew.crew = lambda tier=None: StubCrew(latency, agents)
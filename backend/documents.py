@@ -0,0 +1,221 @@
+"""
+Content-addressed storage for uploaded documents.
+
+Uploads are parsed from the request body as it arrives, so a multi-megabyte
+lease PDF is never held in memory. Each file part is written in chunks to a
+temporary file and hashed with SHA-256 on the way. Once the part is complete,
+the temporary file is renamed to ``<root>/<aa>/<bb>/<sha256>``. If a blob with
+the same hash already exists, the temporary copy is discarded, so identical
+files are stored once. Forms reference documents by hash.
+"""
+
+from typing import Dict, Any, List, AsyncIterator, Tuple
+import hashlib
+import logging
+import os
+import re
+import uuid
+
+import aiofiles
+import aiofiles.os
+
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import parse_options_header
+except ImportError:
+    from multipart import MultipartParser
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import parse_options_header
+
+logger = logging.getLogger(__name__)
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# Plain form fields sent alongside the files are small; anything larger is rejected
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The upload is malformed or exceeds a limit"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BlobWriter:
+    """A blob being written: hashes the chunks and commits them under their digest"""
+
+    def __init__(self, store: "DocumentStore", max_bytes: int = None):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.temp_path = os.path.join(store.temp_dir, uuid.uuid4().hex)
+        self.file = None
+
+    async def open(self) -> "BlobWriter":
+        self.file = await aiofiles.open(self.temp_path, "wb")
+        return self
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadError(f"File exceeds the {self.max_bytes} byte limit", status_code=413)
+        self.digest.update(data)
+        await self.file.write(data)
+
+    async def commit(self) -> Tuple[str, bool]:
+        """Move the blob into place; returns its hash and whether it was already stored"""
+        await self.file.close()
+        sha256 = self.digest.hexdigest()
+        path = self.store.path(sha256)
+        if await aiofiles.os.path.exists(path):
+            await aiofiles.os.remove(self.temp_path)
+            return sha256, True
+        await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+        await aiofiles.os.replace(self.temp_path, path)
+        return sha256, False
+
+    async def abort(self) -> None:
+        if self.file is not None:
+            await self.file.close()
+        if await aiofiles.os.path.exists(self.temp_path):
+            await aiofiles.os.remove(self.temp_path)
+
+
+class DocumentStore:
+    """Blobs on disk, addressed by the SHA-256 of their content"""
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = os.path.abspath(root or os.getenv("DOCUMENT_STORE_PATH", "documents"))
+        if max_bytes is None:
+            max_bytes = int(os.getenv("DOCUMENT_MAX_BYTES", str(100 * 1024 * 1024)))
+        self.max_bytes = max_bytes
+        self.temp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        if not SHA256_PATTERN.match(sha256 or ""):
+            raise ValueError(f"Invalid document hash: {sha256}")
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def derived_path(self, sha256: str, suffix: str) -> str:
+        """Path of a file derived from a blob, such as its extracted text chunks"""
+        return f"{self.path(sha256)}.{suffix}"
+
+    def exists(self, sha256: str) -> bool:
+        return SHA256_PATTERN.match(sha256 or "") is not None and os.path.exists(self.path(sha256))
+
+    async def writer(self) -> BlobWriter:
+        return await BlobWriter(self, self.max_bytes).open()
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Store a stream of bytes; returns its hash, size and whether it was a duplicate"""
+        writer = await self.writer()
+        try:
+            async for chunk in chunks:
+                await writer.write(chunk)
+            sha256, deduplicated = await writer.commit()
+        except BaseException:
+            await writer.abort()
+            raise
+        return {"sha256": sha256, "size": writer.size, "deduplicated": deduplicated}
+
+    async def receive_multipart(self, content_type: str,
+                                body: AsyncIterator[bytes]) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+        """Stream a multipart/form-data body into the store.
+
+        Returns the plain form fields and, for each file part, its hash, size,
+        file name, content type and whether it was a duplicate.
+        """
+        mime_type, options = parse_options_header(content_type or "")
+        boundary = options.get(b"boundary")
+        if mime_type != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data body with a boundary")
+
+        # The parser callbacks are synchronous; they queue events that are
+        # handled (and written to disk) after each network chunk
+        events: List[Tuple[str, Any]] = []
+        header = {"field": b"", "value": b""}
+        headers: Dict[bytes, bytes] = {}
+
+        def on_header_field(data: bytes, start: int, end: int) -> None:
+            header["field"] += data[start:end]
+
+        def on_header_value(data: bytes, start: int, end: int) -> None:
+            header["value"] += data[start:end]
+
+        def on_header_end() -> None:
+            headers[header["field"].lower()] = header["value"]
+            header["field"] = header["value"] = b""
+
+        def on_headers_finished() -> None:
+            events.append(("begin", dict(headers)))
+            headers.clear()
+
+        def on_part_data(data: bytes, start: int, end: int) -> None:
+            events.append(("data", bytes(data[start:end])))
+
+        def on_part_end() -> None:
+            events.append(("end", None))
+
+        parser = MultipartParser(boundary, {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end
+        })
+
+        fields: Dict[str, str] = {}
+        files: List[Dict[str, Any]] = []
+        part: Dict[str, Any] = None
+        try:
+            async for chunk in body:
+                try:
+                    parser.write(chunk)
+                except FormParserError as e:
+                    raise UploadError(f"Malformed multipart body: {e}")
+                for kind, value in events:
+                    if kind == "begin":
+                        _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                        part = {
+                            "name": disposition.get(b"name", b"").decode("utf-8", "replace"),
+                            "filename": disposition.get(b"filename", b"").decode("utf-8", "replace") or None,
+                            "content_type": value.get(b"content-type", b"application/octet-stream").decode("latin-1"),
+                            "value": bytearray()
+                        }
+                        if part["filename"]:
+                            part["writer"] = await self.writer()
+                    elif kind == "data" and part.get("writer"):
+                        await part["writer"].write(value)
+                    elif kind == "data":
+                        part["value"] += value
+                        if len(part["value"]) > MAX_FIELD_BYTES:
+                            raise UploadError(f"Form field '{part['name']}' is too large", status_code=413)
+                    elif kind == "end" and part.get("writer"):
+                        writer = part.pop("writer")
+                        sha256, deduplicated = await writer.commit()
+                        files.append({
+                            "sha256": sha256,
+                            "size": writer.size,
+                            "filename": os.path.basename(part["filename"]),
+                            "content_type": part["content_type"],
+                            "field": part["name"],
+                            "deduplicated": deduplicated
+                        })
+                    elif kind == "end":
+                        fields[part["name"]] = part["value"].decode("utf-8", "replace")
+                events.clear()
+            parser.finalize()
+            if part is not None and part.get("writer"):
+                raise UploadError("Multipart body ended in the middle of a file")
+        except BaseException:
+            if part and part.get("writer"):
+                await part["writer"].abort()
+            raise
+        logger.info(f"Received {len(files)} documents "
+                    f"({sum(f['deduplicated'] for f in files)} already stored)")
+        return fields, files
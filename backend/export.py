@@ -0,0 +1,235 @@
+"""
+Streaming columnar export of workflows, forms and approvals.
+
+Rows are read through a server-side cursor (``yield_per``), so only one batch
+is in memory at a time. Selected JSON keys are extracted into plain columns in
+SQL. Each batch is written as one Arrow record batch (Parquet or Arrow IPC
+stream) or as a chunk of gzip-compressed CSV. The encoded bytes are yielded
+as they are produced. Memory therefore depends on the batch size, not on the
+size of the portfolio.
+
+    cd backend
+    python -m export workflows --format parquet --output workflows.parquet
+"""
+
+from typing import Dict, Any, List, Iterator, Tuple
+import argparse
+import csv
+import io
+import logging
+import re
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    from .storage import Storage, Workflow, Form, Approval
+    from .migrations import json_text
+except ImportError:
+    from storage import Storage, Workflow, Form, Approval
+    from migrations import json_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("application/gzip", "csv.gz")
+}
+
+# Table columns exported for each table, with their Arrow type
+TABLE_COLUMNS = {
+    "workflows": (Workflow, [
+        ("id", "string"), ("workflow_type", "string"), ("lease_id", "string"), ("state", "string"),
+        ("current_step", "string"), ("property_name", "string"), ("property_type", "string"),
+        ("lease_end_date", "date"), ("exit_reason", "string"), ("created_by", "string"),
+        ("created_at", "timestamp"), ("updated_at", "timestamp")
+    ]),
+    "forms": (Form, [
+        ("id", "string"), ("workflow_id", "string"), ("form_type", "string"),
+        ("submitted_by", "string"), ("created_at", "timestamp")
+    ]),
+    "approvals": (Approval, [
+        ("id", "string"), ("workflow_id", "string"), ("approver_id", "string"),
+        ("approver_role", "string"), ("approval_order", "int"), ("status", "string"),
+        ("decision", "string"), ("comments", "string"),
+        ("created_at", "timestamp"), ("updated_at", "timestamp")
+    ])
+}
+
+# JSON keys of the ``data`` column flattened into columns unless fields are given explicitly
+DEFAULT_FIELDS = {
+    "workflows": ["submitted_by"],
+    "forms": [],
+    "approvals": []
+}
+
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _text(value: Any) -> Any:
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+class _Drain:
+    """Write-only file object whose buffered bytes are taken after each batch"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class TableExport:
+    """Export of one table as a stream of encoded record batches"""
+
+    def __init__(self, storage: Storage, table: str, fields: List[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown table '{table}', expected one of {', '.join(TABLE_COLUMNS)}")
+        fields = DEFAULT_FIELDS[table] if fields is None else fields
+        invalid = [field for field in fields if not FIELD_PATTERN.match(field)]
+        if invalid:
+            raise ValueError(f"Invalid field names: {', '.join(invalid)}")
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        self.storage = storage
+        self.table = table
+        self.batch_size = batch_size
+        model, columns = TABLE_COLUMNS[table]
+        taken = {name for name, _ in columns}
+        # Flattened keys that clash with a real column are prefixed with ``data_``
+        self.fields = [(f"data_{field}" if field in taken else field, field) for field in fields]
+        self.columns: List[Tuple[str, str]] = columns + [(name, "string") for name, _ in self.fields]
+        self.query = select(
+            *[getattr(model, name) for name, _ in columns],
+            *[json_text(storage.engine, model.data, key).label(name) for name, key in self.fields]
+        ).order_by(model.id)
+
+    def batches(self) -> Iterator[Dict[str, List[Any]]]:
+        """Column-oriented batches of at most ``batch_size`` rows"""
+        string_columns = [i for i, (_, kind) in enumerate(self.columns) if kind == "string"]
+        with Session(self.storage.engine) as session:
+            result = session.execute(self.query.execution_options(yield_per=self.batch_size))
+            for rows in result.partitions():
+                values = [list(column) for column in zip(*rows)]
+                for i in string_columns:
+                    values[i] = [_text(v) for v in values[i]]
+                yield {name: values[i] for i, (name, _) in enumerate(self.columns)}
+
+    def _arrow_schema(self) -> Any:
+        types = {"string": pa.string(), "int": pa.int64(), "date": pa.date32(), "timestamp": pa.timestamp("us")}
+        return pa.schema([(name, types[kind]) for name, kind in self.columns])
+
+    def stream(self, format: str = "parquet") -> Iterator[bytes]:
+        """Encoded export, yielded one batch at a time"""
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format '{format}', expected one of {', '.join(FORMATS)}")
+        if format in ("parquet", "arrow") and pa is None:
+            raise ValueError(f"pyarrow is required for {format} exports; use format=csv")
+        if format == "csv":
+            return self._stream_csv()
+        return self._stream_arrow(format)
+
+    def _stream_arrow(self, format: str) -> Iterator[bytes]:
+        schema = self._arrow_schema()
+        drain = _Drain()
+        sink = pa.PythonFile(drain, mode="w")
+        if format == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+        rows = 0
+        for batch in self.batches():
+            record_batch = pa.record_batch([batch[name] for name in schema.names], schema=schema)
+            if format == "parquet":
+                writer.write_batch(record_batch, row_group_size=self.batch_size)
+            else:
+                writer.write_batch(record_batch)
+            rows += record_batch.num_rows
+            yield drain.take()
+        writer.close()
+        yield drain.take()
+        logger.info(f"Exported {rows} {self.table} rows as {format}")
+
+    def _stream_csv(self) -> Iterator[bytes]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        names = [name for name, _ in self.columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        rows = 0
+        for batch in self.batches():
+            writer.writerows(zip(*[batch[name] for name in names]))
+            rows += len(batch[names[0]])
+            yield compressor.compress(buffer.getvalue().encode("utf-8"))
+            buffer.seek(0)
+            buffer.truncate()
+        yield compressor.compress(buffer.getvalue().encode("utf-8")) + compressor.flush()
+        logger.info(f"Exported {rows} {self.table} rows as csv")
+
+    def write(self, path: str, format: str = "parquet") -> int:
+        """Write the export to ``path`` and return the number of bytes written"""
+        written = 0
+        with open(path, "wb") as output:
+            for chunk in self.stream(format):
+                output.write(chunk)
+                written += len(chunk)
+        return written
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Stream a table to Parquet, Arrow IPC or gzipped CSV")
+    parser.add_argument("table", choices=sorted(TABLE_COLUMNS), help="Table to export")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet", help="Output format")
+    parser.add_argument("--output", help="Output file (defaults to <table>.<extension>)")
+    parser.add_argument("--fields", help="Comma-separated JSON keys to flatten into columns")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per record batch")
+    parser.add_argument("--database-url", help="SQLAlchemy URL (defaults to the application database)")
+    args = parser.parse_args(argv)
+
+    fields = [f.strip() for f in args.fields.split(",") if f.strip()] if args.fields is not None else None
+    export = TableExport(Storage(args.database_url), args.table, fields, args.batch_size)
+    output = args.output or f"{args.table}.{FORMATS[args.format][1]}"
+    written = export.write(output, args.format)
+    print(f"Wrote {written} bytes to {output}")
+
+
+if __name__ == "__main__":
+    main()
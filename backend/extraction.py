@@ -0,0 +1,328 @@
+"""
+Text extraction for uploaded documents.
+
+PDF, DOCX, CSV and plain-text documents are parsed in a process pool so that
+CPU-heavy parsing never runs on the API event loop. Jobs go through a bounded
+queue, and callers wait for a free slot when it is full. The worker process
+splits the text into chunks and writes them next to the blob
+(``<sha256>.chunks.json``). It returns only a compact summary: kind, size,
+page or row counts, an excerpt, and CSV columns and totals. The summary is
+cached on the document row, keyed by content hash, so a document that is
+submitted again is never parsed twice. The crew receives these summaries
+instead of the documents themselves.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    from pdfminer.high_level import extract_text as pdf_extract_text
+except ImportError:
+    pdf_extract_text = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = 2000
+CHUNK_OVERLAP = 200
+EXCERPT_CHARS = 600
+CSV_SAMPLE_ROWS = 5
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def detect_kind(path: str, content_type: str = None, filename: str = None) -> str:
+    """pdf, docx, csv, text or unsupported, from magic bytes first, then type and extension"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    extension = os.path.splitext(filename or "")[1].lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        if extension == ".docx" or "wordprocessingml" in content_type:
+            return "docx"
+        with zipfile.ZipFile(path) as archive:
+            return "docx" if "word/document.xml" in archive.namelist() else "unsupported"
+    if b"\x00" in head:
+        return "unsupported"
+    if extension == ".csv" or content_type in ("text/csv", "application/csv"):
+        return "csv"
+    return "text"
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into chunks of about ``size`` characters, preferring paragraph and line breaks"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = max(text.rfind("\n\n", start, end), text.rfind("\n", start, end))
+            if cut > start + size // 2:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def _normalize(text: str) -> str:
+    text = re.sub(r"[ \t]+", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _excerpt(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= EXCERPT_CHARS else text[:EXCERPT_CHARS].rsplit(" ", 1)[0] + " ..."
+
+
+def _read_pdf(path: str) -> Tuple[str, Dict[str, Any]]:
+    if pdf_extract_text is None:
+        raise ValueError("pdfminer.six is required to extract text from PDFs")
+    pages = pdf_extract_text(path).split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return "\n\n".join(pages), {"pages": len(pages)}
+
+
+def _read_docx(path: str) -> Tuple[str, Dict[str, Any]]:
+    paragraphs = []
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        for _, element in ElementTree.iterparse(document):
+            if element.tag == f"{WORD_NAMESPACE}p":
+                text = "".join(node.text or "" for node in element.iter(f"{WORD_NAMESPACE}t"))
+                if text.strip():
+                    paragraphs.append(text)
+                element.clear()
+    return "\n\n".join(paragraphs), {"paragraphs": len(paragraphs)}
+
+
+def _number(value: str) -> Optional[float]:
+    cleaned = re.sub(r"[,$€£\s]", "", value or "")
+    if cleaned.startswith("(") and cleaned.endswith(")"):
+        cleaned = "-" + cleaned[1:-1]
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def _read_csv(path: str) -> Tuple[str, Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample)
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        columns = next(reader, [])
+        lines = [", ".join(columns)]
+        rows = []
+        totals = [0.0] * len(columns)
+        numeric = [True] * len(columns)
+        count = 0
+        for row in reader:
+            count += 1
+            if len(rows) < CSV_SAMPLE_ROWS:
+                rows.append(row)
+            for i, value in enumerate(row[:len(columns)]):
+                if numeric[i] and value.strip():
+                    number = _number(value)
+                    if number is None:
+                        numeric[i] = False
+                    else:
+                        totals[i] += number
+            lines.append(", ".join(row))
+    meta = {
+        "rows": count,
+        "columns": columns,
+        "sample_rows": rows,
+        "column_totals": {name: round(totals[i], 2) for i, name in enumerate(columns) if numeric[i] and count}
+    }
+    return "\n".join(lines), meta
+
+
+def _read_text(path: str) -> Tuple[str, Dict[str, Any]]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read(), {}
+
+
+READERS = {"pdf": _read_pdf, "docx": _read_docx, "csv": _read_csv, "text": _read_text}
+
+
+def extract_document(path: str, content_type: str = None, filename: str = None,
+                     chunks_path: str = None) -> Dict[str, Any]:
+    """Extract, chunk and summarize one document; runs in a worker process.
+
+    Chunks are written to ``chunks_path``; only the summary is returned so
+    that little data crosses the process boundary. Parse failures are
+    reported in the summary, so they are cached like any other result.
+    """
+    summary: Dict[str, Any] = {"kind": "unsupported"}
+    try:
+        summary["kind"] = detect_kind(path, content_type, filename)
+        if summary["kind"] == "unsupported":
+            return summary
+        text, meta = READERS[summary["kind"]](path)
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+        return summary
+    text = _normalize(text)
+    chunks = chunk_text(text)
+    if chunks_path:
+        temp_path = f"{chunks_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(chunks, f)
+        os.replace(temp_path, chunks_path)
+    summary.update(meta)
+    summary.update({
+        "characters": len(text),
+        "words": len(text.split()),
+        "chunks": len(chunks),
+        "excerpt": _excerpt(text)
+    })
+    return summary
+
+
+def describe_document(summary: Dict[str, Any]) -> str:
+    """One prompt line for a document summary"""
+    name = summary.get("filename") or summary.get("sha256", "")[:12]
+    if summary.get("error"):
+        return f"- {name}: could not be read ({summary['error']})"
+    counts = [f"{summary[key]} {key}" for key in ("pages", "paragraphs", "rows") if summary.get(key)]
+    line = f"- {name} ({', '.join([summary.get('kind', 'unknown')] + counts)})"
+    if summary.get("columns"):
+        line += f"; columns: {', '.join(summary['columns'])}"
+    if summary.get("column_totals"):
+        line += "; totals: " + ", ".join(f"{k}={v}" for k, v in summary["column_totals"].items())
+    if summary.get("excerpt") and summary.get("kind") != "csv":
+        line += f": {summary['excerpt']}"
+    return line
+
+
+class DocumentPipeline:
+    """Extracts documents in a process pool, with a bounded queue and a cache keyed by hash"""
+
+    def __init__(self, storage: Any, store: Any, workers: int = None, queue_size: int = None):
+        self.storage = storage
+        self.store = store
+        self.workers = workers or int(os.getenv("DOCUMENT_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.queue_size = queue_size or int(os.getenv("DOCUMENT_QUEUE_SIZE", "64"))
+        self.stats = {"extracted": 0, "cache_hits": 0, "coalesced": 0, "failed": 0, "dropped": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._queue = None
+
+    def chunks(self, sha256: str) -> List[str]:
+        """Text chunks of an extracted document"""
+        path = self.store.derived_path(sha256, "chunks.json")
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            document, future = await self._queue.get()
+            sha256 = document["sha256"]
+            try:
+                summary = await loop.run_in_executor(
+                    self._pool, extract_document, self.store.path(sha256), document.get("content_type"),
+                    document.get("filename"), self.store.derived_path(sha256, "chunks.json")
+                )
+                await asyncio.to_thread(self.storage.store_extraction, sha256, summary)
+                self.stats["failed" if summary.get("error") else "extracted"] += 1
+                future.set_result(summary)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Error extracting document {sha256}: {str(e)}")
+                future.set_exception(e)
+            finally:
+                self._inflight.pop(sha256, None)
+                self._queue.task_done()
+
+    def _future(self, document: Dict[str, Any]) -> Tuple[asyncio.Future, bool]:
+        """Future of a document's summary, and whether the caller has to queue the extraction"""
+        sha256 = document["sha256"]
+        if sha256 in self._inflight:
+            self.stats["coalesced"] += 1
+            return self._inflight[sha256], False
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # Background extractions may have no waiter; retrieve the exception so it is not logged
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[sha256] = future
+        return future, True
+
+    def _unqueued(self, document: Dict[str, Any], future: asyncio.Future) -> None:
+        self._inflight.pop(document["sha256"], None)
+        future.set_exception(RuntimeError("Document extraction was not queued"))
+
+    def schedule(self, documents: List[Dict[str, Any]]) -> None:
+        """Start extracting documents that are not cached yet; skipped rather than waited for when the queue is full"""
+        for document in documents:
+            if document.get("extraction"):
+                continue
+            future, new = self._future(document)
+            if new:
+                try:
+                    self._queue.put_nowait((document, future))
+                except asyncio.QueueFull:
+                    self.stats["dropped"] += 1
+                    self._unqueued(document, future)
+
+    async def summaries(self, references: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Compact summaries for the referenced documents, extracting those not yet cached"""
+        if not references:
+            return []
+        known = await asyncio.to_thread(self.storage.get_documents, [r["sha256"] for r in references])
+
+        async def summarize(reference: Dict[str, Any]) -> Dict[str, Any]:
+            document = known.get(reference["sha256"], reference)
+            if document.get("extraction"):
+                self.stats["cache_hits"] += 1
+                extraction = document["extraction"]
+            else:
+                try:
+                    future, new = self._future(document)
+                    if new:
+                        try:
+                            await self._queue.put((document, future))
+                        except BaseException:
+                            self._unqueued(document, future)
+                            raise
+                    extraction = await asyncio.shield(future)
+                except Exception as e:
+                    extraction = {"kind": "unknown", "error": str(e)}
+            return {"sha256": reference["sha256"], "filename": document.get("filename"), **extraction}
+
+        return await asyncio.gather(*(summarize(r) for r in references))
@@ -0,0 +1,147 @@
+"""
+Idempotency-Key support for endpoints that start crew runs.
+
+The first request with a given key claims it in the ``idempotency_keys`` table
+and runs normally. Its response (success or 4xx) is stored. A repeat with the
+same key and body gets the stored response back, with an
+``Idempotent-Replayed: true`` header. A repeat that arrives while the first
+run is still going attaches to that run: in this process it awaits the run
+directly, otherwise it polls the table. Reusing a key with a different body is
+rejected with 422. A run that fails with a 5xx or a transient 4xx (such as
+429) releases the key so that a retry can run again. Completed keys expire after ``ttl_seconds`` and are
+purged by the maintenance task.
+"""
+
+from typing import Dict, Any, Awaitable, Callable, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from fastapi import HTTPException
+from starlette.responses import Response
+
+try:
+    from .jsoncodec import CodecJSONResponse
+except ImportError:
+    from jsoncodec import CodecJSONResponse
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+# Client errors that depend on timing rather than on the request; the key is released, not stored
+RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+class IdempotencyGuard:
+    """Runs a request handler at most once per (scope, Idempotency-Key)"""
+
+    def __init__(self, storage: Any, ttl_seconds: float = None, lock_seconds: float = None,
+                 wait_seconds: float = None, poll_interval: float = 0.5):
+        self.storage = storage
+        # How long completed responses are replayed
+        self.ttl_seconds = ttl_seconds or float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+        # How long an unfinished run holds its key before it is presumed dead
+        self.lock_seconds = lock_seconds or float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "900"))
+        # How long a repeat waits for a run in another process before giving up with 409
+        self.wait_seconds = wait_seconds or float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "300"))
+        self.poll_interval = poll_interval
+        self.stats = {"executed": 0, "replayed": 0, "attached": 0, "conflicts": 0}
+        self._inflight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+
+    @staticmethod
+    def request_hash(body: Any) -> str:
+        return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _replay(status_code: int, body: str) -> Response:
+        return Response(content=body, status_code=status_code, media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+
+    async def run(self, scope: str, key: str, body: Any,
+                  handler: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``handler`` for a request, or replay/attach to an earlier run with the same key"""
+        if not key:
+            return await handler()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+        request_hash = self.request_hash(body)
+
+        inflight = self._inflight.get((scope, key))
+        if inflight is not None:
+            if inflight[0] != request_hash:
+                self.stats["conflicts"] += 1
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            self.stats["attached"] += 1
+            return self._replay(*await asyncio.shield(inflight[1]))
+
+        while True:
+            record = await asyncio.to_thread(
+                self.storage.claim_idempotency_key, scope, key, request_hash, self.lock_seconds)
+            if record is None:
+                break
+            response = await self._existing(scope, key, request_hash, record)
+            if response is not None:
+                return response
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be attached; retrieve the exception so it is not logged as unhandled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[(scope, key)] = (request_hash, future)
+        self.stats["executed"] += 1
+        try:
+            try:
+                result = await handler()
+            except HTTPException as he:
+                if he.status_code >= 500 or he.status_code in RETRYABLE_STATUS:
+                    raise
+                content = CodecJSONResponse(content={"detail": he.detail}, status_code=he.status_code)
+                await self._complete(scope, key, content, future)
+                raise
+            response = result if isinstance(result, Response) else CodecJSONResponse(content=result)
+            await self._complete(scope, key, response, future)
+            return result
+        except BaseException as e:
+            if not future.done():
+                await asyncio.to_thread(self.storage.release_idempotency_key, scope, key)
+                future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop((scope, key), None)
+
+    async def _complete(self, scope: str, key: str, response: Response, future: asyncio.Future) -> None:
+        body = bytes(response.body).decode("utf-8")
+        await asyncio.to_thread(self.storage.complete_idempotency_key, scope, key,
+                                response.status_code, body, self.ttl_seconds)
+        future.set_result((response.status_code, body))
+
+    async def _existing(self, scope: str, key: str, request_hash: str, record: Dict[str, Any]) -> Response:
+        """Replay a completed run, or wait for one running in another process.
+
+        Returns None when that run failed and released the key.
+        """
+        waited = 0.0
+        while True:
+            if record is None:
+                return None
+            if record["request_hash"] != request_hash:
+                self.stats["conflicts"] += 1
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            if record["status"] == "completed":
+                self.stats["replayed"] += 1
+                logger.info(f"Replaying stored response for idempotency key {key}")
+                return self._replay(record["status_code"], record["response"])
+            inflight = self._inflight.get((scope, key))
+            if inflight is not None:
+                # The run is in this process after all (it claimed the key first)
+                self.stats["attached"] += 1
+                return self._replay(*await asyncio.shield(inflight[1]))
+            if waited >= self.wait_seconds:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress",
+                                    headers={"Retry-After": "5"})
+            if waited == 0:
+                self.stats["attached"] += 1
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+            record = await asyncio.to_thread(self.storage.get_idempotency_key, scope, key)
@@ -0,0 +1,86 @@
+"""
+JSON codec shared by the API responses, SSE events and database JSON columns.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Set JSON_CODEC=json to force the standard library.
+"""
+
+from typing import Any, Union
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import os
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+if os.getenv("JSON_CODEC", "orjson").lower() == "json":
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(obj: Any) -> Any:
+    """Serialize the types our payloads contain that JSON does not cover"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize to UTF-8 encoded JSON"""
+        try:
+            return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. integers wider than 64 bits, which orjson rejects
+            return _stdlib_dumps(obj).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Deserialize JSON text or bytes"""
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize to UTF-8 encoded JSON"""
+        return _stdlib_dumps(obj).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Deserialize JSON text or bytes"""
+        return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a JSON string"""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class CodecJSONResponse(JSONResponse):
+    """JSONResponse rendered with the shared codec"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+__all__ = [
+    'BACKEND',
+    'dumps',
+    'dumps_bytes',
+    'loads',
+    'CodecJSONResponse'
+]
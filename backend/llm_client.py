@@ -0,0 +1,111 @@
+"""
+Shared, connection-pooled Anthropic clients.
+
+All LLM traffic in the process goes through shared HTTP connection pools:
+one async pool per event loop for the async crew path, and one sync pool
+for the remaining synchronous callers. Both keep connections alive between
+calls (with TCP keepalive) and have limited pool sizes. They use HTTP/2 when
+``h2`` is installed (``httpx[http2]``), so concurrent crew runs multiplex
+over a few connections instead of opening one each.
+
+Per-call timeouts are applied with ``with_options``, which reuses the
+underlying pool. The SDK's own retries are off because ``llm_resilience``
+handles them.
+"""
+
+from typing import Dict, Any, Tuple
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+import anthropic
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+# Set LLM_HTTP2=0 to stay on HTTP/1.1 even when h2 is installed
+HTTP2_ENABLED = os.getenv("LLM_HTTP2", "1") != "0"
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_sync_clients: Dict[Tuple[Any, ...], anthropic.Anthropic] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Any, ...], anthropic.AsyncAnthropic]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _pool_options() -> Dict[str, Any]:
+    # The SDK's own HTTP client classes, so the pool matches whichever HTTP package it is built on
+    limits = type(anthropic.DEFAULT_CONNECTION_LIMITS)
+    return {
+        "limits": limits(max_connections=MAX_CONNECTIONS,
+                         max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                         keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS),
+        "http2": HTTP2_ENABLED and HTTP2_AVAILABLE,
+        # Deadlines are per request; this only bounds connection setup
+        "timeout": anthropic.Timeout(None, connect=10.0)
+    }
+
+
+def _client_options(api_key: str, base_url: str) -> Dict[str, Any]:
+    return {"api_key": api_key or os.getenv("ANTHROPIC_API_KEY"), "base_url": base_url, "max_retries": 0}
+
+
+def sync_client(timeout: float, api_key: str = None, base_url: str = None) -> anthropic.Anthropic:
+    """Anthropic client on the process-wide pool, with a ``timeout`` second deadline per request"""
+    key = (api_key, base_url)
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            client = _sync_clients[key] = anthropic.Anthropic(
+                http_client=anthropic.DefaultHttpxClient(**_pool_options()), **_client_options(api_key, base_url))
+    return client.with_options(timeout=timeout)
+
+
+def async_client(timeout: float, api_key: str = None, base_url: str = None) -> anthropic.AsyncAnthropic:
+    """AsyncAnthropic client on the running loop's pool, with a ``timeout`` second deadline per request"""
+    loop = asyncio.get_running_loop()
+    key = (api_key, base_url)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = anthropic.AsyncAnthropic(
+                http_client=anthropic.DefaultAsyncHttpxClient(**_pool_options()), **_client_options(api_key, base_url))
+            logger.info(f"Created LLM connection pool (http2={_pool_options()['http2']}, "
+                        f"max_connections={MAX_CONNECTIONS})")
+    return client.with_options(timeout=timeout)
+
+
+async def close_async_clients() -> None:
+    """Close the running loop's pools (on shutdown)"""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def _open_connections(http_client: Any) -> int:
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    return len(getattr(pool, "connections", ()))
+
+
+def pool_stats() -> Dict[str, Any]:
+    with _lock:
+        async_clients = [client for clients in _async_clients.values() for client in clients.values()]
+        sync_clients = list(_sync_clients.values())
+    return {
+        "http2": HTTP2_ENABLED and HTTP2_AVAILABLE,
+        "max_connections": MAX_CONNECTIONS,
+        "async_pools": len(async_clients),
+        "sync_pools": len(sync_clients),
+        "open_connections": sum(_open_connections(client._client) for client in async_clients + sync_clients)
+    }
@@ -0,0 +1,274 @@
+"""
+Deadlines, bounded retries and hedged requests for LLM calls.
+
+Each call attempt gets a deadline of ``timeout`` seconds. An attempt that
+fails with a retryable error (a timeout, a connection error, 429, 529
+overloaded or another 5xx) is retried up to ``max_attempts`` times in total.
+The wait between tries is drawn from "full jitter" exponential backoff, so
+many clients failing together do not retry together. A ``Retry-After`` from
+the provider is honoured, up to ``backoff_max``.
+
+With hedging on, an attempt still running after the recent p95 latency is
+duplicated, and whichever copy succeeds first is used. With ``acall`` the
+losing copy is cancelled. With ``call`` it cannot be, so it finishes in its
+worker thread, bounded by its own client timeout. Hedges are
+limited to ``hedge_budget`` of all calls, so a general slowdown cannot
+double the load on the provider. Calls that can run tools
+(``available_functions``) are never hedged, because the tools have side
+effects.
+"""
+
+from typing import Dict, Any, Awaitable, Callable, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import anthropic
+
+try:
+    from . import llm_client
+except ImportError:
+    import llm_client
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class DeadlineExceeded(TimeoutError):
+    """An LLM call attempt did not finish within its deadline"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, anthropic.APIConnectionError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CallPolicy:
+    """Deadline, retry and hedging settings; unset values come from the environment"""
+
+    def __init__(self, timeout: float = None, max_attempts: int = None, backoff_base: float = None,
+                 backoff_max: float = None, hedge: bool = None, hedge_budget: float = None,
+                 hedge_min_delay: float = None):
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+        self.max_attempts = max_attempts or int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+        self.backoff_base = backoff_base or float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+        self.backoff_max = backoff_max or float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+        self.hedge = hedge if hedge is not None else os.getenv("LLM_HEDGE", "0") == "1"
+        # Fraction of calls that may be duplicated
+        self.hedge_budget = hedge_budget if hedge_budget is not None else float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+        # Never hedge sooner than this, however fast recent calls were
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None \
+            else float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "CallPolicy":
+        """Policy for a model tier, from the optional keys of its entry in models.json"""
+        return cls(timeout=settings.get("timeout_seconds"), max_attempts=settings.get("max_attempts"),
+                   hedge=settings.get("hedge"), hedge_budget=settings.get("hedge_budget"))
+
+
+class ResilientCaller:
+    """Runs calls with a deadline per attempt, jittered retries and optional hedging"""
+
+    # Calls are only hedged once this many latencies have been seen
+    MIN_SAMPLES = 20
+
+    def __init__(self, name: str, policy: CallPolicy = None, window: int = 200, max_workers: int = 32):
+        self.name = name
+        self.policy = policy or CallPolicy()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "failures": 0,
+                      "hedged": 0, "hedge_wins": 0}
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"llm-{name}")
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which an attempt is duplicated, or None if hedging is off or not yet calibrated"""
+        if not self.policy.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return max(self.policy.hedge_min_delay, latencies[int(0.95 * (len(latencies) - 1))])
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self.stats["hedged"] >= self.policy.hedge_budget * self.stats["calls"]:
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    def _retry_delay(self, attempt: int, error: BaseException) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if ``error`` should be raised"""
+        if attempt == self.policy.max_attempts or not is_retryable(error):
+            self._count("failures")
+            return None
+        backoff = min(self.policy.backoff_max, self.policy.backoff_base * 2 ** (attempt - 1))
+        delay = random.uniform(0, backoff)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = min(self.policy.backoff_max, max(delay, retry_after))
+        self._count("retries")
+        logger.warning(f"{self.name} call failed ({type(error).__name__}: {str(error)}); "
+                       f"retry {attempt}/{self.policy.max_attempts - 1} in {delay:.2f}s")
+        return delay
+
+    def _succeeded(self, latency: float, hedged: bool) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            if hedged:
+                self.stats["hedge_wins"] += 1
+
+    def call(self, fn: Callable[..., Any], *args, hedge: bool = True, **kwargs) -> Any:
+        """Call ``fn``; ``hedge=False`` for calls that must not run twice at once"""
+        self._count("calls")
+        for attempt in range(1, self.policy.max_attempts + 1):
+            try:
+                return self._attempt(fn, args, kwargs, hedge)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args, hedge: bool = True, **kwargs) -> Any:
+        """Await ``fn(...)`` on the running loop; attempts past their deadline and losing hedges are cancelled"""
+        self._count("calls")
+        for attempt in range(1, self.policy.max_attempts + 1):
+            try:
+                return await self._aattempt(fn, args, kwargs, hedge)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def _attempt(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any], hedge: bool) -> Any:
+        self._count("attempts")
+        started = time.monotonic()
+        deadline = started + self.policy.timeout
+        primary = self._executor.submit(fn, *args, **kwargs)
+        pending = {primary}
+        hedge_at = self.hedge_delay() if hedge else None
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, started + hedge_at - now))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._succeeded(time.monotonic() - started, future is not primary)
+                    return future.result()
+                error = future.exception()
+            if hedge_at is not None and time.monotonic() >= started + hedge_at:
+                # Hedge only while the primary is still running; it replaces nothing that failed
+                if primary in pending and self._take_hedge():
+                    logger.info(f"Hedging {self.name} call after {hedge_at:.2f}s")
+                    pending.add(self._executor.submit(fn, *args, **kwargs))
+                hedge_at = None
+        if pending:
+            self._count("timeouts")
+            raise DeadlineExceeded(f"{self.name} call exceeded {self.policy.timeout:.1f}s")
+        raise error
+
+    async def _aattempt(self, fn: Callable[..., Awaitable[Any]], args: tuple, kwargs: Dict[str, Any],
+                        hedge: bool) -> Any:
+        self._count("attempts")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.policy.timeout
+        primary = asyncio.ensure_future(fn(*args, **kwargs))
+        pending = {primary}
+        hedge_at = self.hedge_delay() if hedge else None
+        error = None
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, started + hedge_at - now))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._succeeded(loop.time() - started, task is not primary)
+                        return task.result()
+                    error = task.exception()
+                if hedge_at is not None and loop.time() >= started + hedge_at:
+                    if primary in pending and self._take_hedge():
+                        logger.info(f"Hedging {self.name} call after {hedge_at:.2f}s")
+                        pending.add(asyncio.ensure_future(fn(*args, **kwargs)))
+                    hedge_at = None
+            if pending:
+                self._count("timeouts")
+                raise DeadlineExceeded(f"{self.name} call exceeded {self.policy.timeout:.1f}s")
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        delay = self.hedge_delay()
+        return {**stats, "hedge_delay_seconds": round(delay, 3) if delay is not None else None}
+
+
+def resilient_llm(caller: ResilientCaller, **kwargs) -> Any:
+    """A crewai LLM whose calls go through ``caller``.
+
+    The SDK's own retries are turned off, and so is crewai's rate-limit
+    retry around ``call``/``acall``, so the policy is the only retry layer.
+    Anthropic models use the shared pools from ``llm_client``, with the
+    policy deadline as their request timeout.
+    """
+    from crewai import LLM
+    kwargs = {"timeout": caller.policy.timeout, "max_retries": 0, **kwargs}
+    base = LLM(**kwargs)
+    native = type(base)
+    native_call = getattr(native.call, "__wrapped__", native.call)
+    native_acall = getattr(native.acall, "__wrapped__", native.acall)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, *args, **call_kwargs):
+        return caller.call(native_call, self, messages, tools, callbacks, available_functions, *args,
+                           hedge=not available_functions, **call_kwargs)
+
+    async def acall(self, messages, tools=None, callbacks=None, available_functions=None, *args, **call_kwargs):
+        return await caller.acall(native_acall, self, messages, tools, callbacks, available_functions, *args,
+                                  hedge=not available_functions, **call_kwargs)
+
+    call._crewai_rate_limit_wrapped = True
+    acall._crewai_rate_limit_wrapped = True
+    namespace = {"call": call, "acall": acall, "__module__": __name__}
+    if base.provider == "anthropic":
+        client_args = (caller.policy.timeout, kwargs.get("api_key"), kwargs.get("base_url"))
+        namespace["_get_sync_client"] = lambda self: llm_client.sync_client(*client_args)
+        namespace["_get_async_client"] = lambda self: llm_client.async_client(*client_args)
+    resilient = type(f"Resilient{native.__name__}", (native,), namespace)
+    return resilient(**{**kwargs, "model": base.model, "provider": base.provider})
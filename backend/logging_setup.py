@@ -0,0 +1,304 @@
+"""
+Structured, non-blocking logging.
+
+Log calls only put the record on a bounded queue. A ``QueueListener``
+thread formats each record as one JSON object per line and writes it, so
+formatting and I/O stay off the request path. If the queue is full,
+records are dropped and counted rather than blocking. Traceback text is the
+only thing rendered on the calling thread. Message arguments and ``extra``
+fields are formatted later, in the listener thread, so pass values that
+are not modified after the call.
+
+Record fields:
+
+- Values passed with ``extra={...}`` become fields of the JSON line.
+- Dicts and lists are encoded as JSON.
+- Every field, including the message, is truncated to
+  ``LOG_MAX_FIELD_LENGTH`` characters.
+- Records logged while a request is being handled carry its
+  ``request_id`` and route.
+
+Per-route sampling:
+
+- A fraction of requests per route (``LOG_SAMPLE_RATES``) keeps its
+  debug/info records.
+- The other requests keep only warnings and errors.
+
+Logger levels (``LOG_LEVEL``, ``LOG_LEVELS``), sampling and crew verbosity
+(``CREW_VERBOSE``) can be changed at runtime through
+``/api/admin/logging``.
+"""
+
+from typing import Dict, Any, Optional
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+
+try:
+    from .jsoncodec import dumps as json_dumps
+except ImportError:
+    from jsoncodec import dumps as json_dumps
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+# Libraries that are chatty at INFO
+DEFAULT_LEVELS = {"httpx": "WARNING", "httpcore": "WARNING", "LiteLLM": "WARNING"}
+
+request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_request_context", default=None)
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """``"a=1,b=2"`` -> ``{"a": "1", "b": "2"}``"""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, setting = item.rpartition("=")
+        pairs[key.strip()] = setting.strip()
+    return pairs
+
+
+def _rate(value: Any, name: str) -> float:
+    """A sample rate as a float between 0 and 1"""
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number between 0 and 1")
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number between 0 and 1")
+    if not 0 <= rate <= 1:
+        raise ValueError(f"{name} must be a number between 0 and 1")
+    return rate
+
+
+class LogSettings:
+    """Runtime-adjustable logging settings"""
+
+    def __init__(self):
+        self.level = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.levels = {**DEFAULT_LEVELS, **{name: level.upper()
+                                            for name, level in _parse_pairs(os.getenv("LOG_LEVELS", "")).items()}}
+        self.json = os.getenv("LOG_FORMAT", "json").lower() != "text"
+        self.max_field_length = int(os.getenv("LOG_MAX_FIELD_LENGTH", "2000"))
+        # "GET /api/workflow/lease-exit/{workflow_id}/progress=0.01"; unlisted routes use LOG_SAMPLE_RATE
+        self.sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+        self.sample_rates = {route: float(rate)
+                             for route, rate in _parse_pairs(os.getenv("LOG_SAMPLE_RATES", "")).items()}
+        self.crew_verbose = os.getenv("CREW_VERBOSE", "0") == "1"
+
+    def apply_levels(self) -> None:
+        logging.getLogger().setLevel(self.level)
+        for name, level in self.levels.items():
+            logging.getLogger(name).setLevel(level)
+
+    def update(self, level: str = None, levels: Dict[str, str] = None, sample_rate: float = None,
+               sample_rates: Dict[str, float] = None, max_field_length: int = None,
+               crew_verbose: bool = None) -> Dict[str, Any]:
+        """Change settings; ``levels`` and ``sample_rates`` are merged into the current ones.
+
+        Everything is validated before anything is applied; invalid values raise ValueError.
+        """
+        if levels is not None and not isinstance(levels, dict):
+            raise ValueError("levels must be an object of logger names to levels")
+        candidates = [level] + list((levels or {}).values())
+        invalid = [str(value) for value in candidates if value is not None and (
+            not isinstance(value, str) or not isinstance(logging.getLevelName(value.upper()), int))]
+        if invalid:
+            raise ValueError(f"Unknown log level: {', '.join(invalid)}")
+        if sample_rate is not None:
+            sample_rate = _rate(sample_rate, "sample_rate")
+        if sample_rates is not None:
+            if not isinstance(sample_rates, dict):
+                raise ValueError("sample_rates must be an object of routes to rates")
+            sample_rates = {route: _rate(rate, f"sample_rates[{route}]") for route, rate in sample_rates.items()}
+        if max_field_length is not None and (isinstance(max_field_length, bool)
+                                             or not isinstance(max_field_length, int) or max_field_length < 1):
+            raise ValueError("max_field_length must be a positive integer")
+        if crew_verbose is not None and not isinstance(crew_verbose, bool):
+            raise ValueError("crew_verbose must be true or false")
+
+        if level:
+            self.level = level.upper()
+        if levels:
+            self.levels.update({name: value.upper() for name, value in levels.items()})
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if sample_rates:
+            self.sample_rates.update(sample_rates)
+        if max_field_length is not None:
+            self.max_field_length = max_field_length
+        if crew_verbose is not None:
+            self.crew_verbose = crew_verbose
+        self.apply_levels()
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "levels": dict(self.levels),
+            "format": "json" if self.json else "text",
+            "max_field_length": self.max_field_length,
+            "sample_rate": self.sample_rate,
+            "sample_rates": dict(self.sample_rates),
+            "crew_verbose": self.crew_verbose,
+            **stats
+        }
+
+
+stats = {"queued": 0, "dropped": 0}
+settings = LogSettings()
+
+
+def truncate(text: str, limit: int = None) -> str:
+    limit = limit or settings.max_field_length
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more characters]"
+
+
+def _field(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if not isinstance(value, str):
+        try:
+            value = json_dumps(value) if isinstance(value, (dict, list, tuple)) else str(value)
+        except TypeError:
+            value = str(value)
+    return truncate(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage())
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = _field(value)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json_dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic text format, with the message truncated"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate(record.message)
+        return super().formatMessage(record)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tags records with the current request and drops info/debug records of unsampled requests"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = request_context.get()
+        if context is None:
+            return True
+        if not context["sampled"] and record.levelno < logging.WARNING:
+            return False
+        record.request_id = context["request_id"]
+        record.route = context["route"]
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queues records unformatted; drops them when the queue is full"""
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            # Tracebacks reference live frames; render them now and let the frames go
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            stats["queued"] += 1
+        except queue.Full:
+            stats["dropped"] += 1
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Route all logging through the queue to a JSON (or text) stream handler; safe to call twice"""
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if settings.json else TextFormatter(TEXT_FORMAT))
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    # uvicorn installs its own handlers; send its logs (including access logs) through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    settings.apply_levels()
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    from starlette.routing import Match
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return scope.get("path", "")
+
+
+class RequestContextMiddleware:
+    """ASGI middleware that binds a request id, route and sampling decision for log records"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = f"{scope['method']} {_route_template(scope)}"
+        rate = settings.sample_rates.get(route, settings.sample_rate)
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex[:16]
+        token = request_context.set({"request_id": request_id, "route": route,
+                                     "sampled": rate >= 1 or random.random() < rate})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_context.reset(token)
@@ -1,36 +1,54 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 from typing import Dict, Any, List
 import logging
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import asyncio
 from collections import defaultdict
-import json
 
-from agents import LeaseExitCrew
-from storage import Storage
+from agents import LeaseExitCrew, repair_caller
+from agents.schemas import WorkflowCreationOutput, FormProcessingOutput
+from agents.output_parser import parse_stats
+from storage import Storage, VersionConflictError
+from jsoncodec import CodecJSONResponse, dumps as json_dumps
+from workflow_engine import WorkflowEngine, get_state_machine
+from analytics import ApprovalAnalytics
+from export import TableExport, FORMATS as EXPORT_FORMATS
+from documents import DocumentStore, UploadError
+from extraction import DocumentPipeline
+from idempotency import IdempotencyGuard
+from admission import AdmissionController, Overloaded
+from llm_client import close_async_clients, pool_stats as llm_pool_stats
+from archive import Archiver, optimize_database
+from notifications import NotificationDispatcher, NotificationCoalescer, DEFAULT_DIGEST_TYPES, get_channel
+from logging_setup import configure_logging, RequestContextMiddleware, settings as log_settings
+from profiling import RequestProfiler, ProfilingMiddleware
+from query_stats import QueryStatsMiddleware, query_stats
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Structured logs, written off the request path; see logging_setup for LOG_* settings
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Enable verbose logging for CrewAI
-os.environ["CREWAI_LOGGING"] = "1"
-os.environ["LANGCHAIN_VERBOSE"] = "true"
-
 # Verify ANTHROPIC_API_KEY
 if not os.getenv("ANTHROPIC_API_KEY"):
     logger.error("ANTHROPIC_API_KEY environment variable is not set")
     raise ValueError("ANTHROPIC_API_KEY environment variable must be set")
 
-app = FastAPI(title="Flow.AI - Lease Exit Workflow Management")
+app = FastAPI(
+    title="Flow.AI - Lease Exit Workflow Management",
+    default_response_class=CodecJSONResponse
+)
 storage = Storage()
+workflow_engine = WorkflowEngine(storage)
+approval_analytics = ApprovalAnalytics(storage)
+document_store = DocumentStore()
+document_pipeline = DocumentPipeline(storage, document_store)
+idempotency = IdempotencyGuard(storage)
+# Limits concurrent crew runs; excess requests queue briefly or get 429
+admission = AdmissionController()
 
 # Store connected clients
 workflow_clients = defaultdict(set)
@@ -43,19 +61,105 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Stack-samples requests while profiling is enabled; keeps sampled, slow and X-Profile requests
+profiler = RequestProfiler()
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+# Per-request SQL query counts and N+1 detection; X-DB-* headers with SQL_DEBUG_HEADERS=1
+app.add_middleware(QueryStatsMiddleware)
+# Tags log records with the request id and route, and applies per-route log sampling
+app.add_middleware(RequestContextMiddleware)
 
 # Initialize CrewAI
 lease_exit_crew = LeaseExitCrew()
 
+# Periodic archival (when LEASE_EXIT_ARCHIVE_URL is set) and ANALYZE/VACUUM; 0 disables
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+archiver = Archiver(storage) if storage.archive_engine is not None else None
+
+async def run_maintenance():
+    """Move cold rows to the archive and keep the hot database compact"""
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            purged = await asyncio.to_thread(storage.purge_idempotency_keys)
+            if archiver:
+                result = await asyncio.to_thread(archiver.run)
+            else:
+                result = await asyncio.to_thread(optimize_database, storage.engine)
+            result["idempotency_keys_purged"] = purged
+            logger.info(f"Database maintenance finished: {result}")
+        except Exception as e:
+            logger.error(f"Database maintenance failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_maintenance():
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        asyncio.create_task(run_maintenance())
+
+# Outbox delivery: notifications are enqueued with workflow changes and sent in the background
+notification_dispatcher = NotificationDispatcher(
+    storage,
+    get_channel(),
+    batch_size=int(os.getenv("NOTIFICATION_BATCH_SIZE", "100")),
+    concurrency=int(os.getenv("NOTIFICATION_CONCURRENCY", "10")),
+    max_attempts=int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "6"))
+)
+workflow_engine.on_notify = notification_dispatcher.wake
+
+# Bursty notification types are folded into per-recipient digests; a window of 0 disables this
+NOTIFICATION_DIGEST_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", "60"))
+notification_coalescer = None
+if NOTIFICATION_DIGEST_WINDOW_SECONDS > 0:
+    notification_coalescer = NotificationCoalescer(
+        storage,
+        window_seconds=NOTIFICATION_DIGEST_WINDOW_SECONDS,
+        types=os.getenv("NOTIFICATION_DIGEST_TYPES", ",".join(DEFAULT_DIGEST_TYPES)).split(","),
+        on_flush=notification_dispatcher.wake
+    )
+    workflow_engine.coalescer = notification_coalescer
+
+@app.on_event("startup")
+async def start_document_pipeline():
+    document_pipeline.start()
+
+@app.on_event("shutdown")
+async def stop_document_pipeline():
+    await document_pipeline.stop()
+
+@app.on_event("startup")
+async def start_notification_dispatcher():
+    notification_dispatcher.start()
+    if notification_coalescer:
+        notification_coalescer.start()
+
+@app.on_event("shutdown")
+async def stop_notification_dispatcher():
+    if notification_coalescer:
+        await notification_coalescer.stop()
+    await notification_dispatcher.stop()
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await close_async_clients()
+
+@app.on_event("startup")
+async def start_profiler():
+    profiler.start()
+
+@app.on_event("shutdown")
+async def stop_profiler():
+    await profiler.stop()
+
 async def send_workflow_update(workflow_id: str, data: Dict[str, Any]):
     """Send update to all clients subscribed to a workflow"""
     if workflow_id in workflow_clients:
-        message = {
+        # Serialize once and share the encoded event across all subscribers
+        message = json_dumps({
             "workflow_id": workflow_id,
             "type": "workflow_update",
             "data": data,
             "timestamp": datetime.now().isoformat()
-        }
+        })
         for queue in workflow_clients[workflow_id]:
             await queue.put(message)
 
@@ -67,7 +171,7 @@ async def event_generator(workflow_id: str, queue: asyncio.Queue):
         if progress:
             yield {
                 "event": "message",
-                "data": json.dumps({
+                "data": json_dumps({
                     "workflow_id": workflow_id,
                     "type": "initial_state",
                     "data": progress,
@@ -81,7 +185,7 @@ async def event_generator(workflow_id: str, queue: asyncio.Queue):
             if isinstance(data, dict):
                 yield {
                     "event": "message",
-                    "data": json.dumps(data)
+                    "data": json_dumps(data)
                 }
             else:
                 yield {
@@ -119,10 +223,85 @@ async def workflow_events(workflow_id: str):
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Operational counters for the crew execution path"""
+    return {
+        "crew_output_parsing": parse_stats.snapshot(),
+        "crew_output_repair_calls": repair_caller.snapshot(),
+        "llm_connection_pool": llm_pool_stats(),
+        "notification_delivery": {"channel": notification_dispatcher.channel.name, **notification_dispatcher.stats},
+        "notification_digests": notification_coalescer.snapshot() if notification_coalescer else None,
+        "document_extraction": document_pipeline.stats,
+        "idempotency": idempotency.stats,
+        "admission": admission.snapshot(),
+        "models": lease_exit_crew.router.snapshot(),
+        "logging": log_settings.snapshot(),
+        "profiling": profiler.snapshot(),
+        "sql_queries": query_stats.snapshot(),
+        "single_flight": {
+            "workflow_progress": storage.progress_flight.snapshot(),
+            "crew_tasks": lease_exit_crew.task_flight.snapshot()
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/admin/logging")
+async def get_logging_settings():
+    """Current log levels, sampling, crew verbosity and queue counters"""
+    return log_settings.snapshot()
+
+@app.put("/api/admin/logging")
+async def update_logging_settings(data: Dict[str, Any]):
+    """Adjust log levels, sample rates, field truncation or crew verbosity without a restart"""
+    allowed = {"level", "levels", "sample_rate", "sample_rates", "max_field_length", "crew_verbose"}
+    unknown = set(data) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown logging settings: {', '.join(sorted(unknown))}")
+    try:
+        snapshot = log_settings.update(**data)
+        logger.warning("Logging settings changed", extra={"changes": data})
+        return snapshot
+    except (TypeError, ValueError) as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+@app.get("/api/admin/profiling")
+async def get_profiling():
+    """Profiler settings and counters, with the stored profiles (newest first)"""
+    return {**profiler.snapshot(), "profiles": await asyncio.to_thread(profiler.list_profiles)}
+
+@app.put("/api/admin/profiling")
+async def update_profiling(data: Dict[str, Any]):
+    """Turn profiling on or off, or change the sample rate, slow-request threshold or sampling interval"""
+    allowed = {"enabled", "sample_rate", "threshold_ms", "interval_ms"}
+    unknown = set(data) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown profiling settings: {', '.join(sorted(unknown))}")
+    try:
+        snapshot = profiler.configure(**data)
+        logger.warning("Profiling settings changed", extra={"changes": data})
+        return snapshot
+    except (TypeError, ValueError) as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+@app.get("/api/admin/profiles/{filename}")
+async def download_profile(filename: str):
+    """Download a stored profile: .folded (flamegraph), .prof (pstats) or .json (summary)"""
+    path = profiler.profile_path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {filename} not found")
+    return FileResponse(path, filename=filename, media_type="application/json" if filename.endswith(".json")
+                        else "application/octet-stream" if filename.endswith(".prof") else "text/plain")
+
 @app.post("/api/workflow/lease-exit/create")
-async def create_workflow(data: Dict[str, Any]):
+async def create_workflow(data: Dict[str, Any], request: Request, idempotency_key: str = Header(None)):
+    """Create a workflow; retries with the same Idempotency-Key replay or join the first run"""
+    return await idempotency.run("create", idempotency_key, data,
+                                 lambda: _admitted(request, _create_workflow(data)))
+
+async def _create_workflow(data: Dict[str, Any]):
     try:
-        logger.info(f"Creating new workflow with data: {data}")
+        logger.info("Creating new workflow", extra={"payload": data})
         
         # Create initial workflow record
         workflow_data = {
@@ -131,6 +310,8 @@ async def create_workflow(data: Dict[str, Any]):
             "lease_end_date": data.get("leaseEndDate"),
             "exit_reason": data.get("exitReason"),
             "submitted_by": data.get("submittedBy", "user"),
+            "lease_id": data.get("leaseId"),
+            "workflow_type": data.get("workflowType", "lease_exit"),
             "state": "draft",
             "current_step": "initial",
             "created_at": datetime.now().isoformat()
@@ -160,21 +341,29 @@ async def create_workflow(data: Dict[str, Any]):
         
         # Execute CrewAI workflow
         logger.info("Executing CrewAI workflow")
-        crew = lease_exit_crew.crew()
-        crew.tasks = [workflow_task]  # Set the task for this workflow
-        result = crew.kickoff()
-        logger.info(f"CrewAI workflow completed: {result}")
+        result = await lease_exit_crew.kickoff([workflow_task], "create_workflow", crew_inputs,
+                                               WorkflowCreationOutput)
+        logger.info("CrewAI workflow completed", extra={"workflow_id": workflow_id, "crew_result": result})
         
         # Process results
-        processed_result = lease_exit_crew.process_results(result)
+        processed_result = await lease_exit_crew.process_results(result, WorkflowCreationOutput)
         
-        # Update workflow state
+        # Store the crew result, then advance the workflow out of intake; the intake
+        # payload is recorded as the initial form in the same transaction
+        storage.update_workflow_state(workflow_id, {"crew_result": processed_result})
+        outcome = workflow_engine.fire(workflow_id, "start", form={
+            "workflow_id": workflow_id,
+            "form_type": "initial_form",
+            "submitted_by": workflow_data["submitted_by"],
+            "data": data
+        })
+        if not outcome["ok"]:
+            raise ValueError(f"Could not start workflow: {'; '.join(outcome['errors'])}")
         update_data = {
-            "state": "in_progress",
-            "current_step": "advisory_review",
+            "state": outcome["state"],
+            "current_step": outcome["current_step"],
             "crew_result": processed_result
         }
-        storage.update_workflow_state(workflow_id, update_data)
         
         # Send update to subscribers
         await send_workflow_update(workflow_id, {
@@ -182,16 +371,20 @@ async def create_workflow(data: Dict[str, Any]):
             "message": "Workflow initialized and in progress"
         })
         
-        return JSONResponse(
+        return CodecJSONResponse(
             content={
                 "workflow_id": workflow_id,
                 "status": "created",
-                "state": "in_progress",
-                "current_step": "advisory_review",
+                "state": outcome["state"],
+                "current_step": outcome["current_step"],
                 "crew_result": processed_result
             },
-            status_code=201
+            status_code=201,
+            headers=_etag_headers(outcome["version"])
         )
+    except VersionConflictError as ce:
+        # Another write moved the new workflow out of intake first
+        raise HTTPException(status_code=409, detail=str(ce))
     except Exception as e:
         logger.error(f"Error creating workflow: {str(e)}")
         raise HTTPException(
@@ -200,16 +393,83 @@ async def create_workflow(data: Dict[str, Any]):
         )
 
 @app.post("/api/workflow/lease-exit/{workflow_id}/form")
-async def submit_form(workflow_id: str, form_data: Dict[str, Any]):
+async def submit_form(workflow_id: str, form_data: Dict[str, Any], request: Request,
+                      if_match: str = Header(None), idempotency_key: str = Header(None)):
+    """Submit a form; retries with the same Idempotency-Key replay or join the first run"""
+    return await idempotency.run(f"form:{workflow_id}", idempotency_key, form_data,
+                                 lambda: _submit_form(workflow_id, form_data, if_match, _client_id(request)))
+
+async def _submit_form(workflow_id: str, form_data: Dict[str, Any], if_match: str = None,
+                       client_id: str = None):
     try:
         logger.info(f"Processing form submission for workflow {workflow_id}")
+        progress = storage.get_workflow_progress(workflow_id)
+        if not progress:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Workflow {workflow_id} not found"
+            )
+        expected_version = _if_match_version(if_match)
+        if expected_version is not None and expected_version != progress["version"]:
+            raise VersionConflictError(workflow_id, expected_version)
+
+        documents = _resolve_documents(form_data.get("documents"))
+        form_type = form_data.get("formType")
+        context = {
+            "form_type": form_type,
+            "submitted_by": form_data.get("submittedBy"),
+            "form_data": form_data
+        }
+        machine = get_state_machine(progress.get("workflow_type"))
+        event = machine.form_event(form_type)
+        transition = machine.lookup(progress.get("current_step"), event)
+
+        if transition:
+            # Validate against the workflow definition before spending a crew call
+            errors = machine.check_guards(transition, progress, context)
+            if errors:
+                raise HTTPException(status_code=422, detail={"errors": errors})
+
+        form = {
+            "workflow_id": workflow_id,
+            "form_type": form_type,
+            "submitted_by": context["submitted_by"],
+            "data": form_data,
+            "documents": documents
+        }
+
+        if transition and not transition.requires_judgement:
+            # Deterministic step: no crew call needed; the form commits with the step change
+            outcome = workflow_engine.fire(workflow_id, event, context, progress, expected_version, form=form)
+            if not outcome["ok"]:
+                raise HTTPException(status_code=409, detail={"errors": outcome["errors"]})
+            await send_workflow_update(workflow_id, {
+                "state": outcome["state"],
+                "current_step": outcome["current_step"],
+                "message": f"Form {form_type} accepted"
+            })
+            return CodecJSONResponse(
+                content={
+                    "status": "submitted",
+                    "form_id": outcome["form_id"],
+                    "result": {
+                        "success": True,
+                        "result": outcome,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                },
+                status_code=200,
+                headers=_etag_headers(outcome["version"])
+            )
         
         # Prepare inputs for CrewAI
         crew_inputs = {
             "workflow_id": workflow_id,
-            "form_type": form_data.get("formType"),
-            "submitted_by": form_data.get("submittedBy"),
-            "form_data": form_data
+            "form_type": form_type,
+            "submitted_by": context["submitted_by"],
+            "form_data": {key: value for key, value in form_data.items() if key != "documents"},
+            # Compact extraction summaries rather than the documents themselves
+            "documents": await document_pipeline.summaries(documents)
         }
         
         # Create form processing task
@@ -217,18 +477,50 @@ async def submit_form(workflow_id: str, form_data: Dict[str, Any]):
         
         # Execute CrewAI form processing
         logger.info("Executing CrewAI form processing")
-        crew = lease_exit_crew.crew()
-        crew.tasks = [form_task]  # Set the task for form processing
-        result = crew.kickoff()
-        logger.info(f"CrewAI form processing completed: {result}")
+        async with admission.admit(client_id):
+            result = await lease_exit_crew.kickoff([form_task], "process_form", crew_inputs,
+                                                   FormProcessingOutput)
+        logger.info("CrewAI form processing completed", extra={"workflow_id": workflow_id, "crew_result": result})
         
         # Process results
-        processed_result = lease_exit_crew.process_results(result)
-        
-        return JSONResponse(
-            content={"status": "submitted", "result": processed_result},
-            status_code=200
+        processed_result = await lease_exit_crew.process_results(result, FormProcessingOutput)
+        form["crew_result"] = processed_result
+
+        # Judgement step: advance only once the crew has accepted the form; the form
+        # commits with the step change, under the same version check
+        outcome = None
+        if transition and processed_result["success"] and processed_result["result"].get("valid"):
+            outcome = workflow_engine.fire(workflow_id, event, context, expected_version=expected_version,
+                                           form=form)
+            processed_result["transition"] = outcome
+            if outcome["ok"]:
+                await send_workflow_update(workflow_id, {
+                    "state": outcome["state"],
+                    "current_step": outcome["current_step"],
+                    "message": f"Form {form_type} accepted"
+                })
+        if outcome is None or not outcome["ok"]:
+            # Stored without moving the step
+            form_id = storage.new_form_id()
+            stored = storage.transition_workflow(workflow_id, {}, expected_version=expected_version,
+                                                 form=form, form_id=form_id)
+            if stored is None:
+                raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+            version = stored["version"]
+        else:
+            form_id, version = outcome["form_id"], outcome["version"]
+
+        return CodecJSONResponse(
+            content={"status": "submitted", "form_id": form_id, "result": processed_result},
+            status_code=200,
+            headers=_etag_headers(version)
         )
+    except HTTPException as he:
+        raise he
+    except VersionConflictError as ce:
+        raise _version_conflict(ce, if_match)
+    except Overloaded as oe:
+        raise _too_many_requests(oe)
     except Exception as e:
         logger.error(f"Error submitting form: {str(e)}")
         raise HTTPException(
@@ -236,6 +528,234 @@ async def submit_form(workflow_id: str, form_data: Dict[str, Any]):
             detail=f"Failed to submit form: {str(e)}"
         )
 
+@app.post("/api/workflow/lease-exit/{workflow_id}/transition")
+async def transition_workflow(workflow_id: str, payload: Dict[str, Any], response: Response,
+                              if_match: str = Header(None)):
+    """Apply a workflow event such as review_complete or approvals_complete"""
+    try:
+        event = payload.get("event")
+        if not event:
+            raise HTTPException(status_code=400, detail="Missing event")
+        progress = storage.get_workflow_progress(workflow_id)
+        if not progress:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Workflow {workflow_id} not found"
+            )
+        expected_version = _if_match_version(if_match)
+        if expected_version is not None and expected_version != progress["version"]:
+            raise VersionConflictError(workflow_id, expected_version)
+        outcome = workflow_engine.fire(workflow_id, event, payload, progress, expected_version)
+        if not outcome["ok"]:
+            raise HTTPException(status_code=409, detail={"errors": outcome["errors"]})
+        await send_workflow_update(workflow_id, {
+            "state": outcome["state"],
+            "current_step": outcome["current_step"],
+            "message": f"Workflow moved to {outcome['current_step']}"
+        })
+        response.headers.update(_etag_headers(outcome["version"]))
+        return outcome
+    except HTTPException as he:
+        raise he
+    except VersionConflictError as ce:
+        raise _version_conflict(ce, if_match)
+    except Exception as e:
+        logger.error(f"Error applying workflow transition: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to apply workflow transition: {str(e)}"
+        )
+
+@app.post("/api/workflow/lease-exit/approvals/status")
+async def get_approval_chain_statuses(payload: Dict[str, Any]):
+    """Approval chain status for many workflows, by ID or by current step"""
+    try:
+        workflow_ids = payload.get("workflow_ids")
+        current_step = payload.get("current_step")
+        if workflow_ids is None and current_step is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Provide workflow_ids or current_step"
+            )
+        if workflow_ids is not None and (not isinstance(workflow_ids, list)
+                                         or not all(isinstance(w, str) for w in workflow_ids)):
+            raise HTTPException(status_code=400, detail="workflow_ids must be a list of workflow ID strings")
+        if current_step is not None and not isinstance(current_step, str):
+            raise HTTPException(status_code=400, detail="current_step must be a string")
+        machine = get_state_machine(payload.get("workflow_type"))
+        return storage.get_approval_chain_statuses(
+            machine.approval_chain,
+            workflow_ids=workflow_ids,
+            current_step=current_step
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching approval chain statuses: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch approval chain statuses: {str(e)}"
+        )
+
+@app.get("/api/workflow/lease-exit/{workflow_id}/approvals")
+async def get_approval_chain_status(workflow_id: str):
+    """Approval chain status for a single workflow"""
+    try:
+        workflow = storage.get_workflow(workflow_id)
+        if not workflow:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Workflow {workflow_id} not found"
+            )
+        machine = get_state_machine(workflow.get("workflow_type"))
+        return storage.get_approval_chain_status(workflow_id, machine.approval_chain)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching approval chain status: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch approval chain status: {str(e)}"
+        )
+
+@app.get("/api/analytics/approvals")
+async def get_approval_analytics():
+    """Approval turnaround, time-in-step and bottleneck statistics across the portfolio"""
+    try:
+        return await asyncio.to_thread(approval_analytics.get_analytics)
+    except Exception as e:
+        logger.error(f"Error computing approval analytics: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compute approval analytics: {str(e)}"
+        )
+
+@app.get("/api/export/{table}")
+async def export_table(table: str, format: str = "parquet", fields: str = None, batch_size: int = 10000):
+    """Stream a table as Parquet, Arrow IPC or gzipped CSV with selected JSON keys as columns"""
+    try:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields is not None else None
+        export = TableExport(storage, table, field_list, batch_size)
+        chunks = export.stream(format)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    media_type, extension = EXPORT_FORMATS[format]
+    logger.info(f"Streaming {table} export as {format}")
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'}
+    )
+
+@app.post("/api/documents")
+async def upload_documents(request: Request):
+    """Stream multipart file uploads to the content-addressed document store"""
+    try:
+        fields, files = await document_store.receive_multipart(
+            request.headers.get("content-type"), request.stream()
+        )
+        if not files:
+            raise HTTPException(status_code=400, detail="No files in upload")
+        storage.store_documents([{**f, "uploaded_by": fields.get("uploaded_by")} for f in files])
+        # Warm the extraction cache so a later form submission does not wait for parsing
+        document_pipeline.schedule(list(storage.get_documents([f["sha256"] for f in files]).values()))
+        return {"documents": [
+            {key: f[key] for key in ("sha256", "size", "filename", "content_type", "deduplicated")}
+            for f in files
+        ]}
+    except HTTPException as he:
+        raise he
+    except UploadError as ue:
+        raise HTTPException(status_code=ue.status_code, detail=str(ue))
+    except Exception as e:
+        logger.error(f"Error uploading documents: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to upload documents: {str(e)}"
+        )
+
+@app.get("/api/documents/{sha256}")
+async def download_document(sha256: str):
+    """Download a document; supports Range requests and is cacheable forever since content never changes"""
+    document = storage.get_documents([sha256]).get(sha256)
+    if not document or not document_store.exists(sha256):
+        raise HTTPException(status_code=404, detail=f"Document {sha256} not found")
+    return FileResponse(
+        document_store.path(sha256),
+        media_type=document["content_type"] or "application/octet-stream",
+        filename=document["filename"],
+        headers={"ETag": f'"{sha256}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+@app.get("/api/inbox/{user_id}")
+async def get_inbox(user_id: str, limit: int = 20, cursor: str = None, unread_only: bool = False):
+    """A page of a user's notifications, newest first; pass next_cursor to get the next page"""
+    try:
+        if not 1 <= limit <= 100:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+        return storage.get_inbox(user_id, limit, cursor, unread_only)
+    except HTTPException as he:
+        raise he
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Error fetching inbox: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch inbox: {str(e)}"
+        )
+
+@app.get("/api/inbox/{user_id}/unread")
+async def get_unread_count(user_id: str):
+    try:
+        return storage.get_unread_count(user_id)
+    except Exception as e:
+        logger.error(f"Error fetching unread count: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch unread count: {str(e)}"
+        )
+
+@app.post("/api/inbox/{user_id}/read")
+async def mark_inbox_read(user_id: str, payload: Dict[str, Any] = None):
+    """Mark the given notification_ids read, or the whole inbox when none are given"""
+    try:
+        notification_ids = (payload or {}).get("notification_ids")
+        changed = storage.mark_read(user_id, notification_ids)
+        return {"marked_read": changed, **storage.get_unread_count(user_id)}
+    except Exception as e:
+        logger.error(f"Error marking notifications read: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to mark notifications read: {str(e)}"
+        )
+
+@app.get("/api/workflow/lease-exit/search")
+async def search_workflows(ending_within_days: int = None, lease_end_from: str = None,
+                           lease_end_to: str = None, property_type: str = None,
+                           exit_reason: str = None, state: str = None, limit: int = 100):
+    """Find workflows by lease end date range and promoted fields, e.g. leases ending in the next 90 days"""
+    try:
+        if not 1 <= limit <= 1000:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+        try:
+            start = date.fromisoformat(lease_end_from) if lease_end_from else None
+            end = date.fromisoformat(lease_end_to) if lease_end_to else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+        if ending_within_days is not None:
+            start = start or date.today()
+            end = date.today() + timedelta(days=ending_within_days)
+        return storage.search_workflows(start, end, property_type, exit_reason, state, limit)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error searching workflows: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to search workflows: {str(e)}"
+        )
+
 @app.get("/api/workflow/lease-exit/list")
 async def list_workflows():
     try:
@@ -251,9 +771,12 @@ async def list_workflows():
         )
 
 @app.get("/api/workflow/lease-exit/{workflow_id}")
-async def get_workflow(workflow_id: str):
+async def get_workflow(workflow_id: str, response: Response, if_none_match: str = Header(None)):
     try:
         logger.info(f"Fetching workflow {workflow_id}")
+        not_modified = _not_modified(workflow_id, if_none_match)
+        if not_modified:
+            return not_modified
         workflow = storage.get_workflow(workflow_id)
         if not workflow:
             logger.warning(f"Workflow {workflow_id} not found")
@@ -262,6 +785,7 @@ async def get_workflow(workflow_id: str):
                 detail=f"Workflow {workflow_id} not found"
             )
         logger.info(f"Successfully retrieved workflow {workflow_id}")
+        response.headers.update(_etag_headers(workflow["version"]))
         return workflow
     except HTTPException as he:
         raise he
@@ -273,11 +797,17 @@ async def get_workflow(workflow_id: str):
         )
 
 @app.get("/api/workflow/lease-exit/{workflow_id}/progress")
-async def get_workflow_progress(workflow_id: str):
+async def get_workflow_progress(workflow_id: str, response: Response, if_none_match: str = Header(None)):
     """Get detailed progress information for a workflow"""
     try:
         logger.info(f"Fetching progress for workflow {workflow_id}")
-        progress = storage.get_workflow_progress(workflow_id)
+        # Taken before the read, so a change racing with it can only make the tag older than the body
+        tag = storage.get_progress_tag(workflow_id)
+        not_modified = _not_modified(workflow_id, if_none_match, tag)
+        if not_modified:
+            return not_modified
+        # Off the event loop, so that concurrent polls of one workflow can share a read
+        progress = await asyncio.to_thread(storage.get_workflow_progress, workflow_id)
         if not progress:
             logger.warning(f"Workflow {workflow_id} not found")
             raise HTTPException(
@@ -285,6 +815,7 @@ async def get_workflow_progress(workflow_id: str):
                 detail=f"Workflow {workflow_id} not found"
             )
         logger.info(f"Successfully retrieved progress for workflow {workflow_id}")
+        response.headers.update(_etag_headers(tag or progress["version"]))
         return progress
     except HTTPException as he:
         raise he
@@ -295,17 +826,82 @@ async def get_workflow_progress(workflow_id: str):
             detail=f"Failed to retrieve workflow progress: {str(e)}"
         )
 
-def _get_form_type(step: str) -> str:
+def _get_form_type(step: str, workflow_type: str = None) -> str:
     """Map workflow step to form type"""
-    form_type_map = {
-        "advisory_review": "lease_requirements",
-        "ifm_review": "exit_requirements_ifm",
-        "mac_review": "exit_requirements_mac",
-        "pjm_review": "exit_requirements_pjm"
-    }
-    return form_type_map.get(step)
+    return get_state_machine(workflow_type).form_for_step.get(step)
+
+def _client_id(request: Request) -> str:
+    """Client a request is rate limited as: the X-Client-Id header, else the peer address"""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+def _too_many_requests(overloaded: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(overloaded),
+                         headers={"Retry-After": str(overloaded.retry_after)})
+
+async def _admitted(request: Request, handler: Any) -> Any:
+    """Await ``handler`` once admission control grants a crew run slot"""
+    try:
+        async with admission.admit(_client_id(request)):
+            return await handler
+    except Overloaded as oe:
+        handler.close()
+        raise _too_many_requests(oe)
+
+def _resolve_documents(references: List[Any]) -> List[Dict[str, Any]]:
+    """Uploaded documents a form references by hash (a hash string or a dict with ``sha256``)"""
+    if not references:
+        return []
+    hashes = [r.get("sha256") if isinstance(r, dict) else r for r in references]
+    if not all(isinstance(h, str) for h in hashes):
+        raise HTTPException(status_code=422, detail="Documents must reference uploads from /api/documents by sha256")
+    known = storage.get_documents(hashes)
+    missing = [h for h in hashes if h not in known]
+    if missing:
+        raise HTTPException(status_code=422, detail={"errors": [f"Unknown document {h}" for h in missing]})
+    return [
+        {key: known[h][key] for key in ("sha256", "filename", "size", "content_type")}
+        for h in dict.fromkeys(hashes)
+    ]
+
+def _etag_headers(tag: Any) -> Dict[str, str]:
+    """Validator headers for a workflow representation; clients must revalidate before reuse"""
+    return {"ETag": f'"{tag}"', "Cache-Control": "no-cache"}
+
+def _not_modified(workflow_id: str, if_none_match: str, tag: str = None) -> Response:
+    """304 response when the client's ETag is current.
+
+    ``tag`` defaults to the workflow version, checked with a single primary-key lookup.
+    """
+    if not if_none_match:
+        return None
+    if tag is None:
+        tag = storage.get_workflow_version(workflow_id)
+    if tag is None:
+        return None
+    tags = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    if "*" in tags or f'"{tag}"' in tags:
+        return Response(status_code=304, headers=_etag_headers(tag))
+    return None
+
+def _version_conflict(error: VersionConflictError, if_match: str) -> HTTPException:
+    """412 when the client's If-Match version is stale, 409 when a concurrent write to the same step won"""
+    precondition = _if_match_version(if_match) is not None
+    return HTTPException(status_code=412 if precondition else 409, detail=str(error))
+
+def _if_match_version(if_match: str) -> int:
+    """Version a write is conditional on, from an If-Match header ("*" or no header means unconditional).
+
+    Progress ETags (``<version>-<notifications>``) match on their version part.
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"').split("-")[0])
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid If-Match header: {if_match}")
 
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting Flow.AI server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # log_config=None keeps uvicorn's loggers on the structured pipeline
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Schema migrations for databases created by earlier versions of the models.
+
+``Base.metadata.create_all`` only creates missing tables. ``run_migrations``
+first brings existing tables up to the models by adding missing columns and
+indexes, then applies the versioned data migrations below (backfills) once
+each, recording them in the ``schema_migrations`` table. Migrations must also
+be safe on fresh databases, where create_all has already built everything.
+"""
+
+from typing import Any, Callable, List, Tuple
+from datetime import datetime
+import logging
+
+from sqlalchemy import MetaData, func, inspect, literal_column, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def json_field(connection: Connection, column: str, key: str) -> str:
+    """SQL expression extracting a top-level key from a JSON column"""
+    if connection.dialect.name == "postgresql":
+        return f"({column}::json ->> '{key}')"
+    return f"json_extract({column}, '$.{key}')"
+
+
+def json_text(engine: Any, column: Any, key: str) -> Any:
+    """SQLAlchemy expression extracting a top-level key from a JSON model column"""
+    if engine.dialect.name == "postgresql":
+        return literal_column(f"({column.table.name}.{column.name}::json ->> '{key}')")
+    return func.json_extract(column, f"$.{key}")
+
+
+def sync_columns(connection: Connection, metadata: MetaData) -> List[str]:
+    """Add columns and indexes that exist in the models but not in the database"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or column.primary_key:
+                continue
+            ddl_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}"))
+            added.append(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    return added
+
+
+def _backfill_approval_roles(connection: Connection) -> None:
+    connection.execute(text(
+        f"UPDATE approvals SET "
+        f"approver_role = {json_field(connection, 'data', 'approver_role')}, "
+        f"approval_order = CAST({json_field(connection, 'data', 'order')} AS INTEGER) "
+        f"WHERE approver_role IS NULL"
+    ))
+    connection.execute(text(
+        f"UPDATE approvals SET workflow_id = {json_field(connection, 'data', 'workflow_id')} "
+        f"WHERE workflow_id IS NULL"
+    ))
+
+
+def _backfill_notification_recipients(connection: Connection) -> None:
+    """Resolve recipient roles of existing notifications to users; history is backfilled as read"""
+    if connection.dialect.name == "postgresql":
+        roles = "json_array_elements_text((n.data::json) -> 'recipients') AS recipient(value)"
+        ignore, conflict = "", " ON CONFLICT DO NOTHING"
+    else:
+        roles = "json_each(n.data, '$.recipients') AS recipient"
+        ignore, conflict = " OR IGNORE", ""
+    connection.execute(text(
+        f"INSERT{ignore} INTO notification_recipients (notification_id, user_id, role, read_at, created_at) "
+        f"SELECT n.id, ur.user_id, r.name, n.created_at, n.created_at "
+        f"FROM notifications n CROSS JOIN {roles} "
+        f"JOIN roles r ON r.name = recipient.value "
+        f"JOIN user_roles ur ON ur.role_id = r.id{conflict}"
+    ))
+    connection.execute(text("DELETE FROM inbox_counters"))
+    connection.execute(text(
+        "INSERT INTO inbox_counters (user_id, unread, total) "
+        "SELECT user_id, SUM(CASE WHEN read_at IS NULL THEN 1 ELSE 0 END), COUNT(*) "
+        "FROM notification_recipients GROUP BY user_id"
+    ))
+
+
+def _backfill_promoted_workflow_fields(connection: Connection) -> None:
+    """Fill the columns promoted from workflows.data (see storage.PROMOTED_WORKFLOW_FIELDS)"""
+    for column in ("property_name", "property_type", "exit_reason", "lease_id"):
+        connection.execute(text(
+            f"UPDATE workflows SET {column} = {json_field(connection, 'data', column)} WHERE {column} IS NULL"
+        ))
+    connection.execute(text(
+        f"UPDATE workflows SET workflow_type = "
+        f"COALESCE({json_field(connection, 'data', 'workflow_type')}, 'lease_exit') WHERE workflow_type IS NULL"
+    ))
+    end_date = json_field(connection, "data", "lease_end_date")
+    if connection.dialect.name == "postgresql":
+        valid, value = f"{end_date} ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}'", f"CAST(substr({end_date}, 1, 10) AS DATE)"
+    else:
+        valid, value = f"{end_date} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'", f"substr({end_date}, 1, 10)"
+    connection.execute(text(
+        f"UPDATE workflows SET lease_end_date = {value} WHERE lease_end_date IS NULL AND {valid}"
+    ))
+
+
+def _initialize_workflow_versions(connection: Connection) -> None:
+    """Existing workflows start at version 1 (their ETag)"""
+    connection.execute(text("UPDATE workflows SET version = 1 WHERE version IS NULL"))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], Any]]] = [
+    (1, "backfill_approval_roles", _backfill_approval_roles),
+    (2, "backfill_notification_recipients", _backfill_notification_recipients),
+    (3, "backfill_promoted_workflow_fields", _backfill_promoted_workflow_fields),
+    (4, "initialize_workflow_versions", _initialize_workflow_versions),
+]
+
+
+def run_migrations(engine: Engine, metadata: MetaData) -> List[str]:
+    """Sync columns, then apply pending data migrations; returns what was applied"""
+    applied = []
+    with engine.begin() as connection:
+        for column in sync_columns(connection, metadata):
+            logger.info(f"Added missing column {column}")
+            applied.append(column)
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version INTEGER PRIMARY KEY, name VARCHAR, applied_at VARCHAR)"
+        ))
+        done = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.now().isoformat()}
+            )
+        logger.info(f"Applied schema migration {version}: {name}")
+        applied.append(name)
+    return applied
@@ -0,0 +1,20 @@
+"""
+Notifications package initialization for the Lease Exit Workflow Management System.
+This package coalesces notifications into digests and delivers the
+notifications Storage enqueues in its outbox.
+"""
+
+from .channels import *
+from .dispatcher import *
+from .coalescer import *
+
+__all__ = [
+    'DeliveryError',
+    'LogChannel',
+    'SmtpChannel',
+    'WebhookChannel',
+    'get_channel',
+    'NotificationDispatcher',
+    'NotificationCoalescer',
+    'DEFAULT_DIGEST_TYPES'
+]
@@ -0,0 +1,151 @@
+"""
+Delivery channels for outbox notifications.
+
+A channel exposes ``async send(notification)`` and raises ``DeliveryError``
+when delivery fails. Permanent failures (e.g. a 4xx from a webhook) are not
+retried. Every channel passes the notification's idempotency key to the
+receiver, so a retry after an ambiguous failure can be deduplicated on the
+other end.
+"""
+
+from typing import Dict, Any
+from email.message import EmailMessage
+import asyncio
+import logging
+import os
+import smtplib
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """Delivery failed; ``permanent`` failures are not retried"""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class LogChannel:
+    """Writes notifications to the log; the default when no channel is configured"""
+
+    name = "log"
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        data = notification["data"] or {}
+        logger.info(f"Notification {notification['id']} ({data.get('type')}) "
+                    f"to {', '.join(data.get('recipients', []))}")
+
+    async def close(self) -> None:
+        pass
+
+
+class SmtpChannel:
+    """Sends one email per notification through an SMTP server (e.g. a local relay or MailHog)"""
+
+    name = "smtp"
+
+    def __init__(self, host: str = "localhost", port: int = 1025, sender: str = "lease-exit@localhost",
+                 domain: str = "localhost", timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.domain = domain
+        self.timeout = timeout
+
+    def _message(self, notification: Dict[str, Any]) -> EmailMessage:
+        data = notification["data"] or {}
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = ", ".join(f"{role}@{self.domain}" for role in data.get("recipients", []))
+        message["Message-ID"] = f"<{notification['idempotency_key'].replace(':', '.')}@lease-exit>"
+        if data.get("digest"):
+            message["Subject"] = f"[Lease exit] {data.get('type')} digest: {data.get('count')} events"
+            message.set_content("\n".join(
+                " ".join(str(value) for value in event if value is not None) for event in data.get("events", [])
+            ))
+        else:
+            message["Subject"] = f"[Lease exit {notification.get('workflow_id')}] {data.get('type', 'notification')}"
+            message.set_content("\n".join(f"{key}: {value}" for key, value in (data.get("data") or {}).items()))
+        return message
+
+    def _send(self, message: EmailMessage) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        message = self._message(notification)
+        if not message["To"]:
+            raise DeliveryError("Notification has no recipients", permanent=True)
+        try:
+            await asyncio.to_thread(self._send, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise DeliveryError(f"Recipients refused: {e}", permanent=True)
+        except (smtplib.SMTPException, OSError) as e:
+            raise DeliveryError(f"SMTP delivery failed: {e}")
+
+    async def close(self) -> None:
+        pass
+
+
+class WebhookChannel:
+    """POSTs notifications as JSON to a webhook endpoint"""
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10.0, max_connections: int = 20):
+        self.url = url
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        data = notification["data"] or {}
+        payload = {
+            "id": notification["id"],
+            "workflow_id": notification.get("workflow_id"),
+            "type": data.get("type"),
+            "recipients": data.get("recipients", []),
+            "data": data.get("data", {})
+        }
+        if data.get("digest"):
+            payload["digest"] = {key: data.get(key) for key in ("count", "workflow_ids", "window", "event_fields", "events")}
+        try:
+            response = await self.client.post(
+                self.url, json=payload, headers={"Idempotency-Key": notification["idempotency_key"]}
+            )
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"Webhook request failed: {e}")
+        if response.status_code >= 400:
+            # Client errors other than throttling will not succeed on retry
+            permanent = response.status_code < 500 and response.status_code not in (408, 429)
+            raise DeliveryError(f"Webhook returned {response.status_code}", permanent=permanent)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def get_channel(name: str = None) -> Any:
+    """Channel configured by NOTIFICATION_CHANNEL (log, smtp or webhook)"""
+    name = name or os.getenv("NOTIFICATION_CHANNEL", "log")
+    if name == "log":
+        return LogChannel()
+    if name == "smtp":
+        return SmtpChannel(
+            host=os.getenv("SMTP_HOST", "localhost"),
+            port=int(os.getenv("SMTP_PORT", "1025")),
+            sender=os.getenv("NOTIFICATION_EMAIL_FROM", "lease-exit@localhost"),
+            domain=os.getenv("NOTIFICATION_EMAIL_DOMAIN", "localhost")
+        )
+    if name == "webhook":
+        url = os.getenv("NOTIFICATION_WEBHOOK_URL")
+        if not url:
+            raise ValueError("NOTIFICATION_WEBHOOK_URL must be set for the webhook channel")
+        return WebhookChannel(url)
+    raise ValueError(f"Unknown notification channel: {name}")
+
+
+__all__ = ['DeliveryError', 'LogChannel', 'SmtpChannel', 'WebhookChannel', 'get_channel']
@@ -0,0 +1,169 @@
+"""
+Coalescing of bursty notifications into per-recipient digests.
+
+Notifications of the configured types are buffered per (recipient, type).
+Each group is written as one outbox row when its window closes, or earlier if
+it reaches ``max_events``. That row is a digest carrying compact references
+(workflow, time, detail) to the events it covers. A wave of 500 workflows
+therefore costs one row and one delivery per role, rather than one for every
+event. A group holding a single event is written as a plain notification.
+
+Buffered events are held in memory until their window closes. A crash can lose
+at most one window of them; they are flushed on shutdown. Set the window to 0
+to keep one transactional outbox row per event.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterable
+from datetime import datetime
+from threading import Lock
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIGEST_TYPES = ("form_submission", "approval_required", "status_update")
+EVENT_FIELDS = ["workflow_id", "at", "ref"]
+
+
+class _Group:
+    __slots__ = ("recipient", "type", "opened", "started_at", "events", "first")
+
+    def __init__(self, recipient: str, notification_type: str):
+        self.recipient = recipient
+        self.type = notification_type
+        self.opened = time.monotonic()
+        self.started_at = datetime.now()
+        self.events: List[List[Any]] = []
+        self.first: Optional[Dict[str, Any]] = None
+
+
+class NotificationCoalescer:
+    """Buffers notifications per recipient and type and writes them as digests"""
+
+    def __init__(self, storage: Any, window_seconds: float = 60.0,
+                 types: Iterable[str] = DEFAULT_DIGEST_TYPES, max_events: int = 500,
+                 on_flush: Callable[[], None] = None):
+        self.storage = storage
+        self.window_seconds = window_seconds
+        self.types = set(types)
+        self.max_events = max_events
+        # Called after digests were written, e.g. to wake the outbox dispatcher
+        self.on_flush = on_flush
+        self.stats = {"events": 0, "rows_written": 0, "digests": 0}
+        self._groups: Dict[Tuple[str, str], _Group] = {}
+        self._lock = Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def accepts(self, notification: Dict[str, Any]) -> bool:
+        return notification.get("type") in self.types and bool(notification.get("recipients"))
+
+    @staticmethod
+    def _reference(notification: Dict[str, Any]) -> List[Any]:
+        data = notification.get("data") or {}
+        detail = data.get("form_type") or data.get("status") or data.get("step") or data.get("action_required")
+        return [notification.get("workflow_id"), data.get("timestamp") or datetime.now().isoformat(), detail]
+
+    def add(self, notification: Dict[str, Any]) -> Optional[str]:
+        """Buffer a notification; returns a digest reference, or None if it is not coalesced"""
+        if not self.accepts(notification):
+            return None
+        reference = self._reference(notification)
+        full = []
+        with self._lock:
+            self.stats["events"] += 1
+            for recipient in notification["recipients"]:
+                key = (recipient, notification["type"])
+                group = self._groups.get(key)
+                if group is None:
+                    group = self._groups[key] = _Group(recipient, notification["type"])
+                    group.first = notification
+                group.events.append(reference)
+                if len(group.events) >= self.max_events:
+                    full.append(self._groups.pop(key))
+        if full:
+            self._write(full)
+        return f"digest:{notification['type']}"
+
+    def _notification(self, group: _Group) -> Dict[str, Any]:
+        key = f"digest:{group.recipient}:{group.type}:{group.started_at.isoformat()}"
+        if len(group.events) == 1:
+            return {**group.first, "recipients": [group.recipient], "idempotency_key": key}
+        workflow_ids = sorted({event[0] for event in group.events if event[0]})
+        return {
+            "workflow_id": workflow_ids[0] if len(workflow_ids) == 1 else None,
+            "type": group.type,
+            "recipients": [group.recipient],
+            "digest": True,
+            "count": len(group.events),
+            "workflow_ids": workflow_ids,
+            "window": {"from": group.started_at.isoformat(), "to": datetime.now().isoformat()},
+            "event_fields": EVENT_FIELDS,
+            "events": group.events,
+            "idempotency_key": key
+        }
+
+    def _write(self, groups: List[_Group]) -> List[str]:
+        notifications = [self._notification(group) for group in groups]
+        try:
+            ids = self.storage.store_notifications(notifications)
+        except Exception:
+            # Put the events back so the next flush retries them under the same idempotency keys
+            with self._lock:
+                for group in groups:
+                    current = self._groups.get((group.recipient, group.type))
+                    if current is not None:
+                        group.events.extend(current.events)
+                    self._groups[(group.recipient, group.type)] = group
+            raise
+        with self._lock:
+            self.stats["rows_written"] += len(ids)
+            self.stats["digests"] += sum(1 for n in notifications if n.get("digest"))
+        if self.on_flush:
+            self.on_flush()
+        return ids
+
+    def flush(self, force: bool = False) -> List[str]:
+        """Write every group whose window has closed (all groups when ``force``)"""
+        now = time.monotonic()
+        with self._lock:
+            due = [key for key, group in self._groups.items()
+                   if force or now - group.opened >= self.window_seconds]
+            groups = [self._groups.pop(key) for key in due]
+        return self._write(groups) if groups else []
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(group.events) for group in self._groups.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["buffered"] = self.pending()
+        stats["write_reduction"] = round(stats["events"] / stats["rows_written"], 1) if stats["rows_written"] else None
+        return stats
+
+    async def run(self) -> None:
+        """Flush closed windows until cancelled"""
+        while True:
+            await asyncio.sleep(min(1.0, max(self.window_seconds / 4, 0.05)))
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Notification digest flush failed: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush, True)
+
+
+__all__ = ['NotificationCoalescer', 'DEFAULT_DIGEST_TYPES']
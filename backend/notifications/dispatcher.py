@@ -0,0 +1,121 @@
+"""
+Asynchronous outbox dispatcher.
+
+Storage enqueues notifications as ``pending`` rows in the same transaction as
+the workflow change that caused them. The dispatcher claims due rows in
+batches, delivers them over a channel with bounded concurrency, and records
+each outcome. A delivered notification becomes ``sent``. A transient failure
+returns it to ``pending`` with an exponentially growing, jittered delay. A
+notification is ``failed`` after a permanent error or ``max_attempts``
+attempts. Delivery runs in a background task and never blocks request
+handling.
+"""
+
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import random
+
+from .channels import DeliveryError
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """Delivers outbox notifications in the background"""
+
+    def __init__(self, storage: Any, channel: Any, batch_size: int = 100, concurrency: int = 10,
+                 poll_interval: float = 1.0, max_attempts: int = 6, base_delay: float = 2.0,
+                 max_delay: float = 600.0, lease_seconds: float = 120.0):
+        self.storage = storage
+        self.channel = channel
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.stats = {"batches": 0, "sent": 0, "retried": 0, "failed": 0, "errors": 0}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait before the next attempt, with full jitter on the upper half"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(attempts - 1, 0)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def wake(self) -> None:
+        """Deliver newly enqueued notifications without waiting for the next poll; thread-safe"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _deliver(self, notification: Dict[str, Any], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                await self.channel.send(notification)
+                return {"id": notification["id"], "status": "sent", "error": None}
+            except Exception as e:
+                permanent = isinstance(e, DeliveryError) and e.permanent
+                if permanent or notification["attempts"] >= self.max_attempts:
+                    logger.warning(f"Notification {notification['id']} failed permanently: {str(e)}")
+                    return {"id": notification["id"], "status": "failed", "error": str(e)}
+                retry_at = datetime.now() + timedelta(seconds=self.backoff(notification["attempts"]))
+                return {"id": notification["id"], "status": "pending", "error": str(e),
+                        "next_attempt_at": retry_at}
+
+    async def run_once(self) -> int:
+        """Claim and deliver one batch; returns the number of notifications processed"""
+        batch = await asyncio.to_thread(self.storage.claim_notifications, self.batch_size, self.lease_seconds)
+        if not batch:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcomes = await asyncio.gather(*(self._deliver(n, semaphore) for n in batch))
+        await asyncio.to_thread(self.storage.record_deliveries, outcomes)
+
+        self.stats["batches"] += 1
+        for outcome in outcomes:
+            key = {"sent": "sent", "pending": "retried", "failed": "failed"}[outcome["status"]]
+            self.stats[key] += 1
+        return len(batch)
+
+    async def run(self) -> None:
+        """Deliver until cancelled; full batches are followed immediately by the next one"""
+        while True:
+            try:
+                processed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Notification dispatch failed: {str(e)}")
+                processed = 0
+            if processed >= self.batch_size:
+                continue
+            self._wake.clear()
+            # A timer rather than wait_for: cancelling wait_for's inner task can hang shutdown on uvloop
+            timer = asyncio.get_running_loop().call_later(self.poll_interval, self._wake.set)
+            try:
+                await self._wake.wait()
+            finally:
+                timer.cancel()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.channel.close()
+
+
+__all__ = ['NotificationDispatcher']
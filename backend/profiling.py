@@ -0,0 +1,325 @@
+"""
+On-demand profiling of slow requests.
+
+While profiling is on (``PROFILING_ENABLED=1`` or ``PUT /api/admin/profiling``),
+a sampler thread records the stack of every in-flight request every
+``PROFILE_INTERVAL_MS``. For an async request, the stack is its coroutine
+chain: the frames it is running, or the awaits it is suspended in. Samples
+therefore measure wall-clock time, including time spent waiting on
+``LeaseExitCrew.kickoff`` and in ``Storage`` calls.
+
+A request's samples are kept when any of these holds:
+
+- it was picked by ``PROFILE_SAMPLE_RATE``
+- it sent ``X-Profile: 1``
+- it took longer than ``PROFILE_THRESHOLD_MS``
+
+Otherwise they are discarded when it finishes.
+
+Kept profiles are written to ``PROFILE_DIR`` by a background thread, once
+the response has been sent:
+
+- ``<name>.folded`` has one ``frame;frame;... count`` line per stack. This
+  is the input format of flamegraph.pl, inferno and speedscope.
+- ``<name>.json`` is a summary.
+- ``<name>.prof`` (pstats) is only written for requests picked up front (by
+  rate or header), which also run under cProfile, one at a time. cProfile
+  sees everything on the event loop thread while it is on, so this file
+  includes concurrent requests too.
+"""
+
+from typing import Dict, Any, List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import cProfile
+import glob
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from .jsoncodec import dumps as json_dumps
+    from .logging_setup import request_context
+except ImportError:
+    from jsoncodec import dumps as json_dumps
+    from logging_setup import request_context
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE_TYPES = (".folded", ".prof", ".json")
+# Summary components: samples whose stack has a frame containing the marker
+COMPONENTS = {"crew_kickoff": "LeaseExitCrew.kickoff", "storage": "storage.Storage."}
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def _number(value: Any, name: str) -> float:
+    """A finite float setting; bools and non-numeric strings are rejected"""
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+class _Capture:
+    """Samples of one in-flight request"""
+
+    def __init__(self, task: asyncio.Task, root: Any, trigger: Optional[str]):
+        context = request_context.get() or {}
+        self.task = task
+        self.thread_id = threading.get_ident()
+        self.root = root  # the middleware's frame; the stack is recorded below it
+        # Client-supplied (X-Request-Id) and used in file names, so only a safe form is kept
+        self.request_id = _SAFE_ID.sub("_", context.get("request_id") or "")[:64] or uuid.uuid4().hex[:16]
+        self.route = context.get("route")
+        self.trigger = trigger
+        self.samples: Counter = Counter()
+        self.profile: Optional[cProfile.Profile] = None
+        self.started = time.perf_counter()
+
+
+class RequestProfiler:
+    """Stack-samples in-flight requests and keeps the profiles of sampled or slow ones"""
+
+    def __init__(self, directory: str = None):
+        self.directory = os.path.abspath(directory or os.getenv("PROFILE_DIR", "profiles"))
+        self.enabled = os.getenv("PROFILING_ENABLED", "0") == "1"
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        # 0 keeps only sampled and X-Profile requests
+        self.threshold_ms = float(os.getenv("PROFILE_THRESHOLD_MS", "2000"))
+        self.interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+        self.max_profiles = int(os.getenv("PROFILE_MAX_FILES", "200"))
+        self.stats = {"profiled": 0, "sampled": 0, "requested": 0, "slow": 0, "samples": 0, "write_errors": 0}
+        self._captures: Dict[int, _Capture] = {}
+        self._labels: Dict[Any, str] = {}
+        self._cprofile_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+            self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        # Let profiles of the last requests finish writing
+        await asyncio.wrap_future(self._writer.submit(lambda: None))
+
+    def configure(self, enabled: bool = None, sample_rate: float = None, threshold_ms: float = None,
+                  interval_ms: float = None) -> Dict[str, Any]:
+        """Change settings at runtime; all values are checked before any is applied"""
+        if enabled is not None and not isinstance(enabled, bool):
+            raise ValueError("enabled must be true or false")
+        if sample_rate is not None:
+            sample_rate = _number(sample_rate, "sample_rate")
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("sample_rate must be between 0 and 1")
+        if threshold_ms is not None:
+            threshold_ms = _number(threshold_ms, "threshold_ms")
+            if threshold_ms < 0:
+                raise ValueError("threshold_ms must not be negative")
+        if interval_ms is not None:
+            interval_ms = _number(interval_ms, "interval_ms")
+            if interval_ms < 1:
+                raise ValueError("interval_ms must be at least 1")
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        return self.snapshot()
+
+    def begin(self, scope: Dict[str, Any], root: Any) -> Optional[_Capture]:
+        """Start capturing the current request, or None if it can't be kept"""
+        if dict(scope["headers"]).get(b"x-profile") == b"1":
+            trigger = "requested"
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = "sampled"
+        elif self.threshold_ms > 0:
+            trigger = None  # kept only if it turns out slow
+        else:
+            return None
+        capture = _Capture(asyncio.current_task(), root, trigger)
+        if trigger and self._cprofile_lock.acquire(blocking=False):
+            capture.profile = cProfile.Profile()
+            try:
+                capture.profile.enable()
+            except ValueError:
+                # Another profiler (a debugger, coverage) owns the thread
+                capture.profile = None
+                self._cprofile_lock.release()
+        self._captures[id(capture)] = capture
+        return capture
+
+    def finish(self, capture: _Capture) -> None:
+        """Stop capturing; write the profile in the background if the request is kept"""
+        self._captures.pop(id(capture), None)
+        if capture.profile is not None:
+            capture.profile.disable()
+            self._cprofile_lock.release()
+        duration_ms = (time.perf_counter() - capture.started) * 1000
+        if capture.trigger is None:
+            if duration_ms < self.threshold_ms:
+                return
+            capture.trigger = "slow"
+        self.stats["profiled"] += 1
+        self.stats[capture.trigger] += 1
+        self._writer.submit(self._write, capture, duration_ms, self.interval_ms)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_ms / 1000):
+            if not self._captures:
+                continue
+            frames = sys._current_frames()
+            for capture in list(self._captures.values()):
+                stack = self._stack(capture, frames)
+                if stack:
+                    capture.samples[stack] += 1
+                    self.stats["samples"] += 1
+
+    def _label(self, frame: Any) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__", "?")
+            label = self._labels[code] = f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        return label
+
+    def _stack(self, capture: _Capture, frames: Dict[int, Any]) -> tuple:
+        """The request's stack below the middleware, outermost frame first"""
+        coro = capture.task.get_coro()
+        if getattr(coro, "cr_running", False):
+            # Running: everything on the event loop thread below the middleware's frame
+            chain = []
+            frame = frames.get(capture.thread_id)
+            while frame is not None and frame is not capture.root:
+                chain.append(self._label(frame))
+                frame = frame.f_back
+            return tuple(reversed(chain)) if frame is not None else ()
+        # Suspended: follow the chain of awaits
+        chain, below_root = [], False
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            if below_root:
+                chain.append(self._label(frame))
+            below_root = below_root or frame is capture.root
+            coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        return tuple(chain)
+
+    def _write(self, capture: _Capture, duration_ms: float, interval_ms: float) -> None:
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}_{capture.request_id}"
+        samples = sum(capture.samples.values())
+        summary = {
+            "name": name,
+            "request_id": capture.request_id,
+            "route": capture.route,
+            "trigger": capture.trigger,
+            "duration_ms": round(duration_ms, 3),
+            "interval_ms": interval_ms,
+            "samples": samples,
+            # Approximate wall-clock time per component, from the samples
+            "components_ms": {
+                component: round(interval_ms * sum(count for stack, count in capture.samples.items()
+                                                   if any(marker in label for label in stack)), 3)
+                for component, marker in COMPONENTS.items()
+            },
+            "files": [f"{name}.folded", f"{name}.json"] + ([f"{name}.prof"] if capture.profile else []),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{name}.folded"), "w") as f:
+                for stack, count in capture.samples.most_common():
+                    f.write(f"{';'.join(stack)} {count}\n")
+            if capture.profile is not None:
+                capture.profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            with open(os.path.join(self.directory, f"{name}.json"), "w") as f:
+                f.write(json_dumps(summary))
+            self._prune()
+            logger.warning(f"Profiled {capture.trigger} request {capture.route} "
+                           f"({duration_ms:.0f}ms, {samples} samples)", extra={"profile": name})
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"Failed to write profile {name}: {str(e)}")
+
+    def _prune(self) -> None:
+        summaries = sorted(glob.glob(os.path.join(self.directory, "*.json")), key=os.path.getmtime)
+        for summary in summaries[:max(len(summaries) - self.max_profiles, 0)]:
+            base = summary[:-len(".json")]
+            for suffix in PROFILE_FILE_TYPES:
+                if os.path.exists(base + suffix):
+                    os.remove(base + suffix)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored profiles, newest first"""
+        profiles = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json")), key=os.path.getmtime, reverse=True):
+            try:
+                with open(path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def profile_path(self, filename: str) -> Optional[str]:
+        """Path of a stored profile file, or None for unknown names"""
+        if os.path.basename(filename) != filename or not filename.endswith(PROFILE_FILE_TYPES):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "threshold_ms": self.threshold_ms,
+            "interval_ms": self.interval_ms,
+            "directory": self.directory,
+            "in_flight": len(self._captures),
+            **self.stats
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that hands requests to the profiler while profiling is enabled"""
+
+    def __init__(self, app: Any, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        capture = self.profiler.begin(scope, sys._getframe())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if capture is not None:
+                self.profiler.finish(capture)
+
+
+__all__ = ['RequestProfiler', 'ProfilingMiddleware']
@@ -0,0 +1,302 @@
+"""
+SQL query instrumentation.
+
+``instrument_engine`` hooks SQLAlchemy's cursor events, so every statement
+is timed and fingerprinted. A fingerprint is the statement with literals
+replaced by ``?`` and ``IN``/``VALUES`` lists collapsed, so the same query
+with different parameters counts as one. ``QueryStatsMiddleware`` gives each
+HTTP request its own counters. They follow the request into
+``asyncio.to_thread`` calls.
+
+What gets reported:
+
+- ``/api/metrics`` shows process-wide totals per fingerprint and per route.
+- Statements slower than ``SLOW_QUERY_MS`` are logged with their
+  ``EXPLAIN QUERY PLAN``. Each fingerprint is explained once.
+- A SELECT fingerprint repeated ``N_PLUS_ONE_THRESHOLD`` times in one
+  request is flagged as a likely N+1. ``N_PLUS_ONE_MODE`` controls what
+  happens: ``log`` (the default) logs a warning, ``raise`` (for tests)
+  fails the request, and ``off`` ignores it. In ``raise`` mode the response
+  start is held back until the first body chunk. If the request has been
+  flagged by then, a 500 is sent instead. A streaming response flagged after
+  it has started can only be cut off, with ``NPlusOneError``.
+- ``SQL_DEBUG_HEADERS=1`` adds ``X-DB-Queries``, ``X-DB-Time-Ms`` and
+  ``X-DB-N-Plus-One`` headers to every response.
+"""
+
+from typing import Dict, Any, List, Optional
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from .logging_setup import request_context
+except ImportError:
+    from logging_setup import request_context
+
+logger = logging.getLogger(__name__)
+
+MAX_ROUTES = 200
+# Statements worth a query plan; DDL and PRAGMAs are skipped
+EXPLAINABLE = {"SELECT", "WITH ", "INSERT", "UPDATE", "DELETE"}
+
+_SPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+
+
+class NPlusOneError(Exception):
+    """A request repeated the same query often enough to look like an N+1 pattern"""
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """``SELECT ... WHERE id IN (?, ?, ?) LIMIT 10`` -> ``SELECT ... WHERE id IN (?...) LIMIT ?``"""
+    normalized = _LITERALS.sub("?", _SPACE.sub(" ", statement).strip())
+    return _ROWS.sub("(?...)...", _LISTS.sub("(?...)", normalized))
+
+
+@lru_cache(maxsize=2048)
+def fingerprint_id(fingerprint: str) -> str:
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:10]
+
+
+class RequestQueries:
+    """Query counters of one request"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.count = 0
+        self.duration_ms = 0.0
+        self.selects: Counter = Counter()
+        self.flagged: List[str] = []
+        self._lock = threading.Lock()
+
+    def record(self, fingerprint: str, duration_ms: float, select: bool, threshold: int) -> bool:
+        """Count a statement; True when a SELECT fingerprint reaches the N+1 threshold"""
+        with self._lock:
+            self.count += 1
+            self.duration_ms += duration_ms
+            if not select:
+                return False
+            self.selects[fingerprint] += 1
+            if self.selects[fingerprint] != threshold:
+                return False
+            self.flagged.append(fingerprint)
+            return True
+
+    def headers(self) -> List[tuple]:
+        headers = [(b"x-db-queries", str(self.count).encode()),
+                   (b"x-db-time-ms", f"{self.duration_ms:.2f}".encode())]
+        if self.flagged:
+            headers.append((b"x-db-n-plus-one", ",".join(map(fingerprint_id, self.flagged)).encode()))
+        return headers
+
+
+query_context: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+class QueryStats:
+    """Process-wide query statistics, slow-query log and N+1 detection"""
+
+    def __init__(self):
+        self.slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "100"))
+        self.n_plus_one_threshold = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+        self.n_plus_one_mode = os.getenv("N_PLUS_ONE_MODE", "log")
+        self.debug_headers = os.getenv("SQL_DEBUG_HEADERS", "0") == "1"
+        # Beyond this many distinct fingerprints, new ones are only counted in the totals
+        self.max_fingerprints = int(os.getenv("QUERY_STATS_MAX_FINGERPRINTS", "500"))
+        self.stats = {"queries": 0, "slow": 0, "n_plus_one": 0, "untracked_fingerprints": 0}
+        self.fingerprints: Dict[str, Dict[str, Any]] = {}
+        self.routes: Dict[str, Dict[str, Any]] = {}
+        self._plans: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, conn: Any, statement: str, parameters: Any, executemany: bool,
+               duration_ms: float) -> None:
+        fp = fingerprint(statement)
+        with self._lock:
+            self.stats["queries"] += 1
+            entry = self.fingerprints.get(fp)
+            if entry is None:
+                if len(self.fingerprints) >= self.max_fingerprints:
+                    self.stats["untracked_fingerprints"] += 1
+                else:
+                    entry = self.fingerprints[fp] = {"id": fingerprint_id(fp), "count": 0, "total_ms": 0.0,
+                                                     "max_ms": 0.0}
+            if entry is not None:
+                entry["count"] += 1
+                entry["total_ms"] += duration_ms
+                entry["max_ms"] = max(entry["max_ms"], duration_ms)
+
+        queries = query_context.get()
+        if queries is not None:
+            select = self.n_plus_one_mode != "off" and fp[:6].upper() == "SELECT"
+            if queries.record(fp, duration_ms, select, self.n_plus_one_threshold):
+                with self._lock:
+                    self.stats["n_plus_one"] += 1
+                logger.warning(f"Possible N+1 query in {queries.route}: same SELECT run "
+                               f"{self.n_plus_one_threshold} times in one request",
+                               extra={"fingerprint": fp, "fingerprint_id": fingerprint_id(fp)})
+
+        if duration_ms >= self.slow_query_ms:
+            with self._lock:
+                self.stats["slow"] += 1
+            logger.warning(f"Slow query ({duration_ms:.1f}ms)", extra={
+                "fingerprint": fp,
+                "fingerprint_id": fingerprint_id(fp),
+                "duration_ms": round(duration_ms, 3),
+                "query_plan": None if executemany else self._plan(conn, statement, parameters, fp)
+            })
+
+    def _plan(self, conn: Any, statement: str, parameters: Any, fp: str) -> Optional[str]:
+        """The statement's query plan, explained once per fingerprint"""
+        if fp in self._plans:
+            return self._plans[fp]
+        if fp[:6].upper() not in EXPLAINABLE:
+            return None
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        # A separate DBAPI cursor on the same connection, so the transaction sees the same data
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = "\n".join(str(row[-1]) for row in cursor.fetchall()) or None
+        except Exception as e:
+            plan = f"EXPLAIN failed: {str(e)}"
+        finally:
+            cursor.close()
+        if len(self._plans) < self.max_fingerprints:
+            self._plans[fp] = plan
+        return plan
+
+    def finish_request(self, queries: RequestQueries) -> List[str]:
+        """Add a finished request to the per-route totals; returns its N+1 fingerprints"""
+        with self._lock:
+            # Unmatched paths (404s) would otherwise add a route each
+            name = queries.route if queries.route in self.routes or len(self.routes) < MAX_ROUTES else "other"
+            route = self.routes.setdefault(name, {"requests": 0, "queries": 0, "db_ms": 0.0,
+                                                  "max_queries": 0, "n_plus_one": 0})
+            route["requests"] += 1
+            route["queries"] += queries.count
+            route["db_ms"] += queries.duration_ms
+            route["max_queries"] = max(route["max_queries"], queries.count)
+            route["n_plus_one"] += len(queries.flagged)
+        return queries.flagged
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            fingerprints = sorted(self.fingerprints.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            routes = {name: {**route,
+                             "avg_queries": round(route["queries"] / route["requests"], 2),
+                             "avg_db_ms": round(route["db_ms"] / route["requests"], 3),
+                             "db_ms": round(route["db_ms"], 3)}
+                      for name, route in self.routes.items()}
+        return {
+            **self.stats,
+            "slow_query_ms": self.slow_query_ms,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "n_plus_one_mode": self.n_plus_one_mode,
+            "routes": routes,
+            "top_queries": [
+                {**entry, "total_ms": round(entry["total_ms"], 3), "max_ms": round(entry["max_ms"], 3),
+                 "statement": fp[:500]}
+                for fp, entry in fingerprints[:top]
+            ]
+        }
+
+
+query_stats = QueryStats()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time and fingerprint every statement run on ``engine``"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        query_stats.record(conn, statement, parameters, executemany, duration_ms)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # The failed statement never reaches after_cursor_execute
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware that counts each request's queries and applies N+1 detection and debug headers"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        context = request_context.get() or {}
+        queries = RequestQueries(context.get("route") or f"{scope['method']} {scope['path']}")
+
+        raising = query_stats.n_plus_one_mode == "raise"
+        # In raise mode: the response start, until the first body chunk shows it is safe to send
+        held: Optional[Dict[str, Any]] = None
+        failed = False
+
+        async def send_checked(message: Dict[str, Any]) -> None:
+            nonlocal held, failed
+            if failed:
+                return
+            if message["type"] == "http.response.start":
+                if query_stats.debug_headers:
+                    message = {**message, "headers": list(message.get("headers", [])) + queries.headers()}
+                if raising:
+                    held = message
+                    return
+            elif held is not None:
+                if queries.flagged:
+                    failed = True
+                    held = None
+                    error = self._error(queries)
+                    logger.error(str(error))
+                    await send({"type": "http.response.start", "status": 500,
+                                "headers": [(b"content-type", b"application/json")]})
+                    await send({"type": "http.response.body", "body": json.dumps({"detail": str(error)}).encode()})
+                    return
+                await send(held)
+                held = None
+            await send(message)
+
+        token = query_context.set(queries)
+        try:
+            await self.app(scope, receive, send_checked if raising or query_stats.debug_headers else send)
+        finally:
+            query_context.reset(token)
+            flagged = query_stats.finish_request(queries)
+        if held is not None:
+            await send(held)
+        if flagged and raising and not failed:
+            raise self._error(queries)
+
+    @staticmethod
+    def _error(queries: RequestQueries) -> NPlusOneError:
+        flagged = queries.flagged
+        return NPlusOneError(f"{queries.route} repeated {len(flagged)} quer{'y' if len(flagged) == 1 else 'ies'} "
+                             f"{query_stats.n_plus_one_threshold}+ times: {'; '.join(flagged)}")
+
+
+__all__ = ['instrument_engine', 'query_stats', 'QueryStatsMiddleware', 'NPlusOneError', 'fingerprint']
@@ -6,4 +6,4 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 if __name__ == "__main__":
-    uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True, log_config=None) 
\ No newline at end of file
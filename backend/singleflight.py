@@ -0,0 +1,125 @@
+"""
+Single-flight execution: concurrent identical calls share one execution.
+
+The first caller for a key runs the function. Callers that arrive with the
+same key while it is running wait for it and receive the same result, or the
+same exception. Once the call finishes, the key is forgotten, so later calls
+run again. Nothing is cached. By default followers get a deep copy of the
+result, so a caller that modifies its copy does not affect the others.
+
+``do`` is for synchronous code and is thread-safe. ``do_async`` is for
+coroutines on one event loop. It runs the shared call as a task of its own, so
+a caller that is cancelled (say, its client disconnected) only stops waiting;
+the call is cancelled once no caller is waiting for it.
+"""
+
+from typing import Dict, Any, Callable, Awaitable, Hashable
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable key for arguments that may include dicts and lists"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution"""
+
+    def __init__(self, name: str, copy_results: bool = True):
+        self.name = name
+        # Results that callers only read (or that cannot be copied) may be shared as they are
+        self.copy_results = copy_results
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, _AsyncCall] = {}
+
+    def _share(self, result: Any) -> Any:
+        return copy.deepcopy(result) if self.copy_results else result
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn`` unless an identical call is in flight, in which case wait for its result"""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return self._share(call.result)
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``fn()`` unless an identical call is in flight, in which case await its result"""
+        self.stats["calls"] += 1
+        call = self._tasks.get(key)
+        leader = call is None
+        if leader:
+            call = self._tasks[key] = _AsyncCall(asyncio.ensure_future(self._execute(key, fn)))
+            # Without waiters nobody retrieves the exception; do it so it is not logged
+            call.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.stats["executions"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # The last waiter gave up; new callers start afresh rather than join a cancelled call
+                if self._tasks.get(key) is call:
+                    del self._tasks[key]
+                call.task.cancel()
+        return result if leader else self._share(result)
+
+    async def _execute(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await fn()
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            call = self._tasks.get(key)
+            if call is not None and call.task is asyncio.current_task():
+                del self._tasks[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._tasks)
+        return {**self.stats, "in_flight": in_flight}
@@ -1,14 +1,29 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 import json
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime, ForeignKey, Table
+import base64
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, event, Column, Integer, BigInteger, String, Text, JSON, Date, DateTime, ForeignKey, Table, Index, select, func, case, text, update, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, DeclarativeBase, relationship
 from sqlalchemy.ext.declarative import declarative_base
 import os
 import logging
+import sqlite3
+import uuid
+
+try:
+    from . import jsoncodec
+    from .migrations import run_migrations, sync_columns
+    from .singleflight import SingleFlight
+    from .query_stats import instrument_engine
+    from .workflow_engine import APPROVAL_STATUSES, approval_role_statuses
+except ImportError:
+    import jsoncodec
+    from migrations import run_migrations, sync_columns
+    from singleflight import SingleFlight
+    from query_stats import instrument_engine
+    from workflow_engine import APPROVAL_STATUSES, approval_role_statuses
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
@@ -16,7 +31,8 @@ Base = declarative_base()
 # User-Role association table
 user_roles = Table('user_roles', Base.metadata,
     Column('user_id', String, ForeignKey('users.id')),
-    Column('role_id', String, ForeignKey('roles.id'))
+    Column('role_id', String, ForeignKey('roles.id')),
+    Index('ix_user_roles_role_user', 'role_id', 'user_id')
 )
 
 class User(Base):
@@ -34,6 +50,46 @@ class Role(Base):
     name = Column(String, unique=True)
     users = relationship("User", secondary=user_roles, back_populates="roles")
 
+def _as_text(value: Any) -> Any:
+    return None if value is None or value == "" else str(value)
+
+def _as_date(value: Any) -> Any:
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+def promote_json_fields(model: Any, json_column: str, fields: List[tuple]) -> None:
+    """Keep columns of ``model`` in sync with keys of its JSON column.
+
+    ``fields`` holds ``(column, key, coerce, default)`` tuples. The JSON stays
+    the source of truth; the promoted columns are recomputed from it before
+    every ORM insert and update, so they can be indexed, filtered and sorted
+    without decoding the JSON. Core bulk inserts must fill them with
+    ``promoted_values``, and a migration backfills rows written before a key
+    was promoted.
+    """
+    model.__promoted_fields__ = (json_column, fields)
+
+    def sync(mapper: Any, connection: Any, target: Any) -> None:
+        for column, value in promoted_values(model, getattr(target, json_column)).items():
+            setattr(target, column, value)
+
+    event.listen(model, "before_insert", sync)
+    event.listen(model, "before_update", sync)
+
+def promoted_values(model: Any, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Promoted column values for a JSON document of ``model``"""
+    _, fields = model.__promoted_fields__
+    data = data or {}
+    values = {}
+    for column, key, coerce, default in fields:
+        value = coerce(data.get(key))
+        values[column] = default if value is None else value
+    return values
+
 class Workflow(Base):
     __tablename__ = 'workflows'
     id = Column(String, primary_key=True)
@@ -42,11 +98,37 @@ class Workflow(Base):
     data = Column(JSON)
     state = Column(String)
     current_step = Column(String)
+    # Bumped on every change to the workflow or its forms and approvals; used as ETag and If-Match
+    # version. Notifications don't bump it, so outbox traffic never fails a write (see get_progress_tag)
+    version = Column(Integer, default=1)
+    # Promoted from ``data`` (see PROMOTED_WORKFLOW_FIELDS)
+    property_name = Column(String)
+    property_type = Column(String)
+    lease_end_date = Column(Date)
+    exit_reason = Column(String)
     created_by = Column(String, ForeignKey('users.id'))
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
     forms = relationship("Form", back_populates="workflow")
     approvals = relationship("Approval", back_populates="workflow")
+    __table_args__ = (
+        Index('ix_workflows_lease_end_date', 'lease_end_date', 'id'),
+        Index('ix_workflows_property_type_lease_end', 'property_type', 'lease_end_date'),
+        Index('ix_workflows_exit_reason', 'exit_reason'),
+        Index('ix_workflows_property_name', 'property_name'),
+        Index('ix_workflows_lease_id', 'lease_id'),
+    )
+
+# (column, JSON key, coerce, default) for Workflow.data keys kept in indexed columns
+PROMOTED_WORKFLOW_FIELDS = [
+    ("property_name", "property_name", _as_text, None),
+    ("property_type", "property_type", _as_text, None),
+    ("lease_end_date", "lease_end_date", _as_date, None),
+    ("exit_reason", "exit_reason", _as_text, None),
+    ("lease_id", "lease_id", _as_text, None),
+    ("workflow_type", "workflow_type", _as_text, "lease_exit"),
+]
+promote_json_fields(Workflow, "data", PROMOTED_WORKFLOW_FIELDS)
 
 class Form(Base):
     __tablename__ = 'forms'
@@ -65,14 +147,47 @@ class Notification(Base):
     workflow_id = Column(String, ForeignKey('workflows.id'))
     recipient_id = Column(String, ForeignKey('users.id'))
     data = Column(JSON)
-    status = Column(String)
+    status = Column(String)  # pending -> sending -> sent, or back to pending for a retry, or failed
+    idempotency_key = Column(String)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime)  # When a pending row is due, or a claimed row's lease expires
+    last_error = Column(String)
+    sent_at = Column(DateTime)
     created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    __table_args__ = (
+        Index('ix_notifications_status_due', 'status', 'next_attempt_at'),
+        Index('ix_notifications_idempotency_key', 'idempotency_key', unique=True),
+        Index('ix_notifications_workflow_updated', 'workflow_id', 'updated_at'),
+    )
+
+class NotificationRecipient(Base):
+    """One row per user a notification was delivered to, resolved from its recipient roles"""
+    __tablename__ = 'notification_recipients'
+    notification_id = Column(String, ForeignKey('notifications.id'), primary_key=True)
+    user_id = Column(String, ForeignKey('users.id'), primary_key=True)
+    role = Column(String)  # Role through which the user received the notification
+    read_at = Column(DateTime)
+    created_at = Column(DateTime)
+    __table_args__ = (
+        # Keyset pagination of a user's inbox, newest first
+        Index('ix_notification_recipients_inbox', 'user_id', 'created_at', 'notification_id'),
+    )
+
+class InboxCounter(Base):
+    """Per-user inbox counters, maintained incrementally on send and read"""
+    __tablename__ = 'inbox_counters'
+    user_id = Column(String, ForeignKey('users.id'), primary_key=True)
+    unread = Column(Integer, default=0)
+    total = Column(Integer, default=0)
 
 class Approval(Base):
     __tablename__ = 'approvals'
     id = Column(String, primary_key=True)
     workflow_id = Column(String, ForeignKey('workflows.id'))
     approver_id = Column(String, ForeignKey('users.id'))
+    approver_role = Column(String)  # e.g., "advisory", "legal"
+    approval_order = Column(Integer)  # Position in the approval chain
     data = Column(JSON)
     status = Column(String)
     decision = Column(String)
@@ -80,16 +195,116 @@ class Approval(Base):
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
     workflow = relationship("Workflow", back_populates="approvals")
+    __table_args__ = (
+        Index('ix_approvals_workflow_role_status', 'workflow_id', 'approver_role', 'status'),
+    )
+
+class Document(Base):
+    """Uploaded file, stored on disk under the SHA-256 of its content (see documents.DocumentStore)"""
+    __tablename__ = 'documents'
+    sha256 = Column(String, primary_key=True)
+    size = Column(BigInteger)
+    content_type = Column(String)
+    filename = Column(String)  # Name of the first upload; later duplicates keep it
+    uploaded_by = Column(String)
+    created_at = Column(DateTime)
+    extraction = Column(JSON)  # Compact summary from extraction.DocumentPipeline; cache keyed by hash
+    extracted_at = Column(DateTime)
+
+class IdempotencyKey(Base):
+    """Outcome of a request made with an Idempotency-Key header (see idempotency.IdempotencyGuard)"""
+    __tablename__ = 'idempotency_keys'
+    scope = Column(String, primary_key=True)  # Endpoint the key was used on
+    key = Column(String, primary_key=True)
+    request_hash = Column(String)
+    status = Column(String)  # in_progress -> completed
+    status_code = Column(Integer)
+    response = Column(Text)
+    created_at = Column(DateTime)
+    # In progress: when the run is presumed dead and may be taken over; completed: when the key is purged
+    expires_at = Column(DateTime, index=True)
+
+# Tables copied to the archive database when a workflow is archived
+ARCHIVE_TABLES = [Workflow.__table__, Form.__table__, Approval.__table__, Notification.__table__,
+                  NotificationRecipient.__table__]
+
+
+def adjust_inbox_counters(session: Session, deltas: Dict[str, List[int]]) -> None:
+    """Add ``[unread, total]`` deltas to the inbox counters of each user in one statement per user"""
+    if not deltas:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    statement = upsert(InboxCounter)
+    statement = statement.on_conflict_do_update(
+        index_elements=[InboxCounter.user_id],
+        set_={
+            "unread": InboxCounter.unread + statement.excluded.unread,
+            "total": InboxCounter.total + statement.excluded.total
+        }
+    )
+    session.execute(statement, [
+        {"user_id": user_id, "unread": unread, "total": total}
+        for user_id, (unread, total) in deltas.items()
+    ])
+
+class VersionConflictError(Exception):
+    """The workflow changed since the version the caller based its write on"""
+
+    def __init__(self, workflow_id: str, expected_version: int):
+        super().__init__(f"Workflow {workflow_id} is no longer at version {expected_version}")
+        self.workflow_id = workflow_id
+        self.expected_version = expected_version
 
 class Storage:
     """SQLite-based storage for the application"""
 
-    def __init__(self):
+    # Maximum IDs bound into a single IN (...) clause; SQLite before 3.32 allows only 999 parameters
+    BULK_CHUNK_SIZE = 30000 if sqlite3.sqlite_version_info >= (3, 32, 0) else 900
+
+    def __init__(self, database_url: str = None, archive_url: str = None):
         try:
-            db_path = os.path.join(os.getcwd(), 'lease_exit.db')
-            self.engine = create_engine(f'sqlite:///{db_path}')
+            if database_url is None:
+                database_url = os.getenv("LEASE_EXIT_DATABASE_URL")
+            if database_url is None:
+                db_path = os.path.join(os.getcwd(), 'lease_exit.db')
+                database_url = f'sqlite:///{db_path}'
+            self.engine = create_engine(
+                database_url,
+                json_serializer=jsoncodec.dumps,
+                json_deserializer=jsoncodec.loads
+            )
+            # Per-request query counts, slow-query log and N+1 detection (see query_stats)
+            instrument_engine(self.engine)
             Base.metadata.create_all(self.engine)
-            logger.info(f"SQLite database initialized at {db_path}")
+            run_migrations(self.engine, Base.metadata)
+            logger.info(f"Database initialized at {database_url}")
+
+            # Optional archive database holding completed workflows moved out by archive.Archiver
+            if archive_url is None:
+                archive_url = os.getenv("LEASE_EXIT_ARCHIVE_URL")
+            self.archive_engine = None
+            if archive_url:
+                self.archive_engine = create_engine(
+                    archive_url,
+                    json_serializer=jsoncodec.dumps,
+                    json_deserializer=jsoncodec.loads
+                )
+                instrument_engine(self.archive_engine)
+                Base.metadata.create_all(self.archive_engine, tables=ARCHIVE_TABLES)
+                with self.archive_engine.begin() as connection:
+                    sync_columns(connection, Base.metadata)
+                    for table in ("forms", "approvals", "notifications"):
+                        connection.execute(text(
+                            f"CREATE INDEX IF NOT EXISTS ix_{table}_workflow_id ON {table} (workflow_id)"
+                        ))
+                logger.info(f"Archive database attached at {archive_url}")
+
+            # Concurrent progress reads of the same workflow version share one set of queries
+            self.progress_flight = SingleFlight("workflow_progress")
         except Exception as e:
             logger.error(f"Failed to initialize database: {str(e)}")
             raise
@@ -109,47 +324,152 @@ class Storage:
             logger.info(f"Created workflow with ID: {workflow_id}")
         return workflow_id
 
-    def update_workflow_state(self, workflow_id: str, update_data: Dict[str, Any]) -> bool:
-        """Update workflow state and metadata"""
+    @staticmethod
+    def _bump_version(session: Session, workflow_id: str, expected_version: int = None) -> None:
+        """Advance a workflow's version once per transaction.
+
+        With ``expected_version`` the bump is a compare-and-swap and raises
+        VersionConflictError when another write got there first.
+        """
+        bumped = session.info.setdefault("bumped_workflows", set())
+        if not workflow_id or (workflow_id in bumped and expected_version is None):
+            return
+        statement = (
+            update(Workflow)
+            .where(Workflow.id == workflow_id)
+            .values(version=func.coalesce(Workflow.version, 1) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if expected_version is not None:
+            statement = statement.where(func.coalesce(Workflow.version, 1) == expected_version)
+            if session.execute(statement).rowcount == 0:
+                raise VersionConflictError(workflow_id, expected_version)
+        else:
+            session.execute(statement)
+        bumped.add(workflow_id)
+
+    def get_workflow_version(self, workflow_id: str) -> int:
+        """Current version of a workflow (primary key lookup), or None if it does not exist"""
         with Session(self.engine) as session:
-            workflow = session.query(Workflow).filter_by(id=workflow_id).first()
-            if workflow:
+            found = session.execute(select(Workflow.version).where(Workflow.id == workflow_id)).first()
+        if found is None and self.archive_engine is not None:
+            with Session(self.archive_engine) as session:
+                found = session.execute(select(Workflow.version).where(Workflow.id == workflow_id)).first()
+        return None if found is None else (found[0] or 1)
+
+    def get_progress_tag(self, workflow_id: str) -> str:
+        """ETag of a workflow's progress, or None if it does not exist.
+
+        Progress includes notification statuses, which change on delivery
+        without bumping the version, so the tag adds the latest notification
+        change to the version: ``<version>-<microseconds>``.
+        """
+        latest = select(func.max(Notification.updated_at)).where(
+            Notification.workflow_id == workflow_id).scalar_subquery()
+        statement = select(Workflow.version, latest).where(Workflow.id == workflow_id)
+        with Session(self.engine) as session:
+            found = session.execute(statement).first()
+        if found is None and self.archive_engine is not None:
+            with Session(self.archive_engine) as session:
+                found = session.execute(statement).first()
+        if found is None:
+            return None
+        version, updated_at = found
+        return f"{version or 1}-{int(updated_at.timestamp() * 1e6) if updated_at else 0}"
+
+    def update_workflow_state(self, workflow_id: str, update_data: Dict[str, Any],
+                              expected_version: int = None) -> bool:
+        """Update workflow state and metadata"""
+        return self.transition_workflow(workflow_id, update_data, expected_version=expected_version) is not None
+
+    def transition_workflow(self, workflow_id: str, update_data: Dict[str, Any],
+                            notifications: List[Dict[str, Any]] = None,
+                            expected_version: int = None, form: Dict[str, Any] = None,
+                            form_id: str = None) -> Dict[str, Any]:
+        """Update a workflow and enqueue its notifications in the same transaction.
+
+        Returns the IDs of the enqueued notifications and the workflow's new
+        version, or None when the workflow does not exist. With
+        ``expected_version`` the update only applies if the workflow is still
+        at that version. ``form`` (stored as ``form_id``) is the form that
+        caused the update; it commits with it, so a failed update never
+        leaves the form behind.
+        """
+        for attempt in range(2):
+            with Session(self.engine) as session:
+                workflow = session.query(Workflow).filter_by(id=workflow_id).first()
+                if not workflow:
+                    return None
+                self._bump_version(session, workflow_id, expected_version)
                 if "state" in update_data:
                     workflow.state = update_data["state"]
                 if "current_step" in update_data:
                     workflow.current_step = update_data["current_step"]
                 if "crew_result" in update_data:
-                    if not workflow.data:
-                        workflow.data = {}
-                    workflow.data["crew_result"] = update_data["crew_result"]
+                    # Assign a new dict: in-place changes to a JSON column are not tracked
+                    workflow.data = {**(workflow.data or {}), "crew_result": update_data["crew_result"]}
                 workflow.updated_at = datetime.now()
-                session.commit()
-                logger.info(f"Updated workflow {workflow_id} state to {update_data}")
-                return True
-            return False
+                if form is not None:
+                    self._add_form(session, form_id or self.new_form_id(), form)
+                notification_ids = [self._enqueue_notification(session, n) for n in notifications or []]
+                version = session.scalar(select(Workflow.version).where(Workflow.id == workflow_id))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # A notification with the same idempotency key was enqueued concurrently;
+                    # the retry finds it and reuses its ID
+                    if attempt:
+                        raise
+                    continue
+                logger.info(f"Updated workflow {workflow_id}", extra={"workflow_id": workflow_id, "update": update_data})
+                return {"notifications": notification_ids, "version": version}
 
     def get_workflow(self, workflow_id: str) -> Dict[str, Any]:
         with Session(self.engine) as session:
-            workflow = session.query(Workflow).filter_by(id=workflow_id).first()
+            workflow = self._read_workflow(session, workflow_id)
+        if not workflow and self.archive_engine is not None:
+            with Session(self.archive_engine) as session:
+                workflow = self._read_workflow(session, workflow_id)
             if workflow:
-                return {
-                    "id": workflow.id,
-                    "data": workflow.data,
-                    "state": workflow.state,
-                    "created_at": workflow.created_at.isoformat(),
-                    "updated_at": workflow.updated_at.isoformat()
-                }
-            return {}
+                workflow["archived"] = True
+        return workflow
 
-    def store_form(self, form_data: Dict[str, Any]) -> str:
-        form_id = f"form_{datetime.now().timestamp()}"
+    @staticmethod
+    def _read_workflow(session: Session, workflow_id: str) -> Dict[str, Any]:
+        workflow = session.query(Workflow).filter_by(id=workflow_id).first()
+        if workflow:
+            return {
+                "id": workflow.id,
+                "data": workflow.data,
+                "state": workflow.state,
+                "version": workflow.version or 1,
+                "created_at": workflow.created_at.isoformat(),
+                "updated_at": workflow.updated_at.isoformat()
+            }
+        return {}
+
+    @staticmethod
+    def new_form_id() -> str:
+        return f"form_{datetime.now().timestamp()}"
+
+    @classmethod
+    def _add_form(cls, session: Session, form_id: str, form_data: Dict[str, Any]) -> None:
+        cls._bump_version(session, form_data.get("workflow_id"))
+        session.add(Form(
+            id=form_id,
+            workflow_id=form_data.get("workflow_id"),
+            form_type=form_data.get("form_type"),
+            submitted_by=form_data.get("submitted_by"),
+            data=form_data,
+            documents=form_data.get("documents"),
+            created_at=datetime.now()
+        ))
+
+    def store_form(self, form_data: Dict[str, Any], expected_version: int = None) -> str:
+        form_id = self.new_form_id()
         with Session(self.engine) as session:
-            form = Form(
-                id=form_id,
-                data=form_data,
-                created_at=datetime.now()
-            )
-            session.add(form)
+            self._bump_version(session, form_data.get("workflow_id"), expected_version)
+            self._add_form(session, form_id, form_data)
             session.commit()
             logger.info(f"Stored form with ID: {form_id}")
         return form_id
@@ -166,17 +486,72 @@ class Storage:
             return {}
 
     def store_notification(self, notification_data: Dict[str, Any]) -> str:
-        notification_id = f"notif_{datetime.now().timestamp()}"
-        with Session(self.engine) as session:
-            notification = Notification(
-                id=notification_id,
-                data=notification_data,
-                status="sent",
-                created_at=datetime.now()
-            )
-            session.add(notification)
-            session.commit()
-            logger.info(f"Stored notification with ID: {notification_id}")
+        """Enqueue a notification for delivery by the outbox dispatcher"""
+        for attempt in range(2):
+            with Session(self.engine) as session:
+                notification_id = self._enqueue_notification(session, notification_data)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    if attempt:
+                        raise
+                    continue
+                logger.info(f"Stored notification with ID: {notification_id}")
+                return notification_id
+
+    def store_notifications(self, notifications: List[Dict[str, Any]]) -> List[str]:
+        """Enqueue several notifications in one transaction"""
+        for attempt in range(2):
+            with Session(self.engine) as session:
+                notification_ids = [self._enqueue_notification(session, n) for n in notifications]
+                try:
+                    session.commit()
+                except IntegrityError:
+                    if attempt:
+                        raise
+                    continue
+                logger.info(f"Stored {len(notification_ids)} notifications")
+                return notification_ids
+
+    @staticmethod
+    def _enqueue_notification(session: Session, notification_data: Dict[str, Any]) -> str:
+        """Add a pending notification to ``session``; returns the existing ID for a repeated idempotency key"""
+        key = notification_data.get("idempotency_key")
+        if key:
+            existing = session.query(Notification.id).filter_by(idempotency_key=key).first()
+            if existing:
+                return existing.id
+        now = datetime.now()
+        notification_id = f"notif_{now.timestamp()}_{uuid.uuid4().hex[:8]}"
+
+        # Resolve recipient roles to users for the inbox
+        roles = [r for r in notification_data.get("recipients") or [] if isinstance(r, str)]
+        members = {}
+        if roles:
+            for user_id, role in session.execute(
+                select(user_roles.c.user_id, Role.name)
+                .join(Role, Role.id == user_roles.c.role_id)
+                .where(Role.name.in_(roles))
+            ):
+                members.setdefault(user_id, role)
+
+        session.add(Notification(
+            id=notification_id,
+            workflow_id=notification_data.get("workflow_id"),
+            recipient_id=next(iter(members)) if len(members) == 1 else None,
+            data=notification_data,
+            status="pending",
+            idempotency_key=key,
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now,
+            updated_at=now
+        ))
+        session.add_all(
+            NotificationRecipient(notification_id=notification_id, user_id=user_id, role=role, created_at=now)
+            for user_id, role in members.items()
+        )
+        adjust_inbox_counters(session, {user_id: [1, 1] for user_id in members})
         return notification_id
 
     def get_notification(self, notification_id: str) -> Dict[str, Any]:
@@ -187,15 +562,187 @@ class Storage:
                     "id": notification.id,
                     "data": notification.data,
                     "status": notification.status,
+                    "attempts": notification.attempts,
+                    "last_error": notification.last_error,
+                    "sent_at": notification.sent_at.isoformat() if notification.sent_at else None,
                     "created_at": notification.created_at.isoformat()
                 }
             return {}
 
+    def update_notification(self, notification_id: str, status: str, error: str = None,
+                            next_attempt_at: datetime = None) -> bool:
+        """Persist a notification status transition"""
+        with Session(self.engine) as session:
+            notification = session.query(Notification).filter_by(id=notification_id).first()
+            if not notification:
+                return False
+            now = datetime.now()
+            notification.status = status
+            notification.updated_at = now
+            notification.next_attempt_at = next_attempt_at
+            if error is not None:
+                notification.last_error = error[:1000]
+            if status == "sent":
+                notification.sent_at = now
+            session.commit()
+            return True
+
+    def record_deliveries(self, outcomes: List[Dict[str, Any]]) -> None:
+        """Persist the outcome of a delivery batch in one transaction.
+
+        Each outcome holds ``id``, ``status`` and optionally ``error`` and
+        ``next_attempt_at`` (for a retry).
+        """
+        if not outcomes:
+            return
+        now = datetime.now()
+        rows = []
+        for outcome in outcomes:
+            row = {"id": outcome["id"], "status": outcome["status"], "updated_at": now,
+                   "next_attempt_at": outcome.get("next_attempt_at")}
+            if outcome.get("error") is not None:
+                row["last_error"] = outcome["error"][:1000]
+            if outcome["status"] == "sent":
+                row["sent_at"] = now
+            rows.append(row)
+        with Session(self.engine) as session:
+            # Rows with different keys cannot share one executemany
+            for keys in {tuple(sorted(row)) for row in rows}:
+                session.execute(update(Notification), [row for row in rows if tuple(sorted(row)) == keys])
+            session.commit()
+
+    def get_inbox(self, user_id: str, limit: int = 20, cursor: str = None,
+                  unread_only: bool = False) -> Dict[str, Any]:
+        """A page of a user's inbox, newest first, using keyset pagination.
+
+        ``cursor`` is the ``next_cursor`` of the previous page; each page is a
+        single index range scan regardless of how deep it is.
+        """
+        query = (
+            select(NotificationRecipient, Notification)
+            .join(Notification, Notification.id == NotificationRecipient.notification_id)
+            .where(NotificationRecipient.user_id == user_id)
+            .order_by(NotificationRecipient.created_at.desc(), NotificationRecipient.notification_id.desc())
+            .limit(limit + 1)
+        )
+        if unread_only:
+            query = query.where(NotificationRecipient.read_at.is_(None))
+        if cursor:
+            created_at, notification_id = self._decode_cursor(cursor)
+            query = query.where(
+                tuple_(NotificationRecipient.created_at, NotificationRecipient.notification_id)
+                < tuple_(created_at, notification_id)
+            )
+
+        with Session(self.engine) as session:
+            rows = session.execute(query).all()
+            counter = session.get(InboxCounter, user_id)
+            items = []
+            for recipient, notification in rows[:limit]:
+                data = notification.data or {}
+                items.append({
+                    "id": notification.id,
+                    "type": data.get("type"),
+                    "workflow_id": notification.workflow_id,
+                    "role": recipient.role,
+                    "digest": bool(data.get("digest")),
+                    "count": data.get("count", 1),
+                    "data": data.get("data") if not data.get("digest") else {
+                        "workflow_ids": data.get("workflow_ids"), "events": data.get("events")
+                    },
+                    "status": notification.status,
+                    "read": recipient.read_at is not None,
+                    "created_at": recipient.created_at.isoformat()
+                })
+            next_cursor = None
+            if len(rows) > limit:
+                last = rows[limit - 1][0]
+                next_cursor = self._encode_cursor(last.created_at, last.notification_id)
+            return {
+                "items": items,
+                "next_cursor": next_cursor,
+                "unread": counter.unread if counter else 0,
+                "total": counter.total if counter else 0
+            }
+
+    @staticmethod
+    def _encode_cursor(created_at: datetime, notification_id: str) -> str:
+        return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{notification_id}".encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            created_at, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+            return datetime.fromisoformat(created_at), notification_id
+        except Exception:
+            raise ValueError("Invalid inbox cursor")
+
+    def get_unread_count(self, user_id: str) -> Dict[str, int]:
+        """Unread and total inbox counts, read from the counter row"""
+        with Session(self.engine) as session:
+            counter = session.get(InboxCounter, user_id)
+            return {"unread": counter.unread if counter else 0, "total": counter.total if counter else 0}
+
+    def mark_read(self, user_id: str, notification_ids: List[str] = None) -> int:
+        """Mark some (or all, when no IDs are given) of a user's notifications read; returns how many changed"""
+        with Session(self.engine) as session:
+            statement = update(NotificationRecipient).where(
+                NotificationRecipient.user_id == user_id,
+                NotificationRecipient.read_at.is_(None)
+            ).values(read_at=datetime.now())
+            if notification_ids is not None:
+                statement = statement.where(NotificationRecipient.notification_id.in_(notification_ids))
+            changed = session.execute(statement).rowcount
+            if changed:
+                adjust_inbox_counters(session, {user_id: [-changed, 0]})
+            session.commit()
+            return changed
+
+    def claim_notifications(self, limit: int, lease_seconds: float = 60) -> List[Dict[str, Any]]:
+        """Claim up to ``limit`` due notifications for delivery.
+
+        Claimed rows move to ``sending`` with a lease; rows whose lease expired
+        (e.g. the process died mid-delivery) become claimable again.
+        """
+        now = datetime.now()
+        lease = now + timedelta(seconds=lease_seconds)
+        due = (Notification.status.in_(("pending", "sending"))) & (Notification.next_attempt_at <= now)
+        with Session(self.engine) as session:
+            ids = list(session.scalars(
+                select(Notification.id).where(due).order_by(Notification.next_attempt_at).limit(limit)
+            ))
+            if not ids:
+                return []
+            session.execute(
+                update(Notification)
+                .where(Notification.id.in_(ids), due)
+                .values(status="sending", next_attempt_at=lease, updated_at=now,
+                        attempts=func.coalesce(Notification.attempts, 0) + 1)
+            )
+            session.commit()
+            claimed = session.query(Notification).filter(
+                Notification.id.in_(ids), Notification.status == "sending", Notification.next_attempt_at == lease
+            ).all()
+            return [
+                {
+                    "id": n.id,
+                    "workflow_id": n.workflow_id,
+                    "data": n.data,
+                    "idempotency_key": n.idempotency_key or n.id,
+                    "attempts": n.attempts
+                }
+                for n in claimed
+            ]
+
     def create_approval(self, request_data: Dict[str, Any]) -> str:
         approval_id = f"appr_{datetime.now().timestamp()}"
         with Session(self.engine) as session:
+            self._bump_version(session, request_data.get("workflow_id"))
             approval = Approval(
                 id=approval_id,
+                workflow_id=request_data.get("workflow_id"),
+                approver_role=request_data.get("approver_role"),
+                approval_order=request_data.get("order"),
                 data=request_data,
                 status="pending",
                 created_at=datetime.now(),
@@ -210,7 +757,9 @@ class Storage:
         with Session(self.engine) as session:
             approval = session.query(Approval).filter_by(id=approval_id).first()
             if approval:
+                self._bump_version(session, approval.workflow_id)
                 approval.status = decision
+                approval.decision = decision
                 approval.updated_at = datetime.now()
                 session.commit()
                 logger.info(f"Updated approval {approval_id} status to {decision}")
@@ -230,6 +779,132 @@ class Storage:
                 }
             return {}
 
+    def claim_idempotency_key(self, scope: str, key: str, request_hash: str,
+                              lock_seconds: float) -> Dict[str, Any]:
+        """Start a run for an idempotency key.
+
+        Returns None when the caller now owns the key, otherwise the existing
+        record (its status, request hash and, once completed, the response).
+        A key whose run expired is taken over.
+        """
+        now = datetime.now()
+        values = {"request_hash": request_hash, "status": "in_progress", "status_code": None,
+                  "response": None, "created_at": now, "expires_at": now + timedelta(seconds=lock_seconds)}
+        for attempt in range(2):
+            with Session(self.engine) as session:
+                record = session.get(IdempotencyKey, (scope, key))
+                if record is None:
+                    session.add(IdempotencyKey(scope=scope, key=key, **values))
+                elif record.expires_at < now:
+                    taken = session.execute(
+                        update(IdempotencyKey)
+                        .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key,
+                               IdempotencyKey.expires_at == record.expires_at)
+                        .values(**values)
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
+                    if not taken:
+                        continue
+                else:
+                    return {
+                        "status": record.status,
+                        "request_hash": record.request_hash,
+                        "status_code": record.status_code,
+                        "response": record.response
+                    }
+                try:
+                    session.commit()
+                    return None
+                except IntegrityError:
+                    # Claimed concurrently; read the winner's record
+                    session.rollback()
+        raise RuntimeError(f"Could not claim idempotency key {key}")
+
+    def get_idempotency_key(self, scope: str, key: str) -> Dict[str, Any]:
+        with Session(self.engine) as session:
+            record = session.get(IdempotencyKey, (scope, key))
+            if record is None:
+                return None
+            return {
+                "status": record.status,
+                "request_hash": record.request_hash,
+                "status_code": record.status_code,
+                "response": record.response
+            }
+
+    def complete_idempotency_key(self, scope: str, key: str, status_code: int, response: str,
+                                 ttl_seconds: float) -> None:
+        """Record the response of a finished run; repeats replay it until the key expires"""
+        with Session(self.engine) as session:
+            session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+                .values(status="completed", status_code=status_code, response=response,
+                        expires_at=datetime.now() + timedelta(seconds=ttl_seconds))
+            )
+            session.commit()
+
+    def release_idempotency_key(self, scope: str, key: str) -> None:
+        """Forget a key whose run failed, so a retry runs again"""
+        with Session(self.engine) as session:
+            session.query(IdempotencyKey).filter_by(scope=scope, key=key).delete()
+            session.commit()
+
+    def purge_idempotency_keys(self, now: datetime = None) -> int:
+        """Delete expired idempotency keys; returns how many were removed"""
+        with Session(self.engine) as session:
+            removed = session.query(IdempotencyKey).filter(
+                IdempotencyKey.expires_at < (now or datetime.now())).delete()
+            session.commit()
+        return removed
+
+    def store_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """Record uploaded blobs; hashes that are already known are left unchanged"""
+        if not documents:
+            return
+        with Session(self.engine) as session:
+            if session.get_bind().dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            now = datetime.now()
+            session.execute(upsert(Document).on_conflict_do_nothing(index_elements=[Document.sha256]), [{
+                "sha256": document["sha256"],
+                "size": document["size"],
+                "content_type": document.get("content_type"),
+                "filename": document.get("filename"),
+                "uploaded_by": document.get("uploaded_by"),
+                "created_at": now
+            } for document in documents])
+            session.commit()
+
+    def get_documents(self, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata of the known documents among ``hashes``, keyed by hash"""
+        with Session(self.engine) as session:
+            documents = session.scalars(select(Document).where(Document.sha256.in_(set(hashes)))).all()
+            return {
+                document.sha256: {
+                    "sha256": document.sha256,
+                    "size": document.size,
+                    "content_type": document.content_type,
+                    "filename": document.filename,
+                    "uploaded_by": document.uploaded_by,
+                    "created_at": document.created_at.isoformat(),
+                    "extraction": document.extraction
+                }
+                for document in documents
+            }
+
+    def store_extraction(self, sha256: str, extraction: Dict[str, Any]) -> None:
+        """Cache the extraction summary of a document"""
+        with Session(self.engine) as session:
+            session.execute(
+                update(Document)
+                .where(Document.sha256 == sha256)
+                .values(extraction=extraction, extracted_at=datetime.now())
+            )
+            session.commit()
+
     def get_all_workflows(self) -> List[Dict[str, Any]]:
         """Retrieve all workflows from the database"""
         with Session(self.engine) as session:
@@ -246,55 +921,212 @@ class Storage:
             ]
 
     def get_workflow_progress(self, workflow_id: str) -> Dict[str, Any]:
-        """Get detailed workflow progress information"""
+        """Get detailed workflow progress information.
+
+        Keyed by the progress tag, so a read never joins one that started
+        before the latest write or delivery.
+        """
+        tag = self.get_progress_tag(workflow_id)
+        if tag is None:
+            return {}
+        return self.progress_flight.do((workflow_id, tag), self._load_workflow_progress, workflow_id)
+
+    def _load_workflow_progress(self, workflow_id: str) -> Dict[str, Any]:
         with Session(self.engine) as session:
-            workflow = session.query(Workflow).filter_by(id=workflow_id).first()
-            if not workflow:
-                return {}
-
-            # Get all forms for this workflow
-            forms = session.query(Form).filter_by(workflow_id=workflow_id).all()
-            
-            # Get all approvals for this workflow
-            approvals = session.query(Approval).filter_by(workflow_id=workflow_id).all()
-            
-            # Get all notifications for this workflow
-            notifications = session.query(Notification).filter_by(workflow_id=workflow_id).all()
-            
-            return {
-                "id": workflow.id,
-                "state": workflow.state,
-                "current_step": workflow.current_step,
-                "data": workflow.data,
-                "created_at": workflow.created_at.isoformat(),
-                "updated_at": workflow.updated_at.isoformat(),
-                "forms": [
-                    {
-                        "id": form.id,
-                        "form_type": form.form_type,
-                        "submitted_by": form.submitted_by,
-                        "created_at": form.created_at.isoformat()
-                    }
-                    for form in forms
-                ],
-                "approvals": [
-                    {
-                        "id": approval.id,
-                        "approver_id": approval.approver_id,
-                        "status": approval.status,
-                        "decision": approval.decision,
-                        "comments": approval.comments,
-                        "created_at": approval.created_at.isoformat()
-                    }
-                    for approval in approvals
-                ],
-                "notifications": [
-                    {
-                        "id": notification.id,
-                        "recipient_id": notification.recipient_id,
-                        "status": notification.status,
-                        "created_at": notification.created_at.isoformat()
-                    }
-                    for notification in notifications
-                ]
-            }
\ No newline at end of file
+            progress = self._read_progress(session, workflow_id)
+        if self.archive_engine is None:
+            return progress
+        with Session(self.archive_engine) as session:
+            if not progress:
+                progress = self._read_progress(session, workflow_id)
+                if progress:
+                    progress["archived"] = True
+            else:
+                # Old notifications of live workflows may already have been archived
+                archived = session.query(Notification).filter_by(workflow_id=workflow_id).all()
+                if archived:
+                    progress["notifications"] = self._notification_summaries(archived) + progress["notifications"]
+        return progress
+
+    @classmethod
+    def _read_progress(cls, session: Session, workflow_id: str) -> Dict[str, Any]:
+        workflow = session.query(Workflow).filter_by(id=workflow_id).first()
+        if not workflow:
+            return {}
+
+        # Get all forms for this workflow
+        forms = session.query(Form).filter_by(workflow_id=workflow_id).all()
+
+        # Get all approvals for this workflow
+        approvals = session.query(Approval).filter_by(workflow_id=workflow_id).all()
+
+        # Get all notifications for this workflow
+        notifications = session.query(Notification).filter_by(workflow_id=workflow_id).all()
+
+        return {
+            "id": workflow.id,
+            "workflow_type": workflow.workflow_type,
+            "state": workflow.state,
+            "current_step": workflow.current_step,
+            "data": workflow.data,
+            "version": workflow.version or 1,
+            "created_at": workflow.created_at.isoformat(),
+            "updated_at": workflow.updated_at.isoformat(),
+            "forms": [
+                {
+                    "id": form.id,
+                    "form_type": form.form_type,
+                    "submitted_by": form.submitted_by,
+                    "created_at": form.created_at.isoformat()
+                }
+                for form in forms
+            ],
+            "approvals": [
+                {
+                    "id": approval.id,
+                    "approver_id": approval.approver_id,
+                    "approver_role": approval.approver_role,
+                    "order": approval.approval_order,
+                    "status": approval.status,
+                    "decision": approval.decision,
+                    "comments": approval.comments,
+                    "created_at": approval.created_at.isoformat(),
+                    "updated_at": approval.updated_at.isoformat() if approval.updated_at else None
+                }
+                for approval in approvals
+            ],
+            "notifications": cls._notification_summaries(notifications)
+        }
+
+    @staticmethod
+    def _notification_summaries(notifications: List[Notification]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": notification.id,
+                "recipient_id": notification.recipient_id,
+                "status": notification.status,
+                "created_at": notification.created_at.isoformat()
+            }
+            for notification in notifications
+        ]
+
+    def search_workflows(self, lease_end_from: date = None, lease_end_to: date = None,
+                         property_type: str = None, exit_reason: str = None, state: str = None,
+                         limit: int = 100) -> List[Dict[str, Any]]:
+        """Filter workflows on promoted columns, ordered by lease end date.
+
+        Date ranges are served by the lease_end_date indexes instead of
+        decoding ``data`` for every row.
+        """
+        query = select(Workflow).order_by(Workflow.lease_end_date, Workflow.id).limit(limit)
+        if lease_end_from is not None:
+            query = query.where(Workflow.lease_end_date >= lease_end_from)
+        if lease_end_to is not None:
+            query = query.where(Workflow.lease_end_date <= lease_end_to)
+        if property_type is not None:
+            query = query.where(Workflow.property_type == property_type)
+        if exit_reason is not None:
+            query = query.where(Workflow.exit_reason == exit_reason)
+        if state is not None:
+            query = query.where(Workflow.state == state)
+        with Session(self.engine) as session:
+            return [
+                {
+                    "id": w.id,
+                    "lease_id": w.lease_id,
+                    "workflow_type": w.workflow_type,
+                    "property_name": w.property_name,
+                    "property_type": w.property_type,
+                    "lease_end_date": w.lease_end_date.isoformat() if w.lease_end_date else None,
+                    "exit_reason": w.exit_reason,
+                    "state": w.state,
+                    "current_step": w.current_step,
+                    "updated_at": w.updated_at.isoformat()
+                }
+                for w in session.scalars(query)
+            ]
+
+    def get_approval_chain_status(self, workflow_id: str, required_roles: List[str]) -> Dict[str, Any]:
+        """Approval chain status for one workflow, computed with a single grouped query"""
+        return self.get_approval_chain_statuses(required_roles, workflow_ids=[workflow_id])[workflow_id]
+
+    def get_approval_chain_statuses(self, required_roles: List[str], workflow_ids: List[str] = None,
+                                    current_step: str = None) -> Dict[str, Dict[str, Any]]:
+        """Approval chain status for many workflows at once.
+
+        Select workflows either by ID or by current step (e.g. everything
+        awaiting approval). Approvals are grouped per workflow and role in
+        SQL, and a role's status is decided by ``approval_role_statuses``,
+        the same rule as the approvals_complete guard. Archived workflows
+        are read from the archive database.
+        """
+        if workflow_ids is None and current_step is None:
+            raise ValueError("Provide workflow_ids or current_step")
+
+        latest = [func.max(case((Approval.status == status, Approval.updated_at))) for status in APPROVAL_STATUSES]
+        query = (
+            select(Approval.workflow_id, Approval.approver_role, *latest)
+            .where(Approval.approver_role.in_(required_roles))
+            .group_by(Approval.workflow_id, Approval.approver_role)
+        )
+
+        with Session(self.engine) as session:
+            rows, selected = self._approval_rows(session, query, workflow_ids, current_step)
+        if self.archive_engine is not None:
+            found = {row[0] for row in rows}
+            # Workflows without approvals here may have been archived with them
+            archived_ids = None if workflow_ids is None else [w for w in selected if w not in found]
+            if archived_ids is None or archived_ids:
+                with Session(self.archive_engine) as session:
+                    archived_rows, archived = self._approval_rows(session, query, archived_ids, current_step)
+                rows += [row for row in archived_rows if row[0] not in found]
+                selected = list(dict.fromkeys(selected + archived))
+
+        approvals: Dict[str, List[Tuple[str, str, Any]]] = {workflow_id: [] for workflow_id in selected}
+        for workflow_id, role, *updated in rows:
+            approvals.setdefault(workflow_id, []).extend(
+                (role, status, at) for status, at in zip(APPROVAL_STATUSES, updated))
+
+        return {
+            workflow_id: self._chain_status(approval_role_statuses(triples), required_roles)
+            for workflow_id, triples in approvals.items()
+        }
+
+    def _approval_rows(self, session: Session, query: Any, workflow_ids: List[str],
+                       current_step: str) -> Tuple[List[Any], List[str]]:
+        """Rows of the grouped approval query and the selected workflow IDs, by ID or by current step"""
+        if workflow_ids is not None:
+            rows = []
+            # Chunked to stay under the database's bound parameter limit
+            for start in range(0, len(workflow_ids), self.BULK_CHUNK_SIZE):
+                chunk = workflow_ids[start:start + self.BULK_CHUNK_SIZE]
+                rows.extend(session.execute(query.where(Approval.workflow_id.in_(chunk))).all())
+            return rows, list(workflow_ids)
+        step_filter = select(Workflow.id).where(Workflow.current_step == current_step)
+        rows = session.execute(query.where(Approval.workflow_id.in_(step_filter))).all()
+        return rows, list(session.execute(step_filter).scalars())
+
+    @staticmethod
+    def _chain_status(statuses: Dict[str, str], required_roles: List[str]) -> Dict[str, Any]:
+        result = {
+            "valid": True,
+            "complete": False,
+            "errors": [],
+            "pending": [],
+            "approved": [],
+            "rejected": [],
+            "next_role": None
+        }
+        for role in required_roles:
+            status = statuses.get(role)
+            if status is None:
+                result["errors"].append(f"Missing approval from {role}")
+                result["valid"] = False
+            elif status in APPROVAL_STATUSES:
+                result[status].append(role)
+                if status == "rejected":
+                    result["valid"] = False
+            if status != "approved" and result["next_role"] is None:
+                result["next_role"] = role
+        result["complete"] = len(result["approved"]) == len(required_roles)
+        return result
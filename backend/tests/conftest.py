@@ -0,0 +1,57 @@
+"""
+Fixtures for the API tests.
+
+The app is imported once per test session against a temporary database,
+with crew execution replaced by the benchmark stub so no LLM is called.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    data_dir = tempfile.mkdtemp(prefix="lease_exit_tests_")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "test-stub")
+    os.environ["LEASE_EXIT_DATABASE_URL"] = f"sqlite:///{os.path.join(data_dir, 'lease_exit.db')}"
+    os.environ["DOCUMENT_STORE_PATH"] = os.path.join(data_dir, "documents")
+    os.environ["MAINTENANCE_INTERVAL_SECONDS"] = "0"
+    # Repeated queries within one request fail the test run
+    os.environ["N_PLUS_ONE_MODE"] = "raise"
+    # Every TestClient request comes from the same client; keep its rate limit out of the way
+    os.environ["CLIENT_BURST"] = "1000"
+    import main
+    from benchmarks.stubs import install_llm_stub
+    install_llm_stub(main)
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    # One lifespan per session: the background components bind to the event loop they start on
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def create_workflow(client):
+    """Create a workflow through the API; returns the create response body"""
+    def create():
+        response = client.post("/api/workflow/lease-exit/create", json={
+            "propertyName": "Test Tower",
+            "leaseId": "L-100",
+            "leaseEndDate": "2027-06-30",
+            "exitReason": "Consolidation",
+            "submittedBy": "tester"
+        })
+        assert response.status_code == 201, response.text
+        return response.json()
+    return create
@@ -0,0 +1,52 @@
+"""Runtime settings endpoints reject bad values instead of breaking later requests"""
+
+import pytest
+
+
+@pytest.mark.parametrize("payload", [
+    {"sample_rate": "often"},
+    {"sample_rate": 1.5},
+    {"sample_rate": True},
+    {"sample_rates": {"GET /api/metrics": -0.1}},
+    {"sample_rates": ["GET /api/metrics"]},
+    {"max_field_length": 0},
+    {"max_field_length": "2000"},
+    {"crew_verbose": "yes"},
+    {"level": "LOUD"},
+    {"levels": {"httpx": 10}},
+])
+def test_invalid_logging_settings_are_rejected(client, payload):
+    before = client.get("/api/admin/logging").json()
+    response = client.put("/api/admin/logging", json=payload)
+    assert response.status_code == 400, response.text
+    after = client.get("/api/admin/logging").json()
+    assert {key: after[key] for key in payload} == {key: before[key] for key in payload}
+
+
+def test_numeric_string_sample_rate_is_converted(client):
+    response = client.put("/api/admin/logging", json={"sample_rate": "0.5"})
+    try:
+        assert response.status_code == 200, response.text
+        assert response.json()["sample_rate"] == 0.5
+        assert client.get("/api/metrics").status_code == 200
+    finally:
+        client.put("/api/admin/logging", json={"sample_rate": 1})
+
+
+@pytest.mark.parametrize("payload", [
+    {"enabled": True, "threshold_ms": "x"},
+    {"enabled": "yes"},
+    {"enabled": 1},
+    {"interval_ms": "fast"},
+    {"interval_ms": 0.5},
+    {"threshold_ms": -1},
+    {"sample_rate": 2},
+])
+def test_invalid_profiling_settings_are_rejected(client, payload):
+    before = client.get("/api/admin/profiling").json()
+    response = client.put("/api/admin/profiling", json=payload)
+    assert response.status_code == 400, response.text
+    # Nothing was applied, so the API keeps working
+    after = client.get("/api/admin/profiling").json()
+    assert {key: after[key] for key in payload} == {key: before[key] for key in payload}
+    assert client.get("/api/metrics").status_code == 200
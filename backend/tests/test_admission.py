@@ -0,0 +1,36 @@
+"""Per-client rate limiting on the crew-bound endpoints"""
+
+import uuid
+
+CREATE_BODY = {
+    "propertyName": "Busy Building",
+    "leaseId": "L-300",
+    "leaseEndDate": "2027-06-30",
+    "exitReason": "Consolidation",
+    "submittedBy": "tester"
+}
+
+
+def test_exhausted_bucket_is_rejected_with_retry_after(client, app_module, monkeypatch):
+    admission = app_module.admission
+    # Buckets are created with the controller's settings on a client's first request
+    monkeypatch.setattr(admission, "rate", 1 / 60)
+    monkeypatch.setattr(admission, "burst", 2)
+    rejected = admission.stats["rate_limited"]
+    headers = {"X-Client-Id": f"burst-{uuid.uuid4()}"}
+
+    for _ in range(2):
+        response = client.post("/api/workflow/lease-exit/create", json=CREATE_BODY, headers=headers)
+        assert response.status_code == 201, response.text
+
+    response = client.post("/api/workflow/lease-exit/create", json=CREATE_BODY, headers=headers)
+    assert response.status_code == 429
+    assert "rate_limited" in response.json()["detail"]
+    # One token comes back per minute
+    assert 1 <= int(response.headers["retry-after"]) <= 60
+    assert admission.stats["rate_limited"] == rejected + 1
+
+    # Other clients have buckets of their own
+    other = client.post("/api/workflow/lease-exit/create", json=CREATE_BODY,
+                        headers={"X-Client-Id": f"other-{uuid.uuid4()}"})
+    assert other.status_code == 201, other.text
@@ -0,0 +1,42 @@
+"""Approval analytics ages"""
+
+from datetime import datetime, timedelta
+import time
+
+import pytest
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from analytics import ApprovalAnalytics
+from storage import Approval
+
+
+@pytest.fixture
+def local_timezone(monkeypatch):
+    """A timezone away from UTC, so naive local timestamps differ from UTC ones"""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_pending_age_uses_local_timestamps(app_module, create_workflow, local_timezone):
+    storage = app_module.storage
+    workflow_id = create_workflow()["workflow_id"]
+    approval_id = storage.create_approval({"workflow_id": workflow_id, "approver_role": "auditor", "order": 0})
+    # Stored like every other timestamp: naive local time
+    with Session(storage.engine) as session:
+        session.execute(update(Approval).where(Approval.id == approval_id)
+                        .values(created_at=datetime.now() - timedelta(hours=2)))
+        session.commit()
+
+    analytics = ApprovalAnalytics(storage)
+    first = analytics.get_analytics()
+    second = analytics.get_analytics()
+    assert not first["cached"] and second["cached"]
+    for result in (first, second):
+        age = result["by_role"]["auditor"]["pending_age_h"]["p50"]
+        assert 1.9 < age < 2.1, age
+        assert not any(key.startswith("_") for key in result)
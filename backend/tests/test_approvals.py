@@ -0,0 +1,71 @@
+"""Approval chain status and the approvals_complete guard"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import Archiver
+from storage import Storage
+from workflow_engine import get_state_machine
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+
+
+def _approve_chain(storage, workflow_id, roles):
+    for order, role in enumerate(roles):
+        storage.update_approval(
+            storage.create_approval({"workflow_id": workflow_id, "approver_role": role, "order": order}), "approved")
+
+
+def _guard_errors(storage, workflow_id):
+    machine = get_state_machine()
+    transition = machine.lookup("approval_chain", "approvals_complete")
+    return machine.check_guards(transition, storage.get_workflow_progress(workflow_id))
+
+
+def test_guard_and_chain_status_agree_on_latest_approval(storage):
+    machine = get_state_machine()
+    workflow_id = storage.create_workflow({"property_name": "Test Tower"})
+    _approve_chain(storage, workflow_id, machine.approval_chain)
+    assert storage.get_approval_chain_status(workflow_id, machine.approval_chain)["complete"]
+    assert _guard_errors(storage, workflow_id) == []
+
+    # A newer request for the same role supersedes its earlier approval
+    storage.create_approval({"workflow_id": workflow_id, "approver_role": "legal", "order": 2})
+    status = storage.get_approval_chain_status(workflow_id, machine.approval_chain)
+    assert status["pending"] == ["legal"] and not status["complete"]
+    assert _guard_errors(storage, workflow_id) == ["Missing approval from LEGAL"]
+
+
+def test_archived_workflow_keeps_its_approvals(storage):
+    machine = get_state_machine()
+    workflow_id = storage.create_workflow({"property_name": "Test Tower"})
+    _approve_chain(storage, workflow_id, machine.approval_chain)
+    storage.update_workflow_state(workflow_id, {"state": "completed", "current_step": "completed"})
+    assert Archiver(storage, min_age_days=0).archive_workflows(now=datetime.now() + timedelta(days=1)) == 1
+
+    assert storage.get_approval_chain_status(workflow_id, machine.approval_chain)["complete"]
+    by_step = storage.get_approval_chain_statuses(machine.approval_chain, current_step="completed")
+    assert by_step[workflow_id]["complete"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"workflow_ids": "wf_1"},
+    {"workflow_ids": ["wf_1", 2]},
+    {"workflow_ids": {"id": "wf_1"}},
+    {"current_step": ["approval_chain"]},
+    {},
+])
+def test_bulk_status_rejects_malformed_payload(client, payload):
+    response = client.post("/api/workflow/lease-exit/approvals/status", json=payload)
+    assert response.status_code == 400, response.text
+
+
+def test_bulk_status_by_ids(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    response = client.post("/api/workflow/lease-exit/approvals/status", json={"workflow_ids": [workflow_id]})
+    assert response.status_code == 200, response.text
+    assert workflow_id in response.json()
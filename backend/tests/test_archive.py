@@ -0,0 +1,27 @@
+"""Hot/cold archival"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import Archiver
+from storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+
+
+def test_only_finished_notifications_are_archived(storage):
+    workflow_id = storage.create_workflow({"property_name": "Test Tower"})
+    ids = {status: storage.store_notification({"workflow_id": workflow_id, "type": "reminder",
+                                               "recipients": [], "data": {"status": status}})
+           for status in ("pending", "sending", "sent", "failed")}
+    for status in ("sending", "sent", "failed"):
+        storage.update_notification(ids[status], status)
+
+    moved = Archiver(storage, notification_age_days=0).archive_notifications(now=datetime.now() + timedelta(days=1))
+    assert moved == 2
+    claimable = {n["id"] for n in storage.claim_notifications(10, lease_seconds=0)}
+    assert ids["pending"] in claimable
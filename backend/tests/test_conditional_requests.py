@@ -0,0 +1,47 @@
+"""ETag and If-Match handling of the workflow endpoints"""
+
+
+def test_delivery_does_not_bump_version(client, app_module, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    storage = app_module.storage
+    notification_id = storage.store_notification({"workflow_id": workflow_id, "type": "reminder",
+                                                  "recipients": [], "data": {}})
+    version = storage.get_workflow_version(workflow_id)
+    tag = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress").headers["etag"]
+
+    storage.update_notification(notification_id, "failed", error="mailbox full")
+
+    assert storage.get_workflow_version(workflow_id) == version
+    response = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress", headers={"If-None-Match": tag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != tag
+    # The delivery did not invalidate the tag for writes
+    response = client.post(f"/api/workflow/lease-exit/{workflow_id}/form", headers={"If-Match": tag}, json={
+        "formType": "exit_requirements_ifm", "submittedBy": "tester",
+        "scope_details": {"floors": [1]}, "timeline": "Q1"})
+    assert response.status_code == 200, response.text
+
+
+def test_unchanged_progress_is_not_modified(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    tag = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress").headers["etag"]
+    response = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress", headers={"If-None-Match": tag})
+    assert response.status_code == 304
+
+
+def test_form_write_returns_etag_and_stale_retry_stores_nothing(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    url = f"/api/workflow/lease-exit/{workflow_id}"
+    tag = client.get(url).headers["etag"]
+    form = {"formType": "exit_requirements_ifm", "submittedBy": "tester",
+            "scope_details": {"floors": [2]}, "timeline": "Q2"}
+
+    response = client.post(f"{url}/form", headers={"If-Match": tag}, json=form)
+    assert response.status_code == 200, response.text
+    assert response.headers["etag"] == client.get(url).headers["etag"] != tag
+
+    forms = client.get(f"{url}/progress").json()["forms"]
+    response = client.post(f"{url}/form", headers={"If-Match": tag}, json=form)
+    assert response.status_code == 412
+    assert client.get(f"{url}/progress").json()["forms"] == forms
+
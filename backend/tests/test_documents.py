@@ -0,0 +1,72 @@
+"""Content-addressed document uploads"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from documents import DocumentStore, UploadError
+
+LEASE = b"Lease agreement\n" * 1000
+
+
+def test_upload_is_stored_once_under_its_hash(client, app_module):
+    sha256 = hashlib.sha256(LEASE).hexdigest()
+    first = client.post("/api/documents", files={"file": ("lease.txt", LEASE, "text/plain")},
+                        data={"uploaded_by": "tester"})
+    assert first.status_code == 200, first.text
+    [document] = first.json()["documents"]
+    assert document["sha256"] == sha256 and document["size"] == len(LEASE)
+
+    second = client.post("/api/documents", files={"file": ("copy.txt", LEASE, "text/plain")})
+    assert second.json()["documents"][0]["deduplicated"] is True
+    store = app_module.document_store
+    with open(store.path(sha256), "rb") as blob:
+        assert blob.read() == LEASE
+    assert os.listdir(store.temp_dir) == []
+
+
+def test_download_supports_ranges(client):
+    sha256 = client.post("/api/documents", files={"file": ("lease.txt", LEASE, "text/plain")}).json()[
+        "documents"][0]["sha256"]
+    response = client.get(f"/api/documents/{sha256}", headers={"Range": "bytes=0-15"})
+    assert response.status_code == 206
+    assert response.content == b"Lease agreement\n"
+    assert response.headers["etag"] == f'"{sha256}"'
+    assert client.get(f"/api/documents/{'0' * 64}").status_code == 404
+
+
+def test_malformed_uploads_are_rejected(client):
+    assert client.post("/api/documents", json={"file": "lease"}).status_code == 400
+    assert client.post("/api/documents", data={"uploaded_by": "tester"},
+                       files={"note": (None, "no file here")}).status_code == 400
+
+
+def test_forms_must_reference_known_documents(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    response = client.post(f"/api/workflow/lease-exit/{workflow_id}/form", json={
+        "formType": "lease_requirements", "submittedBy": "tester", "cost_estimate": 1.0,
+        "requirements_list": [], "documents": ["f" * 64]})
+    assert response.status_code == 422
+    assert "Unknown document" in response.text
+
+
+def test_oversized_blob_is_discarded(tmp_path):
+    store = DocumentStore(str(tmp_path), max_bytes=10)
+
+    async def chunks():
+        for _ in range(3):
+            yield b"12345"
+
+    with pytest.raises(UploadError) as error:
+        asyncio.run(store.save(chunks()))
+    assert error.value.status_code == 413
+    assert os.listdir(store.temp_dir) == []
+
+
+def test_hashes_are_validated_before_building_paths(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.path("../../etc/passwd")
+    assert not store.exists("../../etc/passwd")
@@ -0,0 +1,91 @@
+"""Document text extraction and the extraction pipeline"""
+
+import asyncio
+import hashlib
+import json
+import os
+import zipfile
+
+from documents import DocumentStore
+from extraction import DocumentPipeline, chunk_text, describe_document, extract_document
+from storage import Storage
+
+COSTS_CSV = "item,amount,owner\nSignage removal,\"$1,200\",ifm\nCredit,(50),legal\nFlooring,800.50,mac\n"
+
+
+def _write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content if isinstance(content, bytes) else content.encode("utf-8"))
+    return str(path)
+
+
+def test_csv_summary_has_columns_and_totals(tmp_path):
+    path = _write(tmp_path, "costs.csv", COSTS_CSV)
+    summary = extract_document(path, "text/csv", "costs.csv", chunks_path=f"{path}.chunks.json")
+    assert summary["kind"] == "csv"
+    assert summary["rows"] == 3
+    assert summary["columns"] == ["item", "amount", "owner"]
+    assert summary["column_totals"] == {"amount": 1950.5}
+    with open(f"{path}.chunks.json") as f:
+        assert json.load(f)[0].startswith("item, amount, owner")
+    assert "totals: amount=1950.5" in describe_document({"filename": "costs.csv", **summary})
+
+
+def test_docx_paragraphs_are_read(tmp_path):
+    path = str(tmp_path / "notice.docx")
+    word = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{word}"><w:body>'
+                         '<w:p><w:r><w:t>Notice of </w:t></w:r><w:r><w:t>exit</w:t></w:r></w:p>'
+                         '<w:p></w:p><w:p><w:r><w:t>Effective 2027-06-30</w:t></w:r></w:p>'
+                         '</w:body></w:document>')
+    summary = extract_document(path, filename="notice.docx")
+    assert summary["kind"] == "docx" and summary["paragraphs"] == 2
+    assert summary["excerpt"] == "Notice of exit Effective 2027-06-30"
+
+
+def test_unreadable_documents_are_reported_not_raised(tmp_path):
+    assert extract_document(_write(tmp_path, "blob.bin", b"\x00\x01\x02"))["kind"] == "unsupported"
+    summary = extract_document(_write(tmp_path, "broken.pdf", b"%PDF-1.4 truncated"))
+    assert summary["kind"] == "pdf" and summary["error"]
+    assert "could not be read" in describe_document({"filename": "broken.pdf", **summary})
+
+
+def test_chunks_overlap_and_prefer_line_breaks():
+    text = "\n".join(f"Clause {i}: " + "x" * 80 for i in range(100))
+    chunks = chunk_text(text, size=1000, overlap=100)
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    # Cut at line breaks, so no clause is split at the end of a chunk
+    assert all(chunk.endswith("x" * 80) for chunk in chunks)
+    # Consecutive chunks share text
+    assert chunks[1][:20] in chunks[0]
+
+
+def test_pipeline_extracts_each_hash_once(tmp_path):
+    storage = Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+    store = DocumentStore(str(tmp_path / "documents"))
+    content = COSTS_CSV.encode("utf-8")
+    sha256 = hashlib.sha256(content).hexdigest()
+    os.makedirs(os.path.dirname(store.path(sha256)))
+    with open(store.path(sha256), "wb") as blob:
+        blob.write(content)
+    storage.store_documents([{"sha256": sha256, "size": len(content), "filename": "costs.csv",
+                              "content_type": "text/csv"}])
+    pipeline = DocumentPipeline(storage, store, workers=1)
+
+    async def run():
+        try:
+            first = await pipeline.summaries([{"sha256": sha256}, {"sha256": sha256}])
+            again = await pipeline.summaries([{"sha256": sha256}])
+        finally:
+            await pipeline.stop()
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first[0] == first[1] == again[0]
+    assert first[0]["filename"] == "costs.csv" and first[0]["rows"] == 3
+    assert pipeline.stats["extracted"] == 1
+    assert pipeline.stats["coalesced"] == 1
+    assert pipeline.stats["cache_hits"] == 1
+    assert storage.get_documents([sha256])[sha256]["extraction"]["column_totals"] == {"amount": 1950.5}
+    assert len(pipeline.chunks(sha256)) == 1
@@ -0,0 +1,74 @@
+"""Reporting and request scheduling of the HTTP benchmark harness"""
+
+import asyncio
+
+import pytest
+
+from benchmarks import common, http_bench
+
+
+def test_percentile_interpolates_between_samples():
+    values = [1.0, 2.0, 3.0, 4.0]
+    assert common.percentile(values, 50) == 2.5
+    assert common.percentile(values, 100) == 4.0
+    assert common.percentile([7.0], 99) == 7.0
+    assert common.percentile([], 50) == 0.0
+
+
+def test_summary_counts_errors_but_not_their_latency():
+    summary = common.summarize_latencies([0.003, 0.001, 0.002], errors=2, elapsed=0.5)
+    assert summary["requests"] == 5
+    assert summary["errors"] == 2
+    assert summary["throughput_rps"] == 6.0
+    assert summary["p50_ms"] == 2.0
+    assert summary["mean_ms"] == 2.0
+
+
+def test_baseline_comparison_flags_only_regressions_past_threshold():
+    baseline = {
+        "get@1000x1": {"p95_ms": 10.0, "throughput_rps": 100.0},
+        "list@1000x1": {"p95_ms": 10.0, "throughput_rps": 100.0},
+    }
+    results = {
+        "get@1000x1": {"p95_ms": 11.0, "throughput_rps": 95.0},
+        "list@1000x1": {"p95_ms": 12.0, "throughput_rps": 80.0},
+        "create@1000x1": {"p95_ms": 99.0, "throughput_rps": 1.0},
+    }
+    regressions = common.compare_to_baseline(
+        results, baseline, 0.15, lower_is_better=["p95_ms"], higher_is_better=["throughput_rps"])
+    assert {(r["case"], r["metric"]) for r in regressions} == {
+        ("list@1000x1", "p95_ms"), ("list@1000x1", "throughput_rps")}
+
+
+def test_scenario_spreads_requests_over_workers_and_counts_failures():
+    issued = []
+    active = [0, 0]
+
+    async def request(client, index):
+        issued.append(index)
+        active[0] += 1
+        active[1] = max(active[1], active[0])
+        await asyncio.sleep(0.001)
+        active[0] -= 1
+        if index % 4 == 0:
+            raise RuntimeError("server error")
+
+    summary = asyncio.run(http_bench.run_scenario(None, request, total=20, concurrency=4))
+    assert sorted(issued) == list(range(20))
+    assert active[1] == 4
+    assert summary["requests"] == 20
+    assert summary["errors"] == 5
+
+
+def test_unknown_scenario_is_rejected():
+    with pytest.raises(SystemExit):
+        http_bench.parse_args(["--scenarios", "create,delete"])
+    assert http_bench.parse_args(["--sizes", "10,20", "--concurrency", "2"]).sizes == [10, 20]
+
+
+def test_storage_uses_database_url_from_environment(tmp_path, monkeypatch):
+    from storage import Storage
+    monkeypatch.setenv("LEASE_EXIT_DATABASE_URL", f"sqlite:///{tmp_path / 'bench.db'}")
+    storage = Storage(archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+    storage.create_workflow({"property_name": "Bench"})
+    assert (tmp_path / "bench.db").exists()
@@ -0,0 +1,88 @@
+"""Idempotency-Key handling on the create and form endpoints"""
+
+import threading
+import uuid
+
+import pytest
+
+CREATE_URL = "/api/workflow/lease-exit/create"
+CREATE_BODY = {
+    "propertyName": "Idempotent Plaza",
+    "leaseId": "L-200",
+    "leaseEndDate": "2027-06-30",
+    "exitReason": "Consolidation",
+    "submittedBy": "tester"
+}
+
+
+@pytest.fixture
+def slow_crew(app_module):
+    """Make crew runs take long enough for a second request to arrive mid-run"""
+    from benchmarks.stubs import install_llm_stub
+    install_llm_stub(app_module, latency=0.5)
+    yield
+    install_llm_stub(app_module)
+
+
+def test_repeat_create_replays_stored_response(client, app_module):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    executed = app_module.idempotency.stats["executed"]
+
+    first = client.post(CREATE_URL, json=CREATE_BODY, headers=headers)
+    assert first.status_code == 201, first.text
+    assert "idempotent-replayed" not in first.headers
+
+    second = client.post(CREATE_URL, json=CREATE_BODY, headers=headers)
+    assert second.status_code == 201
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json()["workflow_id"] == first.json()["workflow_id"]
+    assert app_module.idempotency.stats["executed"] == executed + 1
+
+
+def test_repeat_during_run_attaches_to_it(client, app_module, slow_crew):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    attached = app_module.idempotency.stats["attached"]
+    responses = {}
+
+    def post(name):
+        responses[name] = client.post(CREATE_URL, json=CREATE_BODY, headers=headers)
+
+    leader = threading.Thread(target=post, args=("leader",))
+    leader.start()
+    # The leader is inside the 0.5s crew run by the time the follower arrives
+    threading.Timer(0.2, post, args=("follower",)).run()
+    leader.join()
+
+    assert responses["leader"].status_code == 201, responses["leader"].text
+    assert responses["follower"].status_code == 201, responses["follower"].text
+    assert responses["follower"].headers["idempotent-replayed"] == "true"
+    assert responses["follower"].json()["workflow_id"] == responses["leader"].json()["workflow_id"]
+    assert app_module.idempotency.stats["attached"] == attached + 1
+
+
+def test_reused_create_key_with_different_body_is_rejected(client):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    assert client.post(CREATE_URL, json=CREATE_BODY, headers=headers).status_code == 201
+
+    response = client.post(CREATE_URL, json={**CREATE_BODY, "leaseId": "L-201"}, headers=headers)
+    assert response.status_code == 422
+    assert "different request" in response.json()["detail"]
+
+
+def test_form_key_is_scoped_and_checked_per_workflow(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    url = f"/api/workflow/lease-exit/{workflow_id}/form"
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    form = {"formType": "lease_requirements", "submittedBy": "tester", "cost_estimate": 1000.0,
+            "requirements_list": ["remove signage"]}
+
+    first = client.post(url, json=form, headers=headers)
+    assert first.status_code == 200, first.text
+    replayed = client.post(url, json=form, headers=headers)
+    assert replayed.headers["idempotent-replayed"] == "true"
+    assert replayed.json() == first.json()
+    forms = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress").json()["forms"]
+    assert [f["form_type"] for f in forms].count("lease_requirements") == 1
+
+    changed = client.post(url, json={**form, "cost_estimate": 2000.0}, headers=headers)
+    assert changed.status_code == 422
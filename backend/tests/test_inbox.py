@@ -0,0 +1,86 @@
+"""Recipient inbox, keyset pagination and unread counters"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from archive import Archiver
+from storage import Storage, User, Role
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+    with Session(storage.engine) as session:
+        legal, ifm = Role(id="role_legal", name="legal"), Role(id="role_ifm", name="ifm")
+        session.add_all([
+            User(id="ana", email="ana@example.com", roles=[legal]),
+            User(id="ben", email="ben@example.com", roles=[legal]),
+            User(id="cho", email="cho@example.com", roles=[ifm]),
+        ])
+        session.commit()
+    return storage
+
+
+def _notify(storage, recipients, **data):
+    return storage.store_notification({"workflow_id": "wf_1", "type": "status_update",
+                                       "recipients": recipients, "data": data})
+
+
+def test_roles_are_resolved_to_user_inboxes(storage):
+    shared = _notify(storage, ["legal"])
+    direct = _notify(storage, ["ifm"])
+    for user_id in ("ana", "ben"):
+        inbox = storage.get_inbox(user_id)
+        assert [item["id"] for item in inbox["items"]] == [shared]
+        assert inbox["items"][0]["role"] == "legal"
+        assert storage.get_unread_count(user_id) == {"unread": 1, "total": 1}
+    assert [item["id"] for item in storage.get_inbox("cho")["items"]] == [direct]
+
+
+def test_pages_follow_the_cursor_newest_first(storage):
+    ids = [_notify(storage, ["ifm"], n=i) for i in range(5)]
+    seen, cursor = [], None
+    for expected_size in (2, 2, 1):
+        page = storage.get_inbox("cho", limit=2, cursor=cursor)
+        assert len(page["items"]) == expected_size
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+    assert cursor is None
+    assert seen == ids[::-1]
+
+    with pytest.raises(ValueError):
+        storage.get_inbox("cho", cursor="not-a-cursor")
+
+
+def test_marking_read_updates_the_counters(storage):
+    ids = [_notify(storage, ["ifm"]) for _ in range(3)]
+    assert storage.mark_read("cho", [ids[0]]) == 1
+    assert storage.mark_read("cho", [ids[0]]) == 0
+    assert storage.get_unread_count("cho") == {"unread": 2, "total": 3}
+    assert [item["id"] for item in storage.get_inbox("cho", unread_only=True)["items"]] == ids[:0:-1]
+
+    assert storage.mark_read("cho") == 2
+    assert storage.get_unread_count("cho") == {"unread": 0, "total": 3}
+
+
+def test_archived_notifications_leave_the_inbox(storage):
+    read, unread = _notify(storage, ["ifm"]), _notify(storage, ["ifm"])
+    storage.mark_read("cho", [read])
+    for notification_id in (read, unread):
+        storage.update_notification(notification_id, "sent")
+
+    moved = Archiver(storage, notification_age_days=0).archive_notifications(now=datetime.now() + timedelta(days=1))
+    assert moved == 2
+    assert storage.get_inbox("cho")["items"] == []
+    assert storage.get_unread_count("cho") == {"unread": 0, "total": 0}
+
+
+def test_inbox_endpoints(client):
+    assert client.get("/api/inbox/nobody", params={"limit": 0}).status_code == 400
+    assert client.get("/api/inbox/nobody", params={"cursor": "bad"}).status_code == 400
+    assert client.get("/api/inbox/nobody").json() == {"items": [], "next_cursor": None, "unread": 0, "total": 0}
+    assert client.get("/api/inbox/nobody/unread").json() == {"unread": 0, "total": 0}
+    response = client.post("/api/inbox/nobody/read", json={"notification_ids": ["notif_missing"]})
+    assert response.json() == {"marked_read": 0, "unread": 0, "total": 0}
@@ -0,0 +1,88 @@
+"""The shared JSON codec for responses, SSE events and JSON columns"""
+
+import asyncio
+import importlib.util
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from pydantic import BaseModel
+
+import jsoncodec
+
+
+class Summary(BaseModel):
+    status: str
+    total: int
+
+
+PAYLOAD = {
+    "when": datetime(2027, 6, 30, 12, 0),
+    "day": date(2027, 6, 30),
+    "cost": Decimal("125000.50"),
+    "roles": ("legal",),
+    "summary": Summary(status="ok", total=3),
+    "name": "Tõwer",
+}
+EXPECTED = {
+    "when": "2027-06-30T12:00:00",
+    "day": "2027-06-30",
+    "cost": 125000.5,
+    "roles": ["legal"],
+    "summary": {"status": "ok", "total": 3},
+    "name": "Tõwer",
+}
+
+
+def _stdlib_codec(monkeypatch):
+    """A separate copy of the module loaded with JSON_CODEC=json"""
+    monkeypatch.setenv("JSON_CODEC", "json")
+    spec = importlib.util.spec_from_file_location("jsoncodec_stdlib", jsoncodec.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_payload_types_round_trip():
+    assert jsoncodec.loads(jsoncodec.dumps(PAYLOAD)) == EXPECTED
+    assert jsoncodec.loads(jsoncodec.dumps_bytes(PAYLOAD)) == EXPECTED
+
+
+def test_stdlib_backend_encodes_the_same(monkeypatch):
+    codec = _stdlib_codec(monkeypatch)
+    assert codec.BACKEND == "json"
+    assert json.loads(codec.dumps(PAYLOAD)) == EXPECTED
+    assert codec.dumps(PAYLOAD) == jsoncodec.dumps(PAYLOAD)
+
+
+def test_integers_wider_than_64_bits_fall_back():
+    assert jsoncodec.loads(jsoncodec.dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        jsoncodec.dumps({"value": object()})
+
+
+def test_json_columns_use_the_codec(tmp_path):
+    from storage import Storage
+    storage = Storage(f"sqlite:///{tmp_path / 'codec.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+    workflow_id = storage.create_workflow({"property_name": "Codec", "cost": Decimal("10.25"),
+                                           "due": date(2027, 1, 31)})
+    data = storage.get_workflow(workflow_id)["data"]
+    assert data["cost"] == 10.25
+    assert data["due"] == "2027-01-31"
+
+
+def test_workflow_update_is_encoded_once_for_every_subscriber(app_module):
+    queues = [asyncio.Queue(), asyncio.Queue()]
+    app_module.workflow_clients["wf_codec"] = queues
+    try:
+        asyncio.run(app_module.send_workflow_update("wf_codec", {"cost": Decimal("1.5")}))
+    finally:
+        del app_module.workflow_clients["wf_codec"]
+    first, second = (queue.get_nowait() for queue in queues)
+    assert first is second
+    event = json.loads(first)
+    assert event["type"] == "workflow_update" and event["data"] == {"cost": 1.5}
@@ -0,0 +1,42 @@
+"""
+resilient_llm overrides private crewai hooks; these tests fail when a crewai
+upgrade moves them, instead of the overrides silently doing nothing.
+"""
+
+import asyncio
+
+import pytest
+
+import llm_client
+from llm_resilience import ResilientCaller, resilient_llm
+
+MODEL = "anthropic/claude-3-haiku-20240307"
+
+
+@pytest.fixture
+def llm():
+    return resilient_llm(ResilientCaller("hooks_test"), model=MODEL, api_key="test-key")
+
+
+def test_crewai_rate_limit_retry_is_bypassed(llm):
+    native = type(llm).__mro__[1]
+    for name in ("call", "acall"):
+        # crewai wraps the native methods in its retry; ours must be called instead, unwrapped
+        assert hasattr(getattr(native, name), "__wrapped__"), f"crewai no longer wraps {name}"
+        assert not hasattr(getattr(type(llm), name), "__wrapped__"), f"crewai wrapped the resilient {name}"
+
+
+def test_anthropic_clients_come_from_the_shared_pool(llm):
+    native = type(llm).__mro__[1]
+    for hook in ("_get_sync_client", "_get_async_client"):
+        assert hook in vars(native), f"crewai's Anthropic LLM no longer defines {hook}"
+    timeout = ResilientCaller("hooks_test").policy.timeout
+    # Clients share the pool's HTTP client; with_options makes a new wrapper per call
+    assert llm._get_sync_client()._client is llm_client.sync_client(timeout, "test-key")._client
+
+    async def pooled():
+        try:
+            return llm._get_async_client()._client is llm_client.async_client(timeout, "test-key")._client
+        finally:
+            await llm_client.close_async_clients()
+    assert asyncio.run(pooled())
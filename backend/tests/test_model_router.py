@@ -0,0 +1,125 @@
+"""Per-task model tiers, health-based skipping and escalation"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from agents.model_router import ModelRouter, ModelStats, load_model_config
+from agents.schemas import WorkflowCreationOutput
+
+FAST, STANDARD = "anthropic/claude-3-haiku-20240307", "anthropic/claude-3-sonnet-20240229"
+
+
+@pytest.fixture
+def router():
+    config = load_model_config()
+    config["routing"] = {"window": 10, "min_samples": 4, "min_success_rate": 0.6, "probe_every": 3}
+    return ModelRouter(config)
+
+
+def test_unknown_tiers_are_rejected(tmp_path):
+    path = tmp_path / "models.json"
+    path.write_text(json.dumps({"models": {"fast": {"model": "m"}},
+                                "tasks": {"process_form": {"tiers": ["fast", "huge"]}}}))
+    with pytest.raises(ValueError, match="huge"):
+        load_model_config(str(path))
+    path.write_text(json.dumps({"models": {"fast": {"model": "m"}}, "agents": {"form": "tiny"}}))
+    with pytest.raises(ValueError, match="tiny"):
+        load_model_config(str(path))
+
+
+def test_tasks_and_agents_use_their_configured_tiers(router):
+    assert router.route("process_form") == ["fast", "standard"]
+    assert router.route("no_such_operation") == [None]
+    assert router.agent_tier("form") == "fast"
+    # An agent without a tier gets the first one configured
+    assert router.agent_tier("unlisted") == "fast"
+
+
+def test_unhealthy_tier_is_skipped_but_probed(router):
+    for _ in range(4):
+        router.record("fast", 0.1, ok=False)
+    routes = [router.route("process_form") for _ in range(6)]
+    assert routes == [["standard"], ["standard"], ["fast", "standard"]] * 2
+
+    # The last tier is kept however it is doing
+    for _ in range(4):
+        router.record("standard", 0.1, ok=False)
+    assert router.route("send_notifications") == ["standard"]
+
+    # Successes push the tier back over the threshold
+    for _ in range(10):
+        router.record("fast", 0.1, ok=True)
+    assert router.route("process_form") == ["fast", "standard"]
+
+
+def test_escalation_reasons(router):
+    ok = json.dumps({"status": "success", "confidence": 0.9})
+    unsure = json.dumps({"status": "success", "confidence": 0.3})
+    assert router.escalation_reason("create_workflow", ok, WorkflowCreationOutput) is None
+    assert router.escalation_reason("create_workflow", unsure, WorkflowCreationOutput) == "low confidence (0.3 < 0.5)"
+    # Tasks without a threshold accept any confidence
+    assert router.escalation_reason("send_notifications", unsure) is None
+    assert router.escalation_reason("create_workflow", "I could not do it", WorkflowCreationOutput).startswith(
+        "parse failure")
+
+
+def test_stats_snapshot():
+    stats = ModelStats(window=3)
+    for latency, ok in [(1.0, True), (2.0, False), (3.0, True), (4.0, True)]:
+        stats.record("m", latency, ok, escalated=not ok)
+    snapshot = stats.snapshot()["m"]
+    assert snapshot["calls"] == 4 and snapshot["failures"] == 1 and snapshot["escalations"] == 1
+    assert snapshot["success_rate"] == 0.75
+    assert snapshot["avg_latency_seconds"] == 2.5
+    # Percentiles cover the recent window only
+    assert snapshot["p95_latency_seconds"] == 3.0
+    assert stats.recent_success_rate("m", min_samples=3) == pytest.approx(2 / 3)
+    assert stats.recent_success_rate("m", min_samples=4) is None
+
+
+class TierCrew:
+    """Crew stand-in whose output depends on the tier it was built for"""
+
+    def __init__(self, outputs, tier):
+        self.agents, self.tasks = [], []
+        self.output = outputs[tier]
+
+    async def akickoff(self):
+        if isinstance(self.output, Exception):
+            raise self.output
+        return SimpleNamespace(raw=json.dumps(self.output))
+
+
+def _run(app_module, monkeypatch, router, outputs, operation="create_workflow"):
+    crew = app_module.lease_exit_crew
+    monkeypatch.setattr(crew, "router", router)
+    monkeypatch.setattr(crew, "crew", lambda tier=None: TierCrew(outputs, tier))
+    return asyncio.run(crew._run_routed([], operation, WorkflowCreationOutput))
+
+
+def test_weak_or_failed_runs_escalate(app_module, monkeypatch, router):
+    result = _run(app_module, monkeypatch, router, {
+        "standard": {"status": "success", "confidence": 0.2},
+        "large": {"status": "success", "confidence": 0.9}})
+    assert json.loads(result.raw)["confidence"] == 0.9
+    snapshot = router.stats.snapshot()
+    assert snapshot[STANDARD]["escalations"] == 1 and snapshot[STANDARD]["failures"] == 1
+    assert snapshot["anthropic/claude-3-opus-20240229"]["successes"] == 1
+
+    result = _run(app_module, monkeypatch, router, {
+        "fast": RuntimeError("overloaded"), "standard": {"status": "success", "valid": True}},
+        operation="process_form")
+    assert json.loads(result.raw)["valid"] is True
+    assert router.stats.snapshot()[FAST]["escalations"] == 1
+
+
+def test_last_tier_result_is_returned_or_raised(app_module, monkeypatch, router):
+    result = _run(app_module, monkeypatch, router, {
+        "standard": {"status": "success", "confidence": 0.1},
+        "large": {"status": "success", "confidence": 0.2}})
+    assert json.loads(result.raw)["confidence"] == 0.2
+    with pytest.raises(RuntimeError):
+        _run(app_module, monkeypatch, router, {"standard": RuntimeError("down"), "large": RuntimeError("down")})
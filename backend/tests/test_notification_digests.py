@@ -0,0 +1,103 @@
+"""Coalescing of bursty notifications into per-recipient digests"""
+
+import pytest
+
+from notifications import NotificationCoalescer
+from storage import Storage
+
+
+class RecordingStorage:
+    """Keeps written notifications; fails the next ``failures`` writes"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.written = []
+
+    def store_notifications(self, notifications):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        self.written.extend(notifications)
+        return [f"notif_{len(self.written) - i}" for i in range(len(notifications))]
+
+
+def _event(workflow_id, recipients=("legal", "ifm"), notification_type="form_submission"):
+    return {"workflow_id": workflow_id, "type": notification_type, "recipients": list(recipients),
+            "data": {"form_type": "lease_requirements", "timestamp": "2027-01-01T09:00:00"}}
+
+
+def test_burst_becomes_one_digest_per_recipient():
+    storage = RecordingStorage()
+    flushed = []
+    coalescer = NotificationCoalescer(storage, window_seconds=60, on_flush=lambda: flushed.append(1))
+    for i in range(50):
+        assert coalescer.add(_event(f"wf_{i:02d}")) == "digest:form_submission"
+    assert storage.written == [] and coalescer.pending() == 100
+
+    coalescer.flush(force=True)
+    assert sorted(n["recipients"][0] for n in storage.written) == ["ifm", "legal"]
+    digest = storage.written[0]
+    assert digest["digest"] and digest["count"] == 50
+    assert digest["workflow_ids"] == [f"wf_{i:02d}" for i in range(50)]
+    assert digest["events"][0] == ["wf_00", "2027-01-01T09:00:00", "lease_requirements"]
+    assert flushed == [1]
+    assert coalescer.snapshot()["write_reduction"] == 25.0
+
+
+def test_single_event_stays_a_plain_notification():
+    storage = RecordingStorage()
+    coalescer = NotificationCoalescer(storage)
+    coalescer.add(_event("wf_1", recipients=["legal"]))
+    coalescer.flush(force=True)
+    [notification] = storage.written
+    assert "digest" not in notification
+    assert notification["workflow_id"] == "wf_1" and notification["recipients"] == ["legal"]
+    assert notification["idempotency_key"].startswith("digest:legal:form_submission:")
+
+
+def test_other_types_and_unaddressed_notifications_pass_through():
+    coalescer = NotificationCoalescer(RecordingStorage())
+    assert coalescer.add(_event("wf_1", notification_type="workflow_completed")) is None
+    assert coalescer.add(_event("wf_1", recipients=[])) is None
+    assert coalescer.pending() == 0
+
+
+def test_group_is_written_when_full_or_window_closed():
+    storage = RecordingStorage()
+    coalescer = NotificationCoalescer(storage, window_seconds=60, max_events=3)
+    for i in range(3):
+        coalescer.add(_event(f"wf_{i}", recipients=["legal"]))
+    assert [n["count"] for n in storage.written] == [3]
+
+    coalescer.add(_event("wf_9", recipients=["legal"]))
+    assert coalescer.flush() == []
+    coalescer.window_seconds = 0
+    assert len(coalescer.flush()) == 1
+
+
+def test_failed_flush_is_retried_under_the_same_key():
+    storage = RecordingStorage(failures=1)
+    coalescer = NotificationCoalescer(storage)
+    coalescer.add(_event("wf_1", recipients=["legal"]))
+    coalescer.add(_event("wf_2", recipients=["legal"]))
+    with pytest.raises(RuntimeError):
+        coalescer.flush(force=True)
+    coalescer.add(_event("wf_3", recipients=["legal"]))
+    assert coalescer.pending() == 3
+
+    coalescer.flush(force=True)
+    [digest] = storage.written
+    assert digest["count"] == 3
+    assert coalescer.pending() == 0
+
+
+def test_digest_is_stored_once_per_key(tmp_path):
+    storage = Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+    coalescer = NotificationCoalescer(storage)
+    for i in range(3):
+        coalescer.add(_event(f"wf_{i}", recipients=["legal"]))
+    [notification_id] = coalescer.flush(force=True)
+    stored = storage.get_notification(notification_id)
+    assert stored["data"]["count"] == 3 and stored["status"] == "pending"
+    # A retried write of the same digest finds the row instead of adding one
+    assert storage.store_notifications([stored["data"]]) == [notification_id]
@@ -0,0 +1,118 @@
+"""Notification outbox: enqueueing with workflow changes and background delivery"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from notifications import NotificationDispatcher
+from notifications.channels import DeliveryError
+from storage import Storage, VersionConflictError
+
+
+class ScriptedChannel:
+    """Fails each send with the next scripted error, then delivers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send(self, notification):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(notification)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+
+
+def _make_due(storage, notification_id):
+    storage.record_deliveries([{"id": notification_id, "status": "pending", "next_attempt_at": datetime.now()}])
+
+
+def _notify(storage, key=None):
+    workflow_id = storage.create_workflow({"property_name": "Outbox Tower"})
+    return storage.store_notification({"workflow_id": workflow_id, "type": "status_update",
+                                       "recipients": ["legal"], "idempotency_key": key})
+
+
+def test_transient_failure_is_retried_then_sent(storage):
+    notification_id = _notify(storage)
+    channel = ScriptedChannel(DeliveryError("connection reset"))
+    dispatcher = NotificationDispatcher(storage, channel, base_delay=60)
+
+    assert asyncio.run(dispatcher.run_once()) == 1
+    notification = storage.get_notification(notification_id)
+    assert notification["status"] == "pending"
+    assert notification["attempts"] == 1
+    assert notification["last_error"] == "connection reset"
+    # Backed off: not due again yet
+    assert asyncio.run(dispatcher.run_once()) == 0
+
+    _make_due(storage, notification_id)
+    assert asyncio.run(dispatcher.run_once()) == 1
+    notification = storage.get_notification(notification_id)
+    assert notification["status"] == "sent" and notification["sent_at"]
+    assert channel.sent[0]["idempotency_key"] == notification_id
+    assert dispatcher.stats["retried"] == 1 and dispatcher.stats["sent"] == 1
+
+
+def test_permanent_error_and_exhausted_attempts_fail(storage):
+    permanent = _notify(storage)
+    dispatcher = NotificationDispatcher(storage, ScriptedChannel(DeliveryError("410 Gone", permanent=True)))
+    asyncio.run(dispatcher.run_once())
+    assert storage.get_notification(permanent)["status"] == "failed"
+
+    exhausted = _notify(storage)
+    dispatcher = NotificationDispatcher(storage, ScriptedChannel(RuntimeError("a"), RuntimeError("b")),
+                                        max_attempts=2)
+    asyncio.run(dispatcher.run_once())
+    _make_due(storage, exhausted)
+    asyncio.run(dispatcher.run_once())
+    notification = storage.get_notification(exhausted)
+    assert notification["status"] == "failed"
+    assert notification["attempts"] == 2
+
+
+def test_claimed_notifications_are_leased(storage):
+    _notify(storage)
+    assert len(storage.claim_notifications(10, lease_seconds=60)) == 1
+    assert storage.claim_notifications(10) == []
+
+    # A claim whose lease ran out (its process died mid-delivery) can be claimed again
+    other = _notify(storage)
+    assert [n["id"] for n in storage.claim_notifications(10, lease_seconds=-1)] == [other]
+    reclaimed = storage.claim_notifications(10)
+    assert [n["id"] for n in reclaimed] == [other]
+    assert reclaimed[0]["attempts"] == 2
+
+
+def test_repeated_idempotency_key_enqueues_once(storage):
+    first = _notify(storage, key="wf-1:v2:legal")
+    assert storage.store_notification({"type": "status_update", "idempotency_key": "wf-1:v2:legal"}) == first
+
+
+def test_rejected_transition_enqueues_nothing(storage):
+    workflow_id = storage.create_workflow({"property_name": "Outbox Tower"})
+    version = storage.get_workflow(workflow_id)["version"]
+    with pytest.raises(VersionConflictError):
+        storage.transition_workflow(workflow_id, {"current_step": "advisory_review"},
+                                    notifications=[{"workflow_id": workflow_id, "recipients": ["legal"]}],
+                                    expected_version=version + 1)
+    assert storage.claim_notifications(10) == []
+    assert storage.get_workflow_progress(workflow_id)["current_step"] != "advisory_review"
+
+
+def test_stop_returns_while_waiting_for_work(storage):
+    async def run():
+        dispatcher = NotificationDispatcher(storage, ScriptedChannel(), poll_interval=30)
+        dispatcher.start()
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(dispatcher.stop(), 1)
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+"""Schema fitting of crew output"""
+
+from agents.output_parser import parse_crew_output
+from agents.schemas import FormProcessingOutput
+
+
+def test_misnamed_and_mistyped_fields_are_repaired():
+    parsed = parse_crew_output('{"Status": "success", "valid": "yes", "errors": "a, b"}', FormProcessingOutput)
+    assert parsed["ok"]
+    assert parsed["data"]["valid"] is True
+    assert parsed["data"]["errors"] == ["a", "b"]
+    assert "renamed:Status->status" in parsed["repairs"]
+
+
+def test_missing_required_field_fails_the_parse():
+    # No verdict in the output: the crew must be escalated or the output repaired, not assumed valid or invalid
+    parsed = parse_crew_output('Done.\n```json\n{"status": "success", "summary": "ok"}\n```', FormProcessingOutput)
+    assert not parsed["ok"]
+
+
+def test_null_required_field_fails_the_parse():
+    assert not parse_crew_output('{"status": "success", "valid": null}', FormProcessingOutput)["ok"]
+
+
+def test_unhashable_python_literal_is_a_parse_failure():
+    # literal_eval raises TypeError for a list used as a dict key
+    parsed = parse_crew_output('{[1]: 2}', FormProcessingOutput)
+    assert not parsed["ok"]
@@ -0,0 +1,16 @@
+"""Profile file naming"""
+
+import os
+
+from logging_setup import request_context
+from profiling import _Capture
+
+
+def test_client_request_id_cannot_escape_the_profile_directory():
+    token = request_context.set({"request_id": "../../etc/cron.d/x y", "route": "GET /"})
+    try:
+        capture = _Capture(None, None, "requested")
+    finally:
+        request_context.reset(token)
+    assert capture.request_id == "______etc_cron_d_x_y"
+    assert os.path.basename(capture.request_id) == capture.request_id
@@ -0,0 +1,75 @@
+"""Workflow.data keys promoted to indexed columns, and search over them"""
+
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import migrations
+from storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path / 'hot.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+
+
+def _workflow(storage, name, end, **fields):
+    return storage.create_workflow({"property_name": name, "property_type": "Office", "lease_end_date": end,
+                                    "exit_reason": "Consolidation", "state": "in_progress", **fields})
+
+
+def test_columns_follow_the_json_document(storage):
+    workflow_id = _workflow(storage, "North", "2027-03-31T00:00:00", lease_id="L-1")
+    [row] = storage.search_workflows()
+    assert row["id"] == workflow_id
+    assert row["lease_end_date"] == "2027-03-31"
+    assert row["lease_id"] == "L-1"
+    assert row["workflow_type"] == "lease_exit"
+
+    _workflow(storage, "Unknown", "sometime next year")
+    assert [r["property_name"] for r in storage.search_workflows(lease_end_from=date(2000, 1, 1))] == ["North"]
+
+
+def test_search_filters_and_orders_by_lease_end(storage):
+    _workflow(storage, "Late", "2027-12-31")
+    _workflow(storage, "Early", "2027-01-31")
+    _workflow(storage, "Middle", "2027-06-30", property_type="Retail")
+    _workflow(storage, "Outside", "2029-01-01")
+
+    in_range = storage.search_workflows(date(2027, 1, 1), date(2027, 12, 31))
+    assert [r["property_name"] for r in in_range] == ["Early", "Middle", "Late"]
+    assert [r["property_name"] for r in storage.search_workflows(property_type="Retail")] == ["Middle"]
+    assert len(storage.search_workflows(limit=2)) == 2
+
+
+def test_migration_backfills_rows_written_before_promotion(storage):
+    _workflow(storage, "Legacy", "2027-05-01", lease_id="L-9")
+    _workflow(storage, "Undated", "n/a")
+    with storage.engine.begin() as connection:
+        connection.execute(text("UPDATE workflows SET property_name = NULL, property_type = NULL, "
+                                "lease_end_date = NULL, exit_reason = NULL, lease_id = NULL, workflow_type = NULL"))
+        migrations._backfill_promoted_workflow_fields(connection)
+    rows = {r["property_name"]: r for r in storage.search_workflows()}
+    assert rows["Legacy"]["lease_end_date"] == "2027-05-01"
+    assert rows["Legacy"]["lease_id"] == "L-9"
+    assert rows["Legacy"]["exit_reason"] == "Consolidation"
+    assert rows["Legacy"]["workflow_type"] == "lease_exit"
+    assert rows["Undated"]["lease_end_date"] is None
+
+
+def test_search_endpoint(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    response = client.get("/api/workflow/lease-exit/search",
+                          params={"lease_end_from": "2027-06-30", "lease_end_to": "2027-06-30", "limit": 1000})
+    assert response.status_code == 200, response.text
+    match = next(r for r in response.json() if r["id"] == workflow_id)
+    assert match["lease_id"] == "L-100" and match["lease_end_date"] == "2027-06-30"
+
+    response = client.get("/api/workflow/lease-exit/search", params={"ending_within_days": 90})
+    assert response.status_code == 200
+    window = (date.today().isoformat(), (date.today() + timedelta(days=90)).isoformat())
+    assert all(window[0] <= r["lease_end_date"] <= window[1] for r in response.json())
+
+    assert client.get("/api/workflow/lease-exit/search", params={"lease_end_from": "30/06/2027"}).status_code == 400
+    assert client.get("/api/workflow/lease-exit/search", params={"limit": 0}).status_code == 400
@@ -0,0 +1,61 @@
+"""N+1 detection in QueryStatsMiddleware"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from query_stats import NPlusOneError, QueryStatsMiddleware, instrument_engine, query_stats
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setattr(query_stats, "n_plus_one_mode", "raise")
+    monkeypatch.setattr(query_stats, "n_plus_one_threshold", 3)
+    engine = create_engine(f"sqlite:///{tmp_path / 'queries.db'}")
+    instrument_engine(engine)
+
+    def select(times):
+        with engine.connect() as conn:
+            for i in range(times):
+                conn.execute(text(f"SELECT {i}"))
+
+    async def repeated(request):
+        select(int(request.query_params["times"]))
+        return JSONResponse({"ok": True})
+
+    async def streamed(request):
+        def chunks():
+            yield b"first\n"
+            select(3)
+            yield b"second\n"
+        return StreamingResponse(chunks())
+
+    app = Starlette(routes=[Route("/repeated", repeated), Route("/streamed", streamed)])
+    app.add_middleware(QueryStatsMiddleware)
+    yield app
+    engine.dispose()
+
+
+def test_request_below_threshold_passes(app):
+    with TestClient(app) as client:
+        response = client.get("/repeated", params={"times": 2})
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+
+
+def test_n_plus_one_fails_before_the_response_starts(app):
+    flagged = query_stats.stats["n_plus_one"]
+    with TestClient(app) as client:
+        response = client.get("/repeated", params={"times": 3})
+    assert response.status_code == 500
+    assert "repeated 1 query 3+ times" in response.json()["detail"]
+    assert query_stats.stats["n_plus_one"] == flagged + 1
+
+
+def test_n_plus_one_in_started_stream_raises(app):
+    with TestClient(app) as client:
+        with pytest.raises(NPlusOneError):
+            client.get("/streamed")
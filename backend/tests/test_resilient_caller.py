@@ -0,0 +1,140 @@
+"""Deadlines, jittered retries and hedging in ResilientCaller"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_resilience
+from llm_resilience import CallPolicy, DeadlineExceeded, ResilientCaller, is_retryable
+
+
+class APIError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+
+def _caller(**policy):
+    return ResilientCaller("test", CallPolicy(**{"backoff_base": 0.001, "backoff_max": 0.01, **policy}))
+
+
+def _flaky(*errors, result="ok"):
+    errors = list(errors)
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn
+
+
+def test_retryable_errors():
+    assert is_retryable(TimeoutError()) and is_retryable(DeadlineExceeded())
+    assert all(is_retryable(APIError(status)) for status in (429, 500, 529))
+    assert not is_retryable(APIError(400)) and not is_retryable(ValueError())
+
+
+def test_transient_errors_are_retried():
+    caller = _caller(max_attempts=3)
+    assert caller.call(_flaky(APIError(529), APIError(503))) == "ok"
+    assert caller.stats["retries"] == 2 and caller.stats["attempts"] == 3 and caller.stats["failures"] == 0
+
+    with pytest.raises(APIError):
+        caller.call(_flaky(APIError(529), APIError(529), APIError(529)))
+    # A bad request is not worth repeating
+    with pytest.raises(APIError):
+        caller.call(_flaky(APIError(400)))
+    assert caller.stats["attempts"] == 7 and caller.stats["failures"] == 2
+
+
+def test_retry_after_is_honoured_up_to_the_cap(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_resilience.time, "sleep", delays.append)
+    caller = _caller(max_attempts=3, backoff_max=5)
+    caller.call(_flaky(APIError(429, retry_after="2"), APIError(429, retry_after="60")))
+    assert delays == [2.0, 5]
+
+
+def test_backoff_is_jittered_and_bounded(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_resilience.time, "sleep", delays.append)
+    caller = _caller(max_attempts=6, backoff_base=1, backoff_max=4)
+    caller.call(_flaky(*[APIError(503)] * 5))
+    assert all(0 <= delay <= min(4, 2 ** attempt) for attempt, delay in enumerate(delays))
+    assert len(set(delays)) > 1
+
+
+def test_attempts_past_the_deadline_are_abandoned():
+    caller = _caller(timeout=0.05, max_attempts=2)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(time.sleep, 0.5)
+    assert time.monotonic() - started < 0.4
+    assert caller.stats["timeouts"] == 2 and caller.stats["failures"] == 1
+
+    async def slow():
+        await asyncio.sleep(0.5)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(caller.acall(slow))
+    assert caller.stats["timeouts"] == 4
+
+
+def _calibrated(**policy):
+    caller = _caller(hedge=True, hedge_min_delay=0.05, hedge_budget=1.0, **policy)
+
+    async def fast():
+        return "fast"
+
+    async def calibrate():
+        for _ in range(ResilientCaller.MIN_SAMPLES):
+            await caller.acall(fast)
+    asyncio.run(calibrate())
+    assert caller.hedge_delay() == 0.05
+    return caller
+
+
+def _slow_first():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+            return "primary"
+        return "hedge"
+    return fn, calls
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    caller = _calibrated()
+    fn, calls = _slow_first()
+    started = time.monotonic()
+    assert asyncio.run(caller.acall(fn)) == "hedge"
+    assert time.monotonic() - started < 0.5
+    assert len(calls) == 2
+    assert caller.stats["hedged"] == 1 and caller.stats["hedge_wins"] == 1
+
+
+def test_hedging_respects_opt_out_and_budget():
+    caller = _calibrated(timeout=5)
+    fn, calls = _slow_first()
+    # Calls that may run tools are never duplicated
+    assert asyncio.run(caller.acall(fn, hedge=False)) == "primary"
+    assert len(calls) == 1
+
+    caller.policy.hedge_budget = 0
+    fn, calls = _slow_first()
+    assert asyncio.run(caller.acall(fn)) == "primary"
+    assert len(calls) == 1 and caller.stats["hedged"] == 0
+    assert _caller().hedge_delay() is None
+
+
+def test_tier_settings_override_the_environment(monkeypatch):
+    monkeypatch.setenv("LLM_TIMEOUT_SECONDS", "30")
+    monkeypatch.setenv("LLM_HEDGE", "1")
+    policy = CallPolicy.from_settings({"timeout_seconds": 10, "hedge": False})
+    assert policy.timeout == 10 and policy.hedge is False
+    assert CallPolicy.from_settings({}).timeout == 30 and CallPolicy.from_settings({}).hedge is True
@@ -0,0 +1,92 @@
+"""Coalescing of concurrent identical coroutine calls"""
+
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert results == [{"value": 42}] * 5
+    # Followers get their own copy
+    assert results[1] is not results[0]
+    assert flight.snapshot() == {"calls": 5, "executions": 1, "coalesced": 4, "errors": 0, "in_flight": 0}
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats["errors"] == 1
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"
+    assert len(runs) == 1
+
+
+def test_call_is_cancelled_once_every_caller_gives_up():
+    flight = SingleFlight("test")
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "done"
+
+    async def main():
+        callers = [asyncio.create_task(flight.do_async("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert cancelled == [1]
+        assert flight.snapshot()["in_flight"] == 0
+        # A new caller starts a fresh execution instead of joining the cancelled one
+        return await asyncio.wait_for(flight.do_async("key", lambda: asyncio.sleep(0, result="again")), 1)
+
+    assert asyncio.run(main()) == "again"
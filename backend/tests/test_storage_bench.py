@@ -0,0 +1,56 @@
+"""Synthetic portfolio generator and the Storage microbenchmarks"""
+
+import random
+
+import pytest
+
+from benchmarks import seed, storage_bench
+from storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path / 'bench.db'}", archive_url=f"sqlite:///{tmp_path / 'archive.db'}")
+
+
+def test_seeded_children_match_each_workflow_step(storage):
+    seeded = seed.seed_portfolio(storage, 60, seed=7)
+    assert len(seeded["workflows"]) == 60
+    for workflow_id in seeded["workflows"]:
+        progress = storage.get_workflow_progress(workflow_id)
+        reached = seed.STEPS.index(progress["current_step"])
+        expected_forms = {seed.STEP_FORMS[step] for step in seed.STEPS[:reached] if step in seed.STEP_FORMS}
+        assert {form["form_type"] for form in progress["forms"]} == expected_forms
+        approvals = progress["approvals"]
+        if reached < seed.STEPS.index("approval_chain"):
+            assert approvals == []
+        else:
+            assert sorted(a["approver_role"] for a in approvals) == sorted(seed.APPROVAL_ROLES)
+        if progress["current_step"] == "ready_for_exit":
+            assert all(a["status"] == "approved" for a in approvals)
+
+
+def test_same_seed_gives_same_portfolio(tmp_path):
+    def portfolio(name):
+        storage = Storage(f"sqlite:///{tmp_path / name}", archive_url=f"sqlite:///{tmp_path / ('a_' + name)}")
+        seeded = seed.seed_portfolio(storage, 30, seed=3, with_children=False)
+        assert seeded["forms"] == []
+        # Timestamps are relative to the time of seeding
+        return [{k: v for k, v in storage.get_workflow(w)["data"].items() if k != "created_at"}
+                for w in seeded["workflows"]]
+
+    assert portfolio("one.db") == portfolio("two.db")
+
+
+def test_bench_size_reports_every_storage_case(tmp_path):
+    args = storage_bench.parse_args(["--iterations", "3", "--full-scan-iterations", "1",
+                                     "--memory-iterations", "1", "--warmup", "1", "--skip-tools"])
+    results = storage_bench.bench_size(20, str(tmp_path), args)
+    expected = storage_bench.storage_cases(None, {"workflows": [], "forms": [], "approvals": [],
+                                                  "notifications": []}, random.Random(0))
+    assert set(results) == {f"{name}@20" for name in expected}
+    for summary in results.values():
+        assert summary["ops_per_sec"] > 0
+        assert summary["peak_kib_per_call"] >= 0
+    assert results["get_all_workflows@20"]["iterations"] == 1
+    assert results["get_workflow@20"]["iterations"] == 3
@@ -0,0 +1,46 @@
+"""End-to-end lease exit workflow through the HTTP API"""
+
+REVIEW_FORMS = [
+    ("lease_requirements", {"cost_estimate": 125000.0, "requirements_list": ["remove signage"]}),
+    ("exit_requirements_ifm", {"scope_details": {"floors": [3, 4]}, "timeline": "Q4"}),
+    ("exit_requirements_mac", {"maintenance_details": "HVAC handover", "equipment_list": ["chiller"]}),
+    ("exit_requirements_pjm", {"project_plan": {"phases": 2}, "resource_allocation": {"crew": 4}}),
+]
+
+
+def test_create_records_initial_form(client, create_workflow):
+    workflow_id = create_workflow()["workflow_id"]
+    progress = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress").json()
+    assert progress["current_step"] == "advisory_review"
+    assert [form["form_type"] for form in progress["forms"]] == ["initial_form"]
+
+
+def test_workflow_reaches_ready_for_exit(client, app_module, create_workflow):
+    created = create_workflow()
+    workflow_id = created["workflow_id"]
+    assert created["current_step"] == "advisory_review"
+
+    for form_type, fields in REVIEW_FORMS:
+        response = client.post(f"/api/workflow/lease-exit/{workflow_id}/form",
+                               json={"formType": form_type, "submittedBy": "tester", **fields})
+        assert response.status_code == 200, response.text
+
+    progress = client.get(f"/api/workflow/lease-exit/{workflow_id}/progress").json()
+    assert progress["current_step"] == "management_review"
+
+    response = client.post(f"/api/workflow/lease-exit/{workflow_id}/transition", json={"event": "review_complete"})
+    assert response.status_code == 200, response.text
+    assert response.json()["current_step"] == "approval_chain"
+    assert response.headers["etag"] == client.get(f"/api/workflow/lease-exit/{workflow_id}").headers["etag"]
+
+    # Approval decisions are recorded by the approval agent's tools; there is no HTTP endpoint for them
+    storage = app_module.storage
+    for order, role in enumerate(["advisory", "ifm", "legal", "mac", "pjm"]):
+        approval_id = storage.create_approval({"workflow_id": workflow_id, "approver_role": role, "order": order})
+        storage.update_approval(approval_id, "approved")
+    chain = client.get(f"/api/workflow/lease-exit/{workflow_id}/approvals").json()
+    assert chain["complete"], chain
+
+    response = client.post(f"/api/workflow/lease-exit/{workflow_id}/transition", json={"event": "approvals_complete"})
+    assert response.status_code == 200, response.text
+    assert response.json()["current_step"] == "ready_for_exit"
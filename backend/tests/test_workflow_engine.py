@@ -0,0 +1,38 @@
+"""Concurrent transitions of one workflow"""
+
+import pytest
+
+from storage import Storage, VersionConflictError
+from workflow_engine import WorkflowEngine
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path / 'engine.db'}")
+
+
+def test_second_transition_from_the_same_version_conflicts(storage):
+    engine = WorkflowEngine(storage)
+    workflow_id = storage.create_workflow({"property_name": "Test Tower"})
+    snapshot = storage.get_workflow_progress(workflow_id)
+
+    assert engine.fire(workflow_id, "start", progress=snapshot)["ok"]
+    # Both passed the guards on the same snapshot; only the first may move the step
+    with pytest.raises(VersionConflictError):
+        engine.fire(workflow_id, "start", progress=snapshot)
+    progress = storage.get_workflow_progress(workflow_id)
+    assert progress["current_step"] == "advisory_review"
+    assert progress["version"] == snapshot["version"] + 1
+
+
+def test_lost_transition_race_is_a_conflict(client, app_module, create_workflow, monkeypatch):
+    storage = app_module.storage
+    workflow_id = create_workflow()["workflow_id"]
+    storage.update_workflow_state(workflow_id, {"current_step": "approval_chain"})
+    snapshot = storage.get_workflow_progress(workflow_id)
+    app_module.workflow_engine.fire(workflow_id, "approval_rejected", progress=snapshot)
+
+    # The endpoint read its progress before the other transition committed
+    monkeypatch.setattr(storage, "get_workflow_progress", lambda _: snapshot)
+    response = client.post(f"/api/workflow/lease-exit/{workflow_id}/transition", json={"event": "approval_rejected"})
+    assert response.status_code == 409, response.text
@@ -2,6 +2,7 @@ from typing import Dict, Any, Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field, ConfigDict
 from backend.storage import Storage
+from backend.workflow_engine import get_state_machine
 
 class ApprovalTool(BaseTool):
     name: str = "approval_tool"
@@ -39,36 +40,8 @@ class ApprovalTool(BaseTool):
 
     def validate_approval_chain(self, workflow_id: str) -> Dict[str, Any]:
         """Validate the approval chain for a workflow"""
-        approvals = self.storage.get_workflow(workflow_id).get("approvals", [])
-        required_approvers = ["advisory", "ifm", "legal", "mac", "pjm"]
-        
-        result = {
-            "valid": True,
-            "errors": [],
-            "pending": [],
-            "approved": [],
-            "rejected": []
-        }
-
-        for approver in required_approvers:
-            found = False
-            for approval in approvals:
-                if approval.get("approver_role") == approver:
-                    found = True
-                    status = approval.get("status")
-                    if status == "pending":
-                        result["pending"].append(approver)
-                    elif status == "approved":
-                        result["approved"].append(approver)
-                    elif status == "rejected":
-                        result["rejected"].append(approver)
-                        result["valid"] = False
-                    break
-            if not found:
-                result["errors"].append(f"Missing approval from {approver}")
-                result["valid"] = False
-
-        return result
+        required_approvers = get_state_machine().approval_chain
+        return self.storage.get_approval_chain_status(workflow_id, required_approvers)
 
     async def _arun(self, *args, **kwargs):
         """Async implementation - not used"""
@@ -2,6 +2,7 @@ from typing import Dict, Any, List, Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field, ConfigDict
 from backend.storage import Storage
+from backend.workflow_engine import validate_fields
 
 class FormToolConfig(BaseModel):
     storage: Storage
@@ -44,41 +45,28 @@ class FormTool(BaseTool):
     def validate_form(self, form_type: str, form_data: Dict[str, Any], 
                      validation_rules: Dict[str, Any]) -> Dict[str, Any]:
         """Validate form data against rules"""
-        result = {
-            "valid": True,
-            "errors": []
+        errors = validate_fields(validation_rules, form_data)
+        return {
+            "valid": not errors,
+            "errors": errors
         }
 
-        # Check required fields
-        required_fields = validation_rules.get("required_fields", [])
-        for field in required_fields:
-            if field not in form_data:
-                result["valid"] = False
-                result["errors"].append(f"Missing required field: {field}")
-
-        # Check field types
-        field_types = validation_rules.get("field_types", {})
-        for field, expected_type in field_types.items():
-            if field in form_data:
-                value = form_data[field]
-                if not isinstance(value, expected_type):
-                    result["valid"] = False
-                    result["errors"].append(
-                        f"Invalid type for field {field}. Expected {expected_type.__name__}"
-                    )
-
-        return result
-
     def get_form(self, form_id: str) -> Dict[str, Any]:
         """Get form details"""
         return self.storage.get_form(form_id)
 
     def process_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Process form documents"""
-        # Document processing logic here
+        """Extracted summaries of documents uploaded via /api/documents, referenced by hash"""
+        hashes = [d.get("sha256") if isinstance(d, dict) else d for d in documents]
+        known = self.storage.get_documents([h for h in hashes if isinstance(h, str)])
         return {
-            "processed": True,
-            "document_count": len(documents)
+            "processed": all(known[h]["extraction"] for h in hashes if h in known),
+            "document_count": len(documents),
+            "documents": [
+                {"sha256": h, "filename": known[h]["filename"], **(known[h]["extraction"] or {"pending": True})}
+                for h in hashes if h in known
+            ],
+            "missing": [h for h in hashes if h not in known]
         }
 
     async def _arun(self, *args, **kwargs):
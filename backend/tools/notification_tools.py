@@ -7,11 +7,13 @@ class NotificationTool(BaseTool):
     name: str = "notification_tool"
     description: str = "Tool for managing workflow notifications"
     storage: Storage = Field(default=None)
+    coalescer: Any = Field(default=None)
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    def __init__(self, storage: Storage):
+    def __init__(self, storage: Storage, coalescer: Any = None):
         super().__init__()
         self.storage = storage
+        self.coalescer = coalescer
 
     def _run(self, action: str, **kwargs) -> Any:
         """Run the tool with the specified action"""
@@ -25,7 +27,11 @@ class NotificationTool(BaseTool):
         return actions[action](**kwargs)
 
     def send_notification(self, notification_data: Dict[str, Any]) -> str:
-        """Send a new notification"""
+        """Send a new notification, folded into a digest when a coalescer accepts it"""
+        if self.coalescer:
+            reference = self.coalescer.add(notification_data)
+            if reference:
+                return reference
         return self.storage.store_notification(notification_data)
 
     def get_notification(self, notification_id: str) -> Dict[str, Any]:
@@ -34,11 +40,7 @@ class NotificationTool(BaseTool):
 
     def update_notification(self, notification_id: str, status: str) -> bool:
         """Update notification status"""
-        notification = self.storage.get_notification(notification_id)
-        if notification:
-            notification["status"] = status
-            return True
-        return False
+        return self.storage.update_notification(notification_id, status)
 
     async def _arun(self, *args, **kwargs):
         """Async implementation - not used"""
@@ -47,9 +49,9 @@ class NotificationTool(BaseTool):
 class NotificationTools:
     """Tools for managing notifications"""
 
-    def __init__(self):
+    def __init__(self, coalescer: Any = None):
         self.storage = Storage()
-        self.tool = NotificationTool(self.storage)
+        self.tool = NotificationTool(self.storage, coalescer)
 
     def get_tools(self) -> list:
         """Get all notification tools"""
@@ -2,6 +2,7 @@ from typing import Dict, Any, Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field, ConfigDict
 from backend.storage import Storage
+from backend.workflow_engine import get_state_machine
 
 class WorkflowToolConfig(BaseModel):
     storage: Storage
@@ -60,7 +61,7 @@ class WorkflowTool(BaseTool):
 
     def validate_workflow(self, workflow_id: str) -> Dict[str, Any]:
         """Validate workflow state and requirements"""
-        workflow = self.storage.get_workflow(workflow_id)
+        workflow = self.storage.get_workflow_progress(workflow_id)
         if not workflow:
             return {"valid": False, "errors": ["Workflow not found"]}
 
@@ -69,31 +70,22 @@ class WorkflowTool(BaseTool):
             "errors": [],
             "warnings": []
         }
+        machine = get_state_machine(workflow.get("workflow_type"))
 
         # Validate required forms
-        required_forms = {
-            "initial_form": "Initial Lease Exit Form",
-            "lease_requirements": "Lease Requirements & Cost Information",
-            "exit_requirements_ifm": "IFM Exit Requirements",
-            "exit_requirements_mac": "MAC Exit Requirements",
-            "exit_requirements_pjm": "PJM Exit Requirements"
-        }
-
         submitted_forms = {form.get("form_type"): True for form in workflow.get("forms", [])}
         
-        for form_type, form_name in required_forms.items():
+        for form_type, form_name in machine.required_forms.items():
             if form_type not in submitted_forms:
                 validation_result["valid"] = False
                 validation_result["errors"].append(f"Missing required form: {form_name}")
 
         # Validate approvals if in approval state
         if workflow.get("current_step") == "approval_chain":
-            approvals = workflow.get("approvals", [])
-            required_approvers = ["advisory", "ifm", "legal", "mac", "pjm"]
+            chain = self.storage.get_approval_chain_status(workflow_id, machine.approval_chain)
             
-            for approver in required_approvers:
-                if not any(a.get("approver_role") == approver and a.get("status") == "approved" 
-                          for a in approvals):
+            for approver in machine.approval_chain:
+                if approver not in chain["approved"]:
                     validation_result["valid"] = False
                     validation_result["errors"].append(f"Missing approval from {approver.upper()}")
 
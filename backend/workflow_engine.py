@@ -0,0 +1,386 @@
+"""
+Declarative workflow state machines.
+
+Each workflow type is described once, as data: its steps, the form that
+completes each step, field rules for those forms, the approval chain and the
+transitions between steps with their guards and notification hooks. The
+description is compiled into a lookup table keyed by (step, event), so
+advancing a workflow is a dictionary lookup plus guard checks; no crew call
+is needed unless a transition is marked as requiring judgement.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKFLOW_TYPE = "lease_exit"
+# Approval statuses that count towards a role's standing in the approval chain
+APPROVAL_STATUSES = ("approved", "rejected", "pending")
+
+LEASE_EXIT_WORKFLOW = {
+    "initial_step": "initial",
+    "steps": [
+        {"name": "initial", "state": "draft", "form": "initial_form", "aliases": ["initial_form"]},
+        {"name": "advisory_review", "state": "in_progress", "form": "lease_requirements"},
+        {"name": "ifm_review", "state": "in_progress", "form": "exit_requirements_ifm"},
+        {"name": "mac_review", "state": "in_progress", "form": "exit_requirements_mac"},
+        {"name": "pjm_review", "state": "in_progress", "form": "exit_requirements_pjm"},
+        {"name": "management_review", "state": "in_progress"},
+        {"name": "approval_chain", "state": "in_progress"},
+        {"name": "ready_for_exit", "state": "in_progress"},
+        {"name": "completed", "state": "completed", "terminal": True}
+    ],
+    "forms": {
+        "initial_form": {
+            "title": "Initial Lease Exit Form",
+            "required_fields": ["lease_id", "exit_date", "reason"],
+            "field_types": {"lease_id": str, "exit_date": str, "reason": str}
+        },
+        "lease_requirements": {
+            "title": "Lease Requirements & Cost Information",
+            "required_fields": ["cost_estimate", "requirements_list"],
+            "field_types": {"cost_estimate": float, "requirements_list": list}
+        },
+        "exit_requirements_ifm": {
+            "title": "IFM Exit Requirements",
+            "required_fields": ["scope_details", "timeline"],
+            "field_types": {"scope_details": dict, "timeline": str}
+        },
+        "exit_requirements_mac": {
+            "title": "MAC Exit Requirements",
+            "required_fields": ["maintenance_details", "equipment_list"],
+            "field_types": {"maintenance_details": str, "equipment_list": list}
+        },
+        "exit_requirements_pjm": {
+            "title": "PJM Exit Requirements",
+            "required_fields": ["project_plan", "resource_allocation"],
+            "field_types": {"project_plan": dict, "resource_allocation": dict}
+        }
+    },
+    "approval_chain": ["advisory", "ifm", "legal", "mac", "pjm"],
+    "transitions": [
+        # Intake is analysed by the crew when the workflow is created
+        {"from": "initial", "event": "start", "to": "advisory_review",
+         "notify": {"type": "form_submission", "recipients": ["advisory", "ifm", "legal"]}},
+        {"from": "initial", "event": "form:initial_form", "to": "advisory_review", "guards": ["form_valid"],
+         "notify": {"type": "form_submission", "recipients": ["advisory", "ifm", "legal"]}},
+        # Cost and requirements review needs a judgement call on the submitted figures
+        {"from": "advisory_review", "event": "form:lease_requirements", "to": "ifm_review",
+         "guards": ["form_valid"], "judgement": True,
+         "notify": {"type": "form_submission", "recipients": ["legal", "ifm", "accounting"]}},
+        {"from": "ifm_review", "event": "form:exit_requirements_ifm", "to": "mac_review",
+         "guards": ["form_valid"], "notify": {"type": "form_submission", "recipients": ["mac"]}},
+        {"from": "mac_review", "event": "form:exit_requirements_mac", "to": "pjm_review",
+         "guards": ["form_valid"], "notify": {"type": "form_submission", "recipients": ["pjm"]}},
+        {"from": "pjm_review", "event": "form:exit_requirements_pjm", "to": "management_review",
+         "guards": ["form_valid"], "notify": {"type": "form_submission", "recipients": ["lease_exit_team"]}},
+        {"from": "management_review", "event": "review_complete", "to": "approval_chain",
+         "guards": ["forms_complete"], "judgement": True,
+         "notify": {"type": "approval_required", "recipients": ["advisory", "ifm", "legal", "mac", "pjm"]}},
+        {"from": "approval_chain", "event": "approvals_complete", "to": "ready_for_exit",
+         "guards": ["approvals_complete"],
+         "notify": {"type": "status_update", "recipients": ["lease_exit_team"], "status": "ready_for_exit"}},
+        {"from": "approval_chain", "event": "approval_rejected", "to": "management_review",
+         "notify": {"type": "revision_required", "recipients": ["lease_exit_team"]}},
+        {"from": "ready_for_exit", "event": "complete", "to": "completed",
+         "notify": {"type": "status_update", "recipients": ["lease_exit_team"], "status": "completed"}}
+    ]
+}
+
+WORKFLOW_DEFINITIONS = {
+    "lease_exit": LEASE_EXIT_WORKFLOW
+}
+
+
+def validate_fields(rules: Dict[str, Any], data: Dict[str, Any]) -> List[str]:
+    """Check required fields and field types; returns the list of errors"""
+    errors = []
+    for field in rules.get("required_fields", []):
+        if field not in data:
+            errors.append(f"Missing required field: {field}")
+    for field, expected_type in rules.get("field_types", {}).items():
+        if field in data and not isinstance(data[field], expected_type):
+            errors.append(f"Invalid type for field {field}. Expected {expected_type.__name__}")
+    return errors
+
+
+def _guard_form_valid(machine: "WorkflowStateMachine", progress: Dict[str, Any],
+                      context: Dict[str, Any]) -> List[str]:
+    rules = machine.forms.get(context.get("form_type"), {})
+    return validate_fields(rules, context.get("form_data") or {})
+
+
+def _guard_forms_complete(machine: "WorkflowStateMachine", progress: Dict[str, Any],
+                          context: Dict[str, Any]) -> List[str]:
+    submitted = {form.get("form_type") for form in progress.get("forms", [])}
+    return [f"Missing required form: {title}"
+            for form_type, title in machine.required_forms.items() if form_type not in submitted]
+
+
+def approval_role_statuses(approvals: List[Tuple[str, str, Any]]) -> Dict[str, str]:
+    """Where each approver role stands: the status of its most recently updated approval.
+
+    ``approvals`` are (role, status, updated_at) triples. Both the
+    approvals_complete guard and Storage's approval chain queries use this,
+    so they agree on whether a role has approved.
+    """
+    latest: Dict[str, Tuple[Any, str]] = {}
+    for role, status, updated_at in approvals:
+        if updated_at is None or status not in APPROVAL_STATUSES:
+            continue
+        if role not in latest or (updated_at, status) > latest[role]:
+            latest[role] = (updated_at, status)
+    return {role: status for role, (_, status) in latest.items()}
+
+
+def _guard_approvals_complete(machine: "WorkflowStateMachine", progress: Dict[str, Any],
+                              context: Dict[str, Any]) -> List[str]:
+    statuses = approval_role_statuses([
+        (a.get("approver_role"), a.get("status"), a.get("updated_at") and datetime.fromisoformat(a["updated_at"]))
+        for a in progress.get("approvals", [])
+    ])
+    return [f"Missing approval from {role.upper()}" for role in machine.approval_chain
+            if statuses.get(role) != "approved"]
+
+
+GUARDS: Dict[str, Callable[["WorkflowStateMachine", Dict[str, Any], Dict[str, Any]], List[str]]] = {
+    "form_valid": _guard_form_valid,
+    "forms_complete": _guard_forms_complete,
+    "approvals_complete": _guard_approvals_complete
+}
+
+
+class Transition:
+    """A compiled transition between two steps"""
+
+    __slots__ = ("source", "event", "target", "state", "guards", "notify", "requires_judgement")
+
+    def __init__(self, source: str, event: str, target: str, state: str,
+                 guards: List[str], notify: Optional[Dict[str, Any]], requires_judgement: bool):
+        self.source = source
+        self.event = event
+        self.target = target
+        self.state = state
+        self.guards = guards
+        self.notify = notify
+        self.requires_judgement = requires_judgement
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "from": self.source,
+            "event": self.event,
+            "to": self.target,
+            "state": self.state,
+            "requires_judgement": self.requires_judgement
+        }
+
+
+class WorkflowStateMachine:
+    """Compiled form of a workflow definition"""
+
+    def __init__(self, workflow_type: str, definition: Dict[str, Any]):
+        self.workflow_type = workflow_type
+        self.initial_step = definition["initial_step"]
+        self.forms: Dict[str, Dict[str, Any]] = definition.get("forms", {})
+        self.approval_chain: List[str] = list(definition.get("approval_chain", []))
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._transitions: Dict[Tuple[str, str], Transition] = {}
+        self._next_step: Dict[str, str] = {}
+
+        for step in definition["steps"]:
+            self.steps[step["name"]] = step
+            self._aliases[step["name"]] = step["name"]
+            for alias in step.get("aliases", []):
+                self._aliases[alias] = step["name"]
+        if self.initial_step not in self.steps:
+            raise ValueError(f"{workflow_type}: unknown initial step {self.initial_step}")
+
+        self.form_for_step: Dict[str, str] = {
+            name: step["form"] for name, step in self.steps.items() if step.get("form")
+        }
+        self.step_for_form: Dict[str, str] = {form: step for step, form in self.form_for_step.items()}
+        self.required_forms: Dict[str, str] = {
+            form: self.forms.get(form, {}).get("title", form) for form in self.form_for_step.values()
+        }
+        self.terminal_steps: List[str] = [name for name, step in self.steps.items() if step.get("terminal")]
+        self.terminal_states: List[str] = sorted({self.steps[name].get("state", name) for name in self.terminal_steps})
+
+        for spec in definition["transitions"]:
+            source, target = spec["from"], spec["to"]
+            for name in (source, target):
+                if name not in self.steps:
+                    raise ValueError(f"{workflow_type}: transition references unknown step {name}")
+            unknown_guards = set(spec.get("guards", [])) - set(GUARDS)
+            if unknown_guards:
+                raise ValueError(f"{workflow_type}: unknown guards {sorted(unknown_guards)}")
+            key = (source, spec["event"])
+            if key in self._transitions:
+                raise ValueError(f"{workflow_type}: duplicate transition for {key}")
+            self._transitions[key] = Transition(
+                source=source,
+                event=spec["event"],
+                target=target,
+                state=self.steps[target].get("state", "in_progress"),
+                guards=list(spec.get("guards", [])),
+                notify=spec.get("notify"),
+                requires_judgement=bool(spec.get("judgement", False))
+            )
+            # The forward path through the workflow is the first transition out of each step
+            self._next_step.setdefault(source, target)
+
+    def canonical_step(self, step: Optional[str]) -> str:
+        """Resolve step aliases; unknown or empty steps map to the initial step"""
+        return self._aliases.get(step or self.initial_step, step)
+
+    def lookup(self, step: str, event: str) -> Optional[Transition]:
+        """O(1) transition lookup"""
+        return self._transitions.get((self.canonical_step(step), event))
+
+    def next_step(self, step: str) -> str:
+        """The step following ``step`` on the forward path"""
+        step = self.canonical_step(step)
+        return self._next_step.get(step, step)
+
+    def form_event(self, form_type: str) -> str:
+        return f"form:{form_type}"
+
+    def form_recipients(self, form_type: str) -> List[str]:
+        """Roles notified when ``form_type`` is submitted"""
+        step = self.step_for_form.get(form_type)
+        transition = self._transitions.get((step, self.form_event(form_type))) if step else None
+        return list(transition.notify.get("recipients", [])) if transition and transition.notify else []
+
+    def check_guards(self, transition: Transition, progress: Dict[str, Any],
+                     context: Dict[str, Any] = None) -> List[str]:
+        errors = []
+        for guard in transition.guards:
+            errors.extend(GUARDS[guard](self, progress, context or {}))
+        return errors
+
+    def is_terminal(self, step: str) -> bool:
+        return bool(self.steps.get(self.canonical_step(step), {}).get("terminal"))
+
+
+_MACHINES: Dict[str, WorkflowStateMachine] = {}
+
+
+def get_state_machine(workflow_type: str = None) -> WorkflowStateMachine:
+    """Compiled state machine for a workflow type (compiled once and cached)"""
+    workflow_type = workflow_type or DEFAULT_WORKFLOW_TYPE
+    machine = _MACHINES.get(workflow_type)
+    if machine is None:
+        if workflow_type not in WORKFLOW_DEFINITIONS:
+            raise ValueError(f"Unknown workflow type: {workflow_type}")
+        machine = WorkflowStateMachine(workflow_type, WORKFLOW_DEFINITIONS[workflow_type])
+        _MACHINES[workflow_type] = machine
+    return machine
+
+
+class WorkflowEngine:
+    """Executes state machine transitions against storage"""
+
+    def __init__(self, storage: Any, on_notify: Callable[[], None] = None, coalescer: Any = None):
+        self.storage = storage
+        # Called after a transition enqueued notifications, e.g. to wake the outbox dispatcher
+        self.on_notify = on_notify
+        # Optional notifications.NotificationCoalescer; notifications it accepts become digests
+        self.coalescer = coalescer
+
+    def plan(self, progress: Dict[str, Any], event: str) -> Optional[Transition]:
+        """Transition ``event`` would take from the workflow's current step, if any"""
+        machine = get_state_machine(progress.get("workflow_type"))
+        return machine.lookup(progress.get("current_step"), event)
+
+    def fire(self, workflow_id: str, event: str, context: Dict[str, Any] = None,
+             progress: Dict[str, Any] = None, expected_version: int = None,
+             form: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Apply ``event`` to a workflow: check guards, move the step and run hooks.
+
+        The step only moves if the workflow is still at ``expected_version``,
+        by default the version of ``progress`` the guards were checked
+        against; otherwise VersionConflictError is raised, so two callers
+        racing from the same step cannot both move it. ``form`` is stored in
+        the same transaction as the step change.
+        """
+        progress = progress or self.storage.get_workflow_progress(workflow_id)
+        if not progress:
+            return {"ok": False, "errors": [f"Workflow {workflow_id} not found"]}
+        if expected_version is None:
+            expected_version = progress.get("version")
+
+        machine = get_state_machine(progress.get("workflow_type"))
+        step = machine.canonical_step(progress.get("current_step"))
+        transition = machine.lookup(step, event)
+        if transition is None:
+            return {"ok": False, "errors": [f"No transition for '{event}' from step '{step}'"]}
+
+        errors = machine.check_guards(transition, progress, context)
+        if errors:
+            return {"ok": False, "errors": errors, "transition": transition.to_dict()}
+
+        # The step change and its notifications commit together (transactional outbox);
+        # the key makes a replayed transition from the same workflow version a no-op
+        notifications = self._notifications(
+            workflow_id, transition, context or {},
+            idempotency_key=f"{workflow_id}:{progress.get('version', progress.get('updated_at'))}:{event}"
+        )
+        digested = [n for n in notifications if self.coalescer and self.coalescer.accepts(n)]
+        form_id = self.storage.new_form_id() if form is not None else None
+        updated = self.storage.transition_workflow(workflow_id, {
+            "state": transition.state,
+            "current_step": transition.target
+        }, [n for n in notifications if n not in digested], expected_version=expected_version,
+            form=form, form_id=form_id)
+        if updated is None:
+            return {"ok": False, "errors": [f"Workflow {workflow_id} not found"]}
+        notification_ids = updated["notifications"] + [self.coalescer.add(n) for n in digested]
+        if notification_ids and self.on_notify:
+            self.on_notify()
+        logger.info(f"Workflow {workflow_id}: {step} --{event}--> {transition.target}")
+        return {
+            "ok": True,
+            "transition": transition.to_dict(),
+            "state": transition.state,
+            "current_step": transition.target,
+            "notifications": notification_ids,
+            "form_id": form_id,
+            "version": updated["version"]
+        }
+
+    def _notifications(self, workflow_id: str, transition: Transition,
+                       context: Dict[str, Any], idempotency_key: str) -> List[Dict[str, Any]]:
+        """Notifications the transition's hooks enqueue"""
+        if not transition.notify:
+            return []
+        data = {
+            "step": transition.target,
+            "previous_step": transition.source,
+            "event": transition.event,
+            "timestamp": datetime.now().isoformat()
+        }
+        for key in ("form_type", "submitted_by"):
+            if context.get(key):
+                data[key] = context[key]
+        if transition.notify.get("status"):
+            data["status"] = transition.notify["status"]
+        return [{
+            "workflow_id": workflow_id,
+            "type": transition.notify["type"],
+            "recipients": list(transition.notify.get("recipients", [])),
+            "data": data,
+            "idempotency_key": idempotency_key
+        }]
+
+
+__all__ = [
+    'WORKFLOW_DEFINITIONS',
+    'WorkflowStateMachine',
+    'WorkflowEngine',
+    'Transition',
+    'get_state_machine',
+    'validate_fields',
+    'approval_role_statuses'
+]
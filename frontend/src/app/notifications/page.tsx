@@ -1,34 +1,184 @@
 'use client'
 
+import { useEffect, useState } from 'react'
+import Link from 'next/link'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
+import { Badge } from '@/components/ui/badge'
+import { Button } from '@/components/ui/button'
+
+type InboxItem = {
+  id: string
+  type: string
+  workflow_id: string | null
+  role: string
+  digest: boolean
+  count: number
+  data: Record<string, any> | null
+  status: string
+  read: boolean
+  created_at: string
+}
+
+type InboxPage = {
+  items: InboxItem[]
+  next_cursor: string | null
+  unread: number
+  total: number
+}
+
+const PAGE_SIZE = 20
+
+// The signed-in user; until authentication lands this comes from local storage or the environment
+function getUserId() {
+  if (typeof window !== 'undefined' && window.localStorage.getItem('userId')) {
+    return window.localStorage.getItem('userId') as string
+  }
+  return process.env.NEXT_PUBLIC_USER_ID || 'demo_user'
+}
+
+function getTitle(item: InboxItem) {
+  const titles = {
+    form_submission: 'Form Submission',
+    approval_required: 'Approval Required',
+    status_update: 'Status Update',
+    revision_required: 'Revision Required'
+  }
+  const title = titles[item.type as keyof typeof titles] || item.type
+  return item.digest ? `${title} (${item.count})` : title
+}
+
+function getSummary(item: InboxItem) {
+  if (item.digest) {
+    const workflows = item.data?.workflow_ids?.length || 0
+    return `${item.count} events across ${workflows} workflow${workflows === 1 ? '' : 's'}`
+  }
+  const data = item.data || {}
+  return data.message || data.form_type || data.status || data.step || 'Workflow updated'
+}
 
 export default function NotificationsPage() {
+  const [items, setItems] = useState<InboxItem[]>([])
+  const [cursor, setCursor] = useState<string | null>(null)
+  const [unread, setUnread] = useState(0)
+  const [unreadOnly, setUnreadOnly] = useState(false)
+  const [loading, setLoading] = useState(true)
+  const [error, setError] = useState('')
+
+  async function fetchPage(nextCursor: string | null) {
+    try {
+      setLoading(true)
+      const params = new URLSearchParams({ limit: String(PAGE_SIZE) })
+      if (nextCursor) params.set('cursor', nextCursor)
+      if (unreadOnly) params.set('unread_only', 'true')
+      const response = await fetch(`/api/inbox/${getUserId()}?${params}`)
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+      }
+      const page: InboxPage = await response.json()
+      setItems((current) => (nextCursor ? [...current, ...page.items] : page.items))
+      setCursor(page.next_cursor)
+      setUnread(page.unread)
+      setError('')
+    } catch (err) {
+      console.error('Failed to fetch notifications:', err)
+      setError('Failed to load notifications. Please try again later.')
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  async function markRead(notificationIds?: string[]) {
+    try {
+      const response = await fetch(`/api/inbox/${getUserId()}/read`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(notificationIds ? { notification_ids: notificationIds } : {})
+      })
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+      }
+      const result = await response.json()
+      setUnread(result.unread)
+      setItems((current) =>
+        current.map((item) =>
+          !notificationIds || notificationIds.includes(item.id) ? { ...item, read: true } : item
+        )
+      )
+    } catch (err) {
+      console.error('Failed to mark notifications read:', err)
+    }
+  }
+
+  useEffect(() => {
+    fetchPage(null)
+  }, [unreadOnly])
+
   return (
     <div className="space-y-6">
-      <h1 className="text-3xl font-bold">Notifications</h1>
+      <div className="flex items-center justify-between">
+        <div className="flex items-center gap-3">
+          <h1 className="text-3xl font-bold">Notifications</h1>
+          {unread > 0 && <Badge>{unread} unread</Badge>}
+        </div>
+        <div className="flex gap-2">
+          <Button variant="outline" size="sm" onClick={() => setUnreadOnly(!unreadOnly)}>
+            {unreadOnly ? 'Show all' : 'Unread only'}
+          </Button>
+          <Button variant="outline" size="sm" disabled={unread === 0} onClick={() => markRead()}>
+            Mark all read
+          </Button>
+        </div>
+      </div>
+
+      {error && (
+        <div className="bg-destructive/15 text-destructive p-3 rounded-md">
+          {error}
+        </div>
+      )}
 
       <div className="grid gap-4">
-        {/* Sample notification cards - will be populated dynamically */}
-        <Card>
-          <CardHeader>
-            <CardTitle className="text-lg">Approval Required</CardTitle>
-            <p className="text-sm text-muted-foreground">2 minutes ago</p>
-          </CardHeader>
-          <CardContent>
-            <p>New lease exit workflow requires your approval for Office Space - San Francisco</p>
-          </CardContent>
-        </Card>
-
-        <Card>
-          <CardHeader>
-            <CardTitle className="text-lg">Form Submission</CardTitle>
-            <p className="text-sm text-muted-foreground">1 hour ago</p>
-          </CardHeader>
-          <CardContent>
-            <p>Exit form has been submitted for review</p>
-          </CardContent>
-        </Card>
+        {items.map((item) => (
+          <Card
+            key={item.id}
+            className={item.read ? 'opacity-70' : 'border-primary'}
+            onClick={() => !item.read && markRead([item.id])}
+          >
+            <CardHeader>
+              <div className="flex items-center justify-between">
+                <CardTitle className="text-lg">{getTitle(item)}</CardTitle>
+                {!item.read && <Badge variant="secondary">New</Badge>}
+              </div>
+              <p className="text-sm text-muted-foreground">
+                {new Date(item.created_at).toLocaleString()} · via {item.role}
+              </p>
+            </CardHeader>
+            <CardContent>
+              <p>{getSummary(item)}</p>
+              {item.workflow_id && (
+                <Link href={`/workflows/${item.workflow_id}`} className="text-sm underline">
+                  View workflow
+                </Link>
+              )}
+            </CardContent>
+          </Card>
+        ))}
+
+        {!loading && items.length === 0 && !error && (
+          <Card>
+            <CardContent className="py-8 text-center text-muted-foreground">
+              You have no notifications.
+            </CardContent>
+          </Card>
+        )}
       </div>
+
+      {cursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" disabled={loading} onClick={() => fetchPage(cursor)}>
+            {loading ? 'Loading...' : 'Load more'}
+          </Button>
+        </div>
+      )}
     </div>
   )
 }
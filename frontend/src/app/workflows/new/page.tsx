@@ -1,6 +1,6 @@
 'use client'
 
-import { useState } from 'react'
+import { useRef, useState } from 'react'
 import { useRouter } from 'next/navigation'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
@@ -9,6 +9,8 @@ export default function NewWorkflowPage() {
   const router = useRouter()
   const [isSubmitting, setIsSubmitting] = useState(false)
   const [error, setError] = useState('')
+  // A retry of the same submission reuses its Idempotency-Key and body, so the server does not create a duplicate
+  const pendingRequest = useRef<{ signature: string; key: string; body: string } | null>(null)
 
   async function handleSubmit(event: React.FormEvent<HTMLFormElement>) {
     event.preventDefault()
@@ -16,11 +18,18 @@ export default function NewWorkflowPage() {
     setError('')
 
     const formData = new FormData(event.currentTarget)
-    const data = {
+    const fields = {
       propertyName: formData.get('propertyName'),
       leaseEndDate: formData.get('leaseEndDate'),
-      exitReason: formData.get('exitReason'),
-      createdAt: new Date().toISOString()
+      exitReason: formData.get('exitReason')
+    }
+    const signature = JSON.stringify(fields)
+    if (pendingRequest.current?.signature !== signature) {
+      pendingRequest.current = {
+        signature,
+        key: crypto.randomUUID(),
+        body: JSON.stringify({ ...fields, createdAt: new Date().toISOString() })
+      }
     }
 
     try {
@@ -28,8 +37,9 @@ export default function NewWorkflowPage() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': pendingRequest.current.key
         },
-        body: JSON.stringify(data)
+        body: pendingRequest.current.body
       })
 
       if (!response.ok) {
@@ -37,6 +47,7 @@ export default function NewWorkflowPage() {
       }
 
       const result = await response.json()
+      pendingRequest.current = null
       router.push('/workflows')
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to create workflow')